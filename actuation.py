@@ -0,0 +1,103 @@
+import sys
+import time
+import asyncio
+import threading
+from hardware import OPEN_BEEPS, CLOSE_BEEP_MS
+
+# the benchmark fails when the p95 of either goes over these; a relay that opens or closes this late
+# is noticeable at the door
+MAX_LATENCY_P95_MS = 50
+MAX_HOLD_ERROR_P95_MS = 50
+
+
+# --- Benchmark: tap-to-relay latency and hold accuracy of the service's actuator on the simulated backend ---
+def benchmark(taps=20, hold_ms=300, cpu_threads=2, loop_block_ms=15,
+              max_latency_ms=MAX_LATENCY_P95_MS, max_hold_error_ms=MAX_HOLD_ERROR_P95_MS):
+    # load = CPU-bound threads contending for the GIL plus a handler that blocks the event loop every 50 ms
+    return asyncio.run(_benchmark(taps, hold_ms, cpu_threads, loop_block_ms, max_latency_ms, max_hold_error_ms))
+
+
+async def _benchmark(taps, hold_ms, cpu_threads, loop_block_ms, max_latency_ms, max_hold_error_ms):
+    from hardware import SimulatedHardware
+    from locker_bank import LockerBank
+    from locker_server import AsyncActuator, SWITCH_INTERVAL_SECONDS
+
+    # the switch interval serve() runs the service with
+    sys.setswitchinterval(min(sys.getswitchinterval(), SWITCH_INTERVAL_SECONDS))
+
+    # one locker per tap, so every tap starts a sequence of its own and overlaps the ones before it
+    bank = LockerBank.from_dict({"lockers": [{"locker_id": i} for i in range(1, taps + 1)]})
+    hw = SimulatedHardware(bank)
+    actuator = AsyncActuator(hw)
+    beep_ms = sum(on + off for on, off in OPEN_BEEPS)
+
+    stop = threading.Event()
+
+    def burn():
+        while not stop.is_set():
+            sum(i * i for i in range(2000))
+
+    workers = [threading.Thread(target=burn, daemon=True) for _ in range(cpu_threads)]
+    for w in workers:
+        w.start()
+
+    async def block_loop():
+        while True:
+            await asyncio.sleep(0.05)
+            time.sleep(loop_block_ms / 1000)
+
+    blocker = asyncio.create_task(block_loop()) if loop_block_ms else None
+
+    taps_at = {}
+    sequences = []
+    for n in range(taps):
+        locker_id = n % len(bank) + 1
+        # a tap on a locker that is still mid-sequence joins it; only taps that start one are timed
+        if not actuator.is_active(locker_id):
+            taps_at.setdefault(locker_id, []).append(time.perf_counter())
+            actuator.unlock(locker_id, hold_ms=hold_ms)
+            sequences.append(actuator._tasks[locker_id])
+        await asyncio.sleep(0.037)     # overlapping sequences across lockers
+
+    timeout = 5 + taps * (beep_ms + hold_ms + CLOSE_BEEP_MS) / 1000
+    _, unfinished = await asyncio.wait(sequences, timeout=timeout)
+    if blocker is not None:
+        blocker.cancel()
+    await actuator.stop_all()
+    stop.set()
+    done = len(sequences) - len(unfinished)
+
+    latencies, hold_errors = [], []
+    for locker_id, tapped in taps_at.items():
+        for t_tap, (opened, closed) in zip(tapped, hw.unlock_windows(locker_id)):
+            # the open beeps are part of the sequence; what is left over is scheduling delay
+            latencies.append((opened - t_tap) * 1000 - beep_ms)
+            hold_errors.append((closed - opened) * 1000 - hold_ms - CLOSE_BEEP_MS)
+
+    def pct(xs, p):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+    print(f"{done}/{len(sequences)} sequences for {taps} taps, {cpu_threads} CPU threads, "
+          f"event loop blocked {loop_block_ms} ms every 50 ms")
+    print(f"tap -> relay on (beyond {beep_ms} ms of beeps): "
+          f"p50 {pct(latencies, 0.5):.1f} ms  p95 {pct(latencies, 0.95):.1f} ms  max {max(latencies, default=0):.1f} ms")
+    print(f"relay hold error vs {hold_ms + CLOSE_BEEP_MS} ms:        "
+          f"p50 {pct(hold_errors, 0.5):.1f} ms  p95 {pct(hold_errors, 0.95):.1f} ms  max {max(hold_errors, default=0):.1f} ms")
+    ok = not unfinished
+    if not ok:
+        print(f"  REGRESSION: only {done} of {len(sequences)} sequences finished")
+    # a relay held too short is as wrong as one held too long
+    latency_p95, hold_p95 = pct(latencies, 0.95), pct([abs(e) for e in hold_errors], 0.95)
+    if not latency_p95 <= max_latency_ms:
+        print(f"  REGRESSION: tap -> relay p95 {latency_p95:.1f} ms is over the {max_latency_ms:.0f} ms budget")
+        ok = False
+    if not hold_p95 <= max_hold_error_ms:
+        print(f"  REGRESSION: hold error p95 {hold_p95:.1f} ms is over the {max_hold_error_ms:.0f} ms budget")
+        ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    # usage: python actuation.py [TAPS [HOLD_MS [CPU_THREADS [LOOP_BLOCK_MS [MAX_LATENCY_MS [MAX_HOLD_ERROR_MS]]]]]]
+    sys.exit(0 if benchmark(*[int(a) for a in sys.argv[1:7]]) else 1)
@@ -1,64 +1,73 @@
-import mysql.connector
+from api_client import get_client
+from db_executor import run_async, run_busy
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
     QVBoxLayout, QHBoxLayout, QMessageBox, QTableWidget, QTableWidgetItem,
-    QDialog, QDialogButtonBox, QComboBox, QInputDialog, QHeaderView
+    QDialog, QDialogButtonBox, QComboBox, QInputDialog, QHeaderView, QTabWidget
 )
+from PySide6.QtCore import Signal
+from analytics_tab import AnalyticsTab
 
 # --- Main Admin Viewer (Limited to Basic Info) ---
 class AdminViewer(QWidget):
-    def __init__(self):
-        super().__init__()
+    logout_requested = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.session = None
         self.setWindowTitle("Admin User Info Viewer")
         self.resize(11000, 700)  # Make window larger and resizable
 
-        self.layout = QVBoxLayout(self)
+        # user info on the first tab, usage rollups on the second
+        self.tabs = QTabWidget()
+        QVBoxLayout(self).addWidget(self.tabs)
+        users_page = QWidget()
+        self.body = QVBoxLayout(users_page)
+        self.tabs.addTab(users_page, "Users")
+        self.analytics = AnalyticsTab()
+        self.tabs.addTab(self.analytics, "Analytics")
 
         self.table = QTableWidget()
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.layout.addWidget(self.table)
+        self.body.addWidget(self.table)
 
         refresh_btn = QPushButton("Refresh User Info")
         refresh_btn.clicked.connect(self.load_user_data)
-        self.layout.addWidget(refresh_btn)
+        self.body.addWidget(refresh_btn)
+
+        logout_btn = QPushButton("Log Out")
+        logout_btn.clicked.connect(self.logout_requested.emit)
+        self.body.addWidget(logout_btn)
 
+    def enter(self, session=None):
+        # the kiosk builds this screen once; each admin login starts from fresh data
+        self.session = session
+        self.setWindowTitle("Admin User Info Viewer")
+        self.tabs.setCurrentIndex(0)
+        self.table.setRowCount(0)
+        self.analytics.session = session
+        self.analytics.loaded = False
         self.load_user_data()
 
-    def db_connect(self):
-        return mysql.connector.connect(
-            host="localhost", user="adminuser", password="adminpass", database="locker_system"
-        )
+    def leave(self):
+        # back to the login screen: end this admin's session on the locker service
+        if self.session is not None:
+            run_async(get_client().logout, self.session, on_error=lambda e: None)
+            self.session = None
 
     def load_user_data(self):
-        try:
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            # Fetch basic user info only
-            cursor.execute("""
-                SELECT 
-                    u.username, 
-                    u.name, 
-                    u.birthday, 
-                    TIMESTAMPDIFF(YEAR, u.birthday, CURDATE()) AS age,
-                    l.locker_id
-                FROM users u
-                LEFT JOIN lockers l ON u.user_id = l.user_id
-            """)
-            rows = cursor.fetchall()
-            headers = ["Username", "Name", "Birthday", "Age", "Locker Used"]
-
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-            self.table.setRowCount(len(rows))
-
-            for r, row in enumerate(rows):
-                for c, val in enumerate(row):
-                    self.table.setItem(r, c, QTableWidgetItem(str(val)))
+        # Fetch basic user info only, from the locker service
+        run_busy(self, lambda: get_client().admin_users(self.session), on_result=self.show_user_data,
+                 on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
 
-            cursor.close()
-            conn.close()
+    def show_user_data(self, rows):
+        headers = ["Username", "Name", "Birthday", "Age", "Locker Used"]
 
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Error", str(e))
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(rows))
 
+        for r, row in enumerate(rows):
+            for c, val in enumerate(row):
+                self.table.setItem(r, c, QTableWidgetItem(str(val)))
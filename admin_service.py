@@ -0,0 +1,172 @@
+import re
+import mysql.connector
+import db
+import audit_log
+import change_bus
+import kiosk_service
+from schema_catalog import get_catalog
+
+# The admin table editor's work (database.py), as plain blocking functions behind locker_server.py's
+# /admin endpoints, so the editor needs neither MySQL credentials nor a route to the database.
+
+# the column types the editor offers; anything else is refused rather than pasted into DDL
+DATA_TYPES = ("VARCHAR(255)", "INT", "INT(10)", "DATE", "TEXT")
+MAX_PAGE_SIZE = 1000
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,63}$")
+
+
+class AdminError(ValueError):
+    # a request the editor should not have sent: unknown table or column, bad type, no primary key
+    pass
+
+
+def run_in_transaction(work):
+    # work(cursor) either commits as a whole or rolls back
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            work(cursor)
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+# --- Browsing ---
+def tables(refresh=False):
+    catalog = get_catalog()
+    if refresh:
+        catalog.invalidate()
+    return catalog.tables()
+
+
+def describe(table):
+    # (columns, primary key, estimated rows)
+    catalog = get_catalog()
+    _check_table(table)
+    return catalog.columns(table), catalog.primary_key(table), catalog.estimated_rows(table)
+
+
+def table_page(table, n, after, limit):
+    # page n of table in primary-key order, starting after the key `after` (None = from the top)
+    columns, primary_key, _ = describe(table)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cols = ", ".join(f"`{c}`" for c in columns)
+    if primary_key:
+        keys = ", ".join(f"`{k}`" for k in primary_key)
+        if after is None:
+            sql = f"SELECT {cols} FROM `{table}` ORDER BY {keys} LIMIT %s"
+            params = (limit,)
+        else:
+            if len(after) != len(primary_key):
+                raise AdminError(f"Paging key for {table} needs {len(primary_key)} value(s).")
+            marks = ", ".join(["%s"] * len(after))
+            sql = f"SELECT {cols} FROM `{table}` WHERE ({keys}) > ({marks}) ORDER BY {keys} LIMIT %s"
+            params = tuple(after) + (limit,)
+    else:
+        # no key to seek on: fall back to OFFSET paging
+        sql = f"SELECT {cols} FROM `{table}` LIMIT %s OFFSET %s"
+        params = (limit, n * limit)
+    return [tuple(r) for r in db.fetchall(sql, params)]
+
+
+# --- Editing rows ---
+def save_edits(actor_id, table, changes):
+    # changes = [(primary key values, {column: new value})]; one transaction, then audited and announced
+    columns, primary_key, _ = describe(table)
+    if not primary_key:
+        raise AdminError(f"Table {table} has no primary key; cannot save edits.")
+    for key, values in changes:
+        if len(key) != len(primary_key):
+            raise AdminError(f"Row key for {table} needs {len(primary_key)} value(s).")
+        unknown = [c for c in values if c not in columns]
+        if unknown or not values:
+            raise AdminError(f"Table {table} has no column {', '.join(unknown) or '(none given)'}.")
+
+    where = " AND ".join(f"`{k}` = %s" for k in primary_key)
+    # rows that touched the same set of columns share one parameterized statement
+    batches = {}
+    for key, values in changes:
+        cols = tuple(sorted(values))
+        batches.setdefault(cols, []).append(tuple(values[c] for c in cols) + tuple(key))
+
+    def write(cursor):
+        for cols, params in batches.items():
+            set_clause = ", ".join(f"`{c}` = %s" for c in cols)
+            cursor.executemany(f"UPDATE `{table}` SET {set_clause} WHERE {where}", params)
+
+    run_in_transaction(write)
+    _record_edits(actor_id, table, primary_key, changes)
+    return len(changes)
+
+
+def _record_edits(actor_id, table, primary_key, changes):
+    key_names = ", ".join(primary_key)
+    lockers = table == "lockers" and primary_key == ["locker_id"]
+    if lockers:
+        change_bus.publish(reload=[key[0] for key, _ in changes])
+    for key, values in changes:
+        detail = f"{table}({key_names})={tuple(key)}: " + ", ".join(f"{c}={v}" for c, v in values.items())
+        if lockers:
+            # an edited owner is an assignment, so holder_at() sees it
+            event = audit_log.ADMIN_ASSIGN if "user_id" in values else audit_log.ADMIN_EDIT
+            user_id = values.get("user_id")
+            audit_log.record(event, key[0], int(user_id) if str(user_id).isdigit() else None, actor_id, detail)
+        else:
+            audit_log.record(audit_log.ADMIN_EDIT, actor_id=actor_id, detail=detail)
+
+
+def remove_user(actor_id, user_id):
+    # True if the account existed
+    removed = db.execute(kiosk_service.REMOVE_USER_SQL, (user_id,))
+    if removed:
+        audit_log.record(audit_log.ADMIN_REMOVE_USER, user_id=user_id, actor_id=actor_id,
+                         detail=f"user_id={user_id}")
+    return bool(removed)
+
+
+# --- Schema changes; every name is checked, since it has to go into the DDL as text ---
+def create_table(table, column, data_type):
+    _check_name(table)
+    _check_name(column)
+    if table in get_catalog().tables():
+        raise AdminError(f"Table {table} already exists.")
+    _run_ddl(f"CREATE TABLE `{table}` (`{column}` {_check_type(data_type)})")
+
+
+def add_column(table, column, data_type):
+    _check_name(column)
+    if column in describe(table)[0]:
+        raise AdminError(f"Table {table} already has a column {column}.")
+    _run_ddl(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {_check_type(data_type)}")
+
+
+def drop_column(table, column):
+    if column not in describe(table)[0]:
+        raise AdminError(f"Table {table} has no column {column}.")
+    _run_ddl(f"ALTER TABLE `{table}` DROP COLUMN `{column}`")
+
+
+def _run_ddl(sql):
+    try:
+        run_in_transaction(lambda cursor: cursor.execute(sql))
+    finally:
+        get_catalog().invalidate()
+
+
+def _check_table(table):
+    if table not in get_catalog().tables():
+        raise AdminError(f"No table {table}.")
+
+
+def _check_name(name):
+    if not IDENTIFIER.match(name or ""):
+        raise AdminError(f"{name!r} is not a valid name: use letters, digits and _, up to 64 characters.")
+
+
+def _check_type(data_type):
+    if data_type not in DATA_TYPES:
+        raise AdminError(f"Unsupported column type {data_type!r}.")
+    return data_type
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import db
+import audit_log
+
+# events folded into the rollups per round trip
+ROLLUP_BATCH = 5000
+SUMMARY_DAYS = 7
+TOP_USERS = 20
+# the locker service folds new events this often, so the admin tab only ever reads rollups
+FOLD_INTERVAL_SECONDS = int(os.environ.get("LOCKER_ROLLUP_SECONDS", "60"))
+
+ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS locker_usage_hourly (
+        locker_id INT NOT NULL,
+        hour DATETIME NOT NULL,
+        occupied_seconds INT NOT NULL DEFAULT 0,
+        claims INT NOT NULL DEFAULT 0,
+        releases INT NOT NULL DEFAULT 0,
+        dwell_seconds BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, locker_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_usage_daily (
+        user_id INT NOT NULL,
+        day DATE NOT NULL,
+        claims INT NOT NULL DEFAULT 0,
+        releases INT NOT NULL DEFAULT 0,
+        dwell_seconds BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id)
+    )
+    """,
+    # stays that were open when the rollup last stopped, so the next run can close them
+    """
+    CREATE TABLE IF NOT EXISTS locker_open_stays (
+        locker_id INT PRIMARY KEY,
+        user_id INT NOT NULL,
+        since DATETIME(3) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_cursor (
+        name VARCHAR(32) PRIMARY KEY,
+        last_event_id BIGINT NOT NULL
+    )
+    """,
+]
+
+HOURLY_UPSERT = (
+    "INSERT INTO locker_usage_hourly (locker_id, hour, occupied_seconds, claims, releases, dwell_seconds) "
+    "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+    "occupied_seconds = occupied_seconds + VALUES(occupied_seconds), claims = claims + VALUES(claims), "
+    "releases = releases + VALUES(releases), dwell_seconds = dwell_seconds + VALUES(dwell_seconds)"
+)
+ROLLUP_EVENTS_SQL = (
+    "SELECT event_id, occurred_at, event_type, locker_id, user_id FROM locker_events "
+    "WHERE event_id > %s AND event_type IN (%s, %s, %s) ORDER BY event_id LIMIT %s"
+)
+LOCKER_WINDOW_SQL = (
+    "SELECT locker_id, SUM(occupied_seconds), SUM(claims), SUM(releases), SUM(dwell_seconds) "
+    "FROM locker_usage_hourly WHERE hour >= %s GROUP BY locker_id"
+)
+PEAK_HOURS_SQL = "SELECT HOUR(hour), SUM(claims) FROM locker_usage_hourly WHERE hour >= %s GROUP BY HOUR(hour)"
+USER_WINDOW_SQL = (
+    "SELECT d.user_id, users.username, SUM(d.claims), SUM(d.releases), SUM(d.dwell_seconds) "
+    "FROM user_usage_daily d LEFT JOIN users ON users.user_id = d.user_id "
+    "WHERE d.day >= %s GROUP BY d.user_id, users.username ORDER BY SUM(d.claims) DESC LIMIT %s"
+)
+DAILY_UPSERT = (
+    "INSERT INTO user_usage_daily (user_id, day, claims, releases, dwell_seconds) "
+    "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+    "claims = claims + VALUES(claims), releases = releases + VALUES(releases), "
+    "dwell_seconds = dwell_seconds + VALUES(dwell_seconds)"
+)
+
+
+def hour_of(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def split_by_hour(start, end):
+    # yields (hour, seconds) for the part of [start, end) that falls in each clock hour
+    hour = hour_of(start)
+    while hour < end:
+        nxt = hour + timedelta(hours=1)
+        seconds = (min(end, nxt) - max(start, hour)).total_seconds()
+        if seconds > 0:
+            yield hour, seconds
+        hour = nxt
+
+
+# --- Folds new locker_events into the rollups; work is proportional to the events since last run ---
+class Rollup:
+    def __init__(self, open_stays):
+        self.open_stays = dict(open_stays)    # locker_id -> (user_id, since)
+        self.hourly = {}                      # (locker_id, hour) -> [occupied, claims, releases, dwell]
+        self.daily = {}                       # (user_id, day) -> [claims, releases, dwell]
+
+    def _hourly(self, locker_id, hour):
+        return self.hourly.setdefault((locker_id, hour), [0, 0, 0, 0])
+
+    def _daily(self, user_id, day):
+        return self.daily.setdefault((user_id, day), [0, 0, 0])
+
+    def apply(self, occurred_at, event_type, locker_id, user_id):
+        if locker_id is None:
+            return
+        if event_type in (audit_log.CLAIM, audit_log.ADMIN_ASSIGN):
+            self.close(locker_id, occurred_at)
+            if user_id is not None:
+                self.open_stays[locker_id] = (user_id, occurred_at)
+                self._hourly(locker_id, hour_of(occurred_at))[1] += 1
+                self._daily(user_id, occurred_at.date())[0] += 1
+        elif event_type == audit_log.RELEASE:
+            self.close(locker_id, occurred_at)
+
+    def close(self, locker_id, ended_at):
+        stay = self.open_stays.pop(locker_id, None)
+        if stay is None:
+            return
+        user_id, since = stay
+        for hour, seconds in split_by_hour(since, ended_at):
+            self._hourly(locker_id, hour)[0] += int(seconds)
+        dwell = int(max(0.0, (ended_at - since).total_seconds()))
+        bucket = self._hourly(locker_id, hour_of(ended_at))
+        bucket[2] += 1
+        bucket[3] += dwell
+        daily = self._daily(user_id, ended_at.date())
+        daily[1] += 1
+        daily[2] += dwell
+
+
+def ensure_tables(cursor):
+    for stmt in ROLLUP_DDL:
+        cursor.execute(stmt)
+
+
+def update_rollups(batch=ROLLUP_BATCH):
+    # returns the number of events folded in; safe to call from several kiosks, one wins per batch
+    folded = 0
+    while True:
+        with db.connection() as pc:
+            cursor = pc.cursor()
+            try:
+                cursor.execute("INSERT IGNORE INTO analytics_cursor (name, last_event_id) VALUES ('events', 0)")
+                cursor.execute("SELECT last_event_id FROM analytics_cursor WHERE name = 'events' FOR UPDATE")
+                last_id = cursor.fetchone()[0]
+                cursor.execute(ROLLUP_EVENTS_SQL, (last_id,) + audit_log.OWNERSHIP_EVENTS + (batch,))
+                events = cursor.fetchall()
+                if not events:
+                    pc.commit()
+                    return folded
+                cursor.execute("SELECT locker_id, user_id, since FROM locker_open_stays")
+                rollup = Rollup({r[0]: (r[1], r[2]) for r in cursor.fetchall()})
+                for _, occurred_at, event_type, locker_id, user_id in events:
+                    rollup.apply(occurred_at, event_type, locker_id, user_id)
+
+                if rollup.hourly:
+                    cursor.executemany(HOURLY_UPSERT, [(lid, hour, *v) for (lid, hour), v in rollup.hourly.items()])
+                if rollup.daily:
+                    cursor.executemany(DAILY_UPSERT, [(uid, day, *v) for (uid, day), v in rollup.daily.items()])
+                cursor.execute("DELETE FROM locker_open_stays")
+                if rollup.open_stays:
+                    cursor.executemany(
+                        "INSERT INTO locker_open_stays (locker_id, user_id, since) VALUES (%s, %s, %s)",
+                        [(lid, uid, since) for lid, (uid, since) in rollup.open_stays.items()]
+                    )
+                cursor.execute("UPDATE analytics_cursor SET last_event_id = %s WHERE name = 'events'",
+                               (events[-1][0],))
+                pc.commit()
+            finally:
+                cursor.close()     # an uncommitted batch is rolled back when the connection returns
+        folded += len(events)
+        if len(events) < batch:
+            return folded
+
+
+# --- What the admin tab shows; every query reads a fixed window of rollup rows ---
+class Summary:
+    def __init__(self, days, lockers, peak_hours, users):
+        self.days = days
+        self.lockers = lockers          # [(locker_id, occupancy_rate, avg_dwell_s, claims)]
+        self.peak_hours = peak_hours    # [(hour_of_day, claims)] for all 24 hours
+        self.users = users              # [(user_id, username, claims, turnover_per_day, avg_dwell_s)]
+
+
+def summary(days=SUMMARY_DAYS, now=None):
+    now = now or datetime.now()
+    since = hour_of(now) - timedelta(days=days)
+    window = (now - since).total_seconds()
+
+    per_locker = {r[0]: r[1:] for r in db.fetchall(LOCKER_WINDOW_SQL, (since,))}
+    # stays still open have not been rolled up yet; count them up to now
+    for locker_id, stay_since in db.fetchall("SELECT locker_id, since FROM locker_open_stays"):
+        occupied, claims, releases, dwell = per_locker.get(locker_id, (0, 0, 0, 0))
+        open_seconds = (now - max(stay_since, since)).total_seconds()
+        per_locker[locker_id] = (occupied + max(0, open_seconds), claims, releases, dwell)
+    lockers = [
+        (lid, min(1.0, float(occ) / window) if window else 0.0,
+         float(dwell) / releases if releases else None, int(claims))
+        for lid, (occ, claims, releases, dwell) in sorted(per_locker.items())
+    ]
+
+    by_hour = dict(db.fetchall(PEAK_HOURS_SQL, (since,)))
+    peak_hours = [(h, int(by_hour.get(h, 0))) for h in range(24)]
+
+    users = [
+        (uid, username, int(claims), float(claims) / days, float(dwell) / releases if releases else None)
+        for uid, username, claims, releases, dwell in db.fetchall(USER_WINDOW_SQL, (since.date(), TOP_USERS))
+    ]
+    return Summary(days, lockers, peak_hours, users)
+
+
+if __name__ == "__main__":
+    # usage: python analytics.py [DAYS]  -> fold new events (cron-friendly) and print the summary
+    start = time.perf_counter()
+    folded = update_rollups()
+    result = summary(int(sys.argv[1]) if len(sys.argv) > 1 else SUMMARY_DAYS)
+    print(f"folded {folded} new events in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for locker_id, rate, dwell, claims in result.lockers:
+        dwell_text = f"{dwell / 60:.0f} min" if dwell is not None else "-"
+        print(f"  locker {locker_id:>3}: {rate:6.1%} occupied, {claims} claims, avg dwell {dwell_text}")
+    peak = max(result.peak_hours, key=lambda p: p[1])
+    print(f"  peak hour: {peak[0]:02d}:00 ({peak[1]} claims)")
@@ -0,0 +1,83 @@
+from api_client import get_client
+from db_executor import run_busy
+from PySide6.QtWidgets import (
+    QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QComboBox,
+    QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView
+)
+
+
+def _minutes(seconds):
+    return f"{seconds / 60:.0f} min" if seconds is not None else "-"
+
+
+# --- Admin tab over the precomputed rollups; loading reads a fixed window, not the event history ---
+class AnalyticsTab(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.body = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        self.window_selector = QComboBox()
+        for days in (1, 7, 30):
+            self.window_selector.addItem(f"Last {days} day(s)", days)
+        self.window_selector.setCurrentIndex(1)
+        self.window_selector.currentIndexChanged.connect(self.load)
+        controls.addWidget(self.window_selector)
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.load)
+        controls.addWidget(refresh_btn)
+        self.body.addLayout(controls)
+
+        self.lockers = self._table(["Locker", "Occupancy", "Claims", "Avg Dwell"])
+        self.peak_label = QLabel()
+        self.hours = self._table(["Hour", "Claims"])
+        self.users = self._table(["User", "Claims", "Claims / Day", "Avg Dwell"])
+        self.body.addWidget(QLabel("Lockers"))
+        self.body.addWidget(self.lockers)
+        self.body.addWidget(self.peak_label)
+        self.body.addWidget(self.hours)
+        self.body.addWidget(QLabel("Most active users"))
+        self.body.addWidget(self.users)
+
+        self.session = None     # the admin session the owning viewer is logged in with
+        self.loaded = False
+
+    def _table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        return table
+
+    def showEvent(self, event):
+        # the tab is only queried when an admin actually opens it
+        super().showEvent(event)
+        if not self.loaded:
+            self.loaded = True
+            self.load()
+
+    def load(self):
+        # the locker service keeps the rollups current and answers from them (/admin/analytics)
+        days = self.window_selector.currentData()
+        run_busy(self, lambda: get_client().analytics(self.session, days), on_result=self.show_summary,
+                 on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
+
+    def show_summary(self, summary):
+        self._fill(self.lockers, [
+            (f"Locker {lid}", f"{rate:.0%}", claims, _minutes(dwell))
+            for lid, rate, dwell, claims in summary["lockers"]
+        ])
+        busiest = max(summary["peak_hours"], key=lambda p: p[1])
+        self.peak_label.setText(f"Peak hour: {busiest[0]:02d}:00 ({busiest[1]} claims)" if busiest[1]
+                                else "Peak hour: no claims in this window")
+        self._fill(self.hours, [(f"{h:02d}:00", n) for h, n in summary["peak_hours"] if n])
+        self._fill(self.users, [
+            (username or f"#{uid}", claims, f"{per_day:.2f}", _minutes(dwell))
+            for uid, username, claims, per_day, dwell in summary["users"]
+        ])
+
+    def _fill(self, table, rows):
+        table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, val in enumerate(row):
+                table.setItem(r, c, QTableWidgetItem(str(val)))
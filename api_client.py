@@ -0,0 +1,270 @@
+import os
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+from session import Session
+
+# Where the kiosk windows find the locker service (locker_server.py). Unset, the kiosk runs the
+# service itself on a background thread, so a single kiosk still works as one process.
+API_URL = os.environ.get("LOCKER_API_URL", "")
+TIMEOUT = float(os.environ.get("LOCKER_API_TIMEOUT", "10"))
+
+# what /password/reset answers in "status" (otp_service's values, repeated so the screens need no DB modules)
+RESET_OK = "ok"
+RESET_INVALID = "invalid"
+RESET_EXPIRED = "expired"
+RESET_THROTTLED = "throttled"
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Blocking JSON client; call it from the DB executor, never the GUI thread ---
+class LockerClient:
+    def __init__(self, url, timeout=TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()     # one keep-alive connection per worker thread
+        self._layout = None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, payload=None, session=None, query=None):
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if session is not None and session.token:
+            headers["Authorization"] = f"Bearer {session.token}"
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                # the server closed a kept-alive connection before reading this request; one retry
+                self._drop_connection()
+                if attempt:
+                    raise ApiError(503, f"Locker service at {self.url} dropped the connection: {e}")
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection()
+                raise ApiError(503, f"Locker service at {self.url} is not reachable: {e}")
+        try:
+            result = json.loads(data) if data else {}
+        except ValueError:
+            raise ApiError(response.status, f"Locker service sent a non-JSON reply ({response.status}).")
+        if response.status != 200:
+            raise ApiError(response.status, result.get("error", f"HTTP {response.status}"))
+        return result
+
+    # --- accounts ---
+    def login(self, username, password):
+        # a Session carrying the bearer token, or None for wrong credentials
+        try:
+            r = self.request("POST", "/login", {"username": username, "password": password})
+        except ApiError as e:
+            if e.status == 401:
+                return None
+            raise
+        session = Session(r["user_id"], r["username"], r["role"], r["display_name"])
+        session.token = r["token"]
+        return session
+
+    def logout(self, session):
+        try:
+            self.request("POST", "/logout", session=session)
+        except ApiError as e:
+            if e.status != 401:     # already expired is as good as logged out
+                raise
+
+    def user_exists(self, username):
+        return self.request("GET", "/users/exists", query={"username": username})["exists"]
+
+    def check_identity(self, username, name, birthday):
+        r = self.request("GET", "/register/check", query={"username": username, "name": name, "birthday": birthday})
+        return r["username_taken"], r["identity_taken"]
+
+    def register(self, username, password, name, age, birthday):
+        # None on success, else the field that was a duplicate
+        return self.request("POST", "/register", {"username": username, "password": password, "name": name,
+                                                  "age": age, "birthday": birthday})["duplicate"]
+
+    def issue_otp(self, username, name, birthday, age):
+        # (reset_token, otp) when the details match the account, else None
+        r = self.request("POST", "/password/otp", {"username": username, "name": name, "birthday": birthday,
+                                                   "age": age})
+        return (r["reset_token"], r["otp"]) if r["reset_token"] is not None else None
+
+    def reset_password(self, reset_token, otp, new_password):
+        r = self.request("POST", "/password/reset", {"reset_token": reset_token, "otp": otp,
+                                                     "new_password": new_password})
+        return r["status"], r["retry_after"]
+
+    # --- lockers ---
+    def layout(self):
+        # the cabinet's grid, without pins; fetched once
+        if self._layout is None:
+            from locker_bank import LockerBank     # from_dict needs no DB modules
+            self._layout = LockerBank.from_dict(self.request("GET", "/bank"))
+        return self._layout
+
+    def lockers(self, session):
+        return self.request("GET", "/lockers", session=session)
+
+    def claim(self, session, locker_id, object_in_locker):
+        return self.request("POST", f"/lockers/{locker_id}/claim", {"object": object_in_locker}, session)
+
+    def release(self, session, locker_id):
+        return self.request("POST", f"/lockers/{locker_id}/release", session=session)
+
+    # --- admin ---
+    def admin_users(self, session):
+        users = self.request("GET", "/admin/users", session=session)["users"]
+        return [(u["username"], u["name"], u["birthday"], u["age"], u["locker_id"]) for u in users]
+
+    def assign_lockers(self, session, user_id, object_in_locker, locker_ids):
+        return self.request("POST", "/admin/lockers/assign", {"user_id": user_id, "object": object_in_locker,
+                                                              "locker_ids": list(locker_ids)}, session)["updated"]
+
+    def remove_user(self, session, user_id):
+        self.request("DELETE", f"/admin/users/{int(user_id)}", session=session)
+
+    def analytics(self, session, days):
+        # {"days", "lockers", "peak_hours", "users"}, as analytics.Summary has them
+        return self.request("GET", "/admin/analytics", session=session, query={"days": days})
+
+    # --- admin table editor ---
+    def tables(self, session, refresh=False):
+        return self.request("GET", "/admin/tables", session=session, query={"refresh": 1} if refresh else None)["tables"]
+
+    def describe_table(self, session, table):
+        # (columns, primary key, estimated rows)
+        r = self.request("GET", f"/admin/tables/{table}", session=session)
+        return r["columns"], r["primary_key"], r["estimated_rows"]
+
+    def table_rows(self, session, table, page, after, limit):
+        query = {"page": page, "limit": limit}
+        if after is not None:
+            query["after"] = json.dumps(list(after), default=str)
+        rows = self.request("GET", f"/admin/tables/{table}/rows", session=session, query=query)["rows"]
+        return [tuple(r) for r in rows]
+
+    def save_rows(self, session, table, changes):
+        # changes = [(primary key values, {column: new value})]
+        return self.request("POST", f"/admin/tables/{table}/rows",
+                            {"changes": [{"key": list(key), "values": values} for key, values in changes]},
+                            session)["saved"]
+
+    def create_table(self, session, table, column, data_type):
+        self.request("POST", "/admin/tables", {"table": table, "column": column, "type": data_type}, session)
+
+    def add_column(self, session, table, column, data_type):
+        self.request("POST", f"/admin/tables/{table}/columns", {"column": column, "type": data_type}, session)
+
+    def drop_column(self, session, table, column):
+        self.request("DELETE", f"/admin/tables/{table}/columns/{column}", session=session)
+
+    def stats(self):
+        return self.request("GET", "/stats")
+
+
+# --- What the locker screen knows about each locker, as the service last reported it ---
+class RemoteLocker:
+    # same shape as locker_state.LockerState, so Session.owns works on either
+    __slots__ = ("locker_id", "user_id", "object_in_locker")
+
+    def __init__(self, locker_id, user_id, object_in_locker):
+        self.locker_id = locker_id
+        self.user_id = user_id
+        self.object_in_locker = object_in_locker
+
+    @property
+    def occupied(self):
+        return self.user_id is not None
+
+    def __eq__(self, other):
+        return (isinstance(other, RemoteLocker) and
+                (self.locker_id, self.user_id, self.object_in_locker) ==
+                (other.locker_id, other.user_id, other.object_in_locker))
+
+
+class RemoteStateCache:
+    def __init__(self, client):
+        self.client = client
+        self.states = {}            # swapped, never mutated, so the GUI thread can read while refresh runs
+        self._lock = threading.Lock()
+
+    def get(self, locker_id):
+        return self.states.get(locker_id)
+
+    def refresh(self, session):
+        # runs on the DB executor; returns the locker_ids whose state changed
+        r = self.client.lockers(session)
+        fresh = {s["locker_id"]: RemoteLocker(s["locker_id"], s["user_id"], s["object"]) for s in r["lockers"]}
+        with self._lock:
+            changed = [lid for lid in fresh if self.states.get(lid) != fresh[lid]]
+            changed += [lid for lid in self.states if lid not in fresh]
+            self.states = fresh
+        return changed
+
+    def apply_delta(self, locker_id, user_id):
+        # another kiosk's claim/release, heard on the change bus; True if the locker's look changed
+        with self._lock:
+            old = self.states.get(locker_id)
+            if old is not None and old.user_id == user_id:
+                return False
+            states = dict(self.states)
+            states[locker_id] = RemoteLocker(locker_id, user_id, None)
+            self.states = states
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.states = {}
+
+
+_client = None
+_server = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # the first call may start the embedded service, so make it from a worker thread
+    global _client, _server
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url = API_URL
+                if not url:
+                    from locker_server import start_in_thread
+                    _server, url = start_in_thread()
+                _client = LockerClient(url)
+    return _client
+
+
+def stop_embedded():
+    # relocks anything the embedded service is still driving; call before the devices are shut down
+    global _server
+    with _client_lock:
+        if _server is not None:
+            _server.close_threadsafe()
+            _server = None
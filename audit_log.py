@@ -0,0 +1,304 @@
+import os
+import sys
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import date, datetime, timedelta
+import mysql.connector
+import db
+import offline_journal
+
+# event types are stored as small integers; the names are for code and display
+CLAIM = 1
+RELEASE = 2
+ADMIN_ASSIGN = 3
+ADMIN_EDIT = 4
+ADMIN_REMOVE_USER = 5
+LOGIN = 6
+LOGIN_FAILED = 7
+JOURNAL_CONFLICT = 8    # an offline claim/release MySQL would not accept on replay
+EVENT_NAMES = {
+    CLAIM: "claim",
+    RELEASE: "release",
+    ADMIN_ASSIGN: "admin assign",
+    ADMIN_EDIT: "admin edit",
+    ADMIN_REMOVE_USER: "admin remove user",
+    LOGIN: "login",
+    LOGIN_FAILED: "login failed",
+    JOURNAL_CONFLICT: "offline conflict",
+}
+# events that change who holds a locker
+OWNERSHIP_EVENTS = (CLAIM, RELEASE, ADMIN_ASSIGN)
+
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = float(os.environ.get("LOCKER_AUDIT_FLUSH_SECONDS", "2"))
+# while MySQL is unreachable the buffer keeps at most this many events, dropping the oldest
+MAX_BUFFERED = 10000
+PARTITION_MONTHS_AHEAD = 2
+
+log = logging.getLogger(__name__)
+
+INSERT_SQL = (
+    "INSERT INTO locker_events (occurred_at, event_type, locker_id, user_id, actor_id, detail) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+EVENT_COLUMNS = "event_id, occurred_at, event_type, locker_id, user_id, actor_id, detail"
+HOLDER_AT_SQL = (
+    f"SELECT event_type, user_id FROM locker_events "
+    f"WHERE locker_id = %s AND occurred_at <= %s AND event_type IN ({', '.join(['%s'] * len(OWNERSHIP_EVENTS))}) "
+    f"ORDER BY occurred_at DESC, event_id DESC LIMIT 1"
+)
+
+
+def history_query(locker_id=None, user_id=None, since=None, until=None, event_types=None, limit=200):
+    # (sql, params) for AuditLog.history; built here so migrations.py can EXPLAIN the same statement
+    where, params = [], []
+    if locker_id is not None:
+        where.append("locker_id = %s")
+        params.append(locker_id)
+    if user_id is not None:
+        where.append("user_id = %s")
+        params.append(user_id)
+    if since is not None:
+        where.append("occurred_at >= %s")
+        params.append(since)
+    if until is not None:
+        where.append("occurred_at < %s")
+        params.append(until)
+    if event_types:
+        where.append(f"event_type IN ({', '.join(['%s'] * len(event_types))})")
+        params.extend(event_types)
+    sql = f"SELECT {EVENT_COLUMNS} FROM locker_events"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY occurred_at DESC, event_id DESC LIMIT %s"
+    params.append(limit)
+    return sql, tuple(params)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def month_starts(first, count):
+    month = first.replace(day=1)
+    for _ in range(count):
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def partition_clause(month, upper):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{upper:%Y-%m-%d}'))"
+
+
+def create_table_sql(today=None):
+    # one partition per month; p_future catches anything past the last prepared month
+    months = list(month_starts(today or date.today(), PARTITION_MONTHS_AHEAD + 2))
+    parts = [partition_clause(m, nxt) for m, nxt in zip(months, months[1:])]
+    parts.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return f"""
+        CREATE TABLE IF NOT EXISTS locker_events (
+            event_id BIGINT NOT NULL AUTO_INCREMENT,
+            occurred_at DATETIME(3) NOT NULL,
+            event_type TINYINT UNSIGNED NOT NULL,
+            locker_id INT NULL,
+            user_id INT NULL,
+            actor_id INT NULL,
+            detail VARCHAR(255) NULL,
+            PRIMARY KEY (event_id, occurred_at),
+            KEY idx_events_locker_time (locker_id, occurred_at),
+            KEY idx_events_user_time (user_id, occurred_at),
+            KEY idx_events_time (occurred_at)
+        )
+        PARTITION BY RANGE (TO_DAYS(occurred_at)) (
+            {", ".join(parts)}
+        )
+    """
+
+
+def ensure_partitions(cursor, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    # splits p_future so the next months_ahead months each have their own partition
+    cursor.execute(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'locker_events' AND PARTITION_NAME IS NOT NULL"
+    )
+    existing = {r[0] for r in cursor.fetchall()}
+    if "p_future" not in existing:
+        return []
+    months = list(month_starts(today or date.today(), months_ahead + 2))
+    missing = [(m, nxt) for m, nxt in zip(months, months[1:]) if partition_name(m) not in existing]
+    last = max((n for n in existing if n != "p_future"), default=None)
+    missing = [(m, nxt) for m, nxt in missing if last is None or partition_name(m) > last]
+    if missing:
+        parts = [partition_clause(m, nxt) for m, nxt in missing]
+        cursor.execute(f"ALTER TABLE locker_events REORGANIZE PARTITION p_future INTO "
+                       f"({', '.join(parts)}, PARTITION p_future VALUES LESS THAN MAXVALUE)")
+    return [partition_name(m) for m, _ in missing]
+
+
+class Event:
+    __slots__ = ("event_id", "occurred_at", "event_type", "locker_id", "user_id", "actor_id", "detail")
+
+    def __init__(self, event_id, occurred_at, event_type, locker_id, user_id, actor_id, detail):
+        self.event_id = event_id
+        self.occurred_at = occurred_at
+        self.event_type = event_type
+        self.locker_id = locker_id
+        self.user_id = user_id
+        self.actor_id = actor_id
+        self.detail = detail
+
+    @property
+    def name(self):
+        return EVENT_NAMES.get(self.event_type, str(self.event_type))
+
+
+# --- Append-only event log: record() only touches memory, a writer thread batches the INSERTs ---
+class AuditLog:
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffer = deque()
+        self.dropped = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def record(self, event_type, locker_id=None, user_id=None, actor_id=None, detail=None):
+        row = (datetime.now(), event_type, locker_id, user_id, actor_id, detail[:255] if detail else None)
+        with self._lock:
+            if len(self.buffer) >= MAX_BUFFERED:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(row)
+            full = len(self.buffer) >= self.flush_size
+        self._start_writer()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        # writes everything buffered so far; returns the number of events written
+        with self._flush_lock:
+            with self._lock:
+                batch, self.buffer = self.buffer, deque()
+            if not batch:
+                return 0
+            try:
+                with db.connection() as pc:
+                    cursor = pc.cursor()
+                    try:
+                        cursor.executemany(INSERT_SQL, list(batch))
+                        pc.commit()
+                    finally:
+                        cursor.close()
+            except mysql.connector.Error as e:
+                # unreachable, or every pooled connection busy: keep the batch for the next round
+                if not (offline_journal.is_connection_error(e) or isinstance(e, mysql.connector.errors.PoolError)):
+                    # the rows themselves are bad; retrying would fail the same way and block the buffer
+                    log.error("dropping %d audit events MySQL refused: %s", len(batch), e)
+                    self.dropped += len(batch)
+                    raise
+                with self._lock:
+                    # put the batch back in front of anything recorded meanwhile
+                    batch.extend(self.buffer)
+                    while len(batch) > MAX_BUFFERED:
+                        batch.popleft()
+                        self.dropped += 1
+                    self.buffer = batch
+                raise
+            self.written += len(batch)
+            return len(batch)
+
+    def _start_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        partitions_checked = None
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if partitions_checked != date.today():
+                    self._maintain_partitions()
+                    partitions_checked = date.today()
+                self.flush()
+            except mysql.connector.Error:
+                pass    # unreachable: kept in the buffer for the next round; refused rows were logged and dropped
+
+    def _maintain_partitions(self):
+        with db.connection() as pc:
+            cursor = pc.cursor()
+            try:
+                ensure_partitions(cursor)
+            except mysql.connector.ProgrammingError:
+                pass    # no ALTER privilege: rows land in p_future until migrations run
+            finally:
+                cursor.close()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        try:
+            self.flush()
+        except mysql.connector.Error:
+            pass
+
+    # --- queries; every filter is served by one of the (column, occurred_at) indexes ---
+    def history(self, locker_id=None, user_id=None, since=None, until=None, event_types=None, limit=200):
+        sql, params = history_query(locker_id, user_id, since, until, event_types, limit)
+        return [Event(*r) for r in db.fetchall(sql, params)]
+
+    def holder_at(self, locker_id, when):
+        # user_id holding locker_id at `when` ("who had locker 7 last Tuesday"), or None
+        row = db.fetchone(HOLDER_AT_SQL, (locker_id, when) + OWNERSHIP_EVENTS)
+        if row is None or row[0] == RELEASE:
+            return None
+        return row[1]
+
+    def holders_between(self, locker_id, since, until):
+        # distinct user_ids that held locker_id at any point in [since, until)
+        holders = set()
+        first = self.holder_at(locker_id, since)
+        if first is not None:
+            holders.add(first)
+        for event in self.history(locker_id=locker_id, since=since, until=until, event_types=(CLAIM, ADMIN_ASSIGN),
+                                  limit=10000):
+            if event.user_id is not None:
+                holders.add(event.user_id)
+        return holders
+
+
+_log = None
+
+
+def get_audit_log():
+    global _log
+    if _log is None:
+        _log = AuditLog()
+        atexit.register(_log.close)
+    return _log
+
+
+def record(event_type, locker_id=None, user_id=None, actor_id=None, detail=None):
+    get_audit_log().record(event_type, locker_id, user_id, actor_id, detail)
+
+
+if __name__ == "__main__":
+    # usage: python audit_log.py LOCKER_ID [YYYY-MM-DD[THH:MM]]  -> who held the locker then
+    log = get_audit_log()
+    locker_id = int(sys.argv[1])
+    when = datetime.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else datetime.now()
+    print(f"locker {locker_id} at {when:%Y-%m-%d %H:%M}: user {log.holder_at(locker_id, when)}")
+    for event in log.history(locker_id=locker_id, until=when, limit=20):
+        print(f"  {event.occurred_at:%Y-%m-%d %H:%M:%S}  {event.name:<18} user={event.user_id} "
+              f"actor={event.actor_id} {event.detail or ''}")
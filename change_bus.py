@@ -0,0 +1,273 @@
+import os
+import sys
+import hmac
+import json
+import time
+import hashlib
+import uuid
+import atexit
+import socket
+import struct
+import threading
+
+# Kiosks on one LAN (or one machine) tell each other about locker changes over UDP multicast.
+# Messages are hints: MySQL stays authoritative, and a lost message is noticed by its sequence
+# number, so the receiver falls back to one change-log refresh. LOCKER_BUS=off turns it off.
+# Every datagram carries an HMAC-SHA256 under LOCKER_BUS_KEY, a secret shared by the kiosks;
+# without a key the bus stays off, since anyone on the segment could otherwise repaint the screens.
+ENABLED = os.environ.get("LOCKER_BUS", "on") != "off"
+KEY = os.environ.get("LOCKER_BUS_KEY", "").encode()
+GROUP = os.environ.get("LOCKER_BUS_GROUP", "239.255.42.99")
+PORT = int(os.environ.get("LOCKER_BUS_PORT", "50424"))
+# 1 keeps the datagrams on the local network segment
+TTL = int(os.environ.get("LOCKER_BUS_TTL", "1"))
+PROTOCOL_VERSION = 2
+MAX_DATAGRAM = 8192
+MAC_SIZE = hashlib.sha256().digest_size
+
+
+# --- What one datagram says; object names never go on the wire, only who holds what ---
+class ChangeMessage:
+    __slots__ = ("kiosk", "seq", "sent_at", "deltas", "reload", "gap")
+
+    def __init__(self, kiosk, seq, sent_at, deltas=(), reload=(), gap=False):
+        self.kiosk = kiosk
+        self.seq = seq
+        self.sent_at = sent_at
+        self.deltas = list(deltas)      # [(locker_id, user_id or None)]: the new holder
+        self.reload = list(reload)      # locker_ids changed in ways the sender did not spell out
+        self.gap = gap                  # messages from this kiosk were lost before this one
+
+    def encode(self, key):
+        # the HMAC-SHA256 of the JSON body, then the body
+        body = json.dumps({"v": PROTOCOL_VERSION, "k": self.kiosk, "s": self.seq, "t": self.sent_at,
+                           "d": self.deltas, "r": self.reload}, separators=(",", ":")).encode()
+        return hmac.new(key, body, hashlib.sha256).digest() + body
+
+    @classmethod
+    def decode(cls, data, key):
+        mac, body = data[:MAC_SIZE], data[MAC_SIZE:]
+        if not hmac.compare_digest(mac, hmac.new(key, body, hashlib.sha256).digest()):
+            raise ValueError("bad message authentication code")
+        msg = json.loads(body)
+        if msg.get("v") != PROTOCOL_VERSION:
+            raise ValueError(f"unsupported bus protocol {msg.get('v')!r}")
+        return cls(msg["k"], msg["s"], msg["t"], [tuple(d) for d in msg["d"]], msg["r"])
+
+
+# --- One per process: publishes this kiosk's changes, hands everyone else's to subscribers ---
+class ChangeBus:
+    def __init__(self, key=KEY, group=GROUP, port=PORT, ttl=TTL, kiosk_id=None):
+        if not key:
+            raise ValueError("the change bus needs a shared key (LOCKER_BUS_KEY)")
+        self.key = key
+        self.group = group
+        self.port = port
+        self.kiosk_id = kiosk_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.subscribers = []
+        self.sent = 0
+        self.received = 0
+        self.gaps = 0
+        self.rejected = 0                   # datagrams that failed the MAC check
+        self._seq = 0
+        self._last_seq = {}                 # kiosk_id -> last sequence number seen
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._receiver = None
+
+        self._out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._out.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self._out.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)   # kiosks on this machine too
+
+    # --- publishing ---
+    def publish(self, deltas=(), reload=()):
+        # never raises: a kiosk whose network is down still claims lockers, others catch up via MySQL
+        with self._lock:
+            self._seq += 1
+            message = ChangeMessage(self.kiosk_id, self._seq, time.time(), deltas, reload)
+        try:
+            self._out.sendto(message.encode(self.key), (self.group, self.port))
+        except OSError:
+            return False
+        self.sent += 1
+        return True
+
+    # --- subscribing; callbacks run on the receiver thread ---
+    def subscribe(self, callback):
+        # False if this machine cannot join the group; the caller then only sees its own changes
+        self.subscribers.append(callback)
+        try:
+            self._start_receiver()
+        except OSError:
+            self.subscribers.remove(callback)
+            return False
+        return True
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _start_receiver(self):
+        if self._receiver is None:
+            with self._lock:
+                if self._receiver is None:
+                    sock = self._listen_socket()
+                    self._receiver = threading.Thread(target=self._run, args=(sock,), name="change-bus",
+                                                      daemon=True)
+                    self._receiver.start()
+
+    def _listen_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)     # several kiosks on one machine
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        membership = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.settimeout(0.5)        # so close() is noticed
+        return sock
+
+    def _run(self, sock):
+        try:
+            while not self._stop.is_set():
+                try:
+                    data = sock.recv(MAX_DATAGRAM)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stop.is_set():
+                        break
+                    raise
+                try:
+                    message = ChangeMessage.decode(data, self.key)
+                except (ValueError, KeyError, TypeError):
+                    self.rejected += 1
+                    continue    # forged, another key or version, or not ours
+                if message.kiosk == self.kiosk_id:
+                    continue    # our own change is already on our screen
+                self._deliver(message)
+        finally:
+            sock.close()
+
+    def _deliver(self, message):
+        last = self._last_seq.get(message.kiosk)
+        if last is not None and message.seq <= last:
+            return      # duplicate or reordered old news
+        if last is not None and message.seq > last + 1:
+            message.gap = True
+            self.gaps += 1
+        self._last_seq[message.kiosk] = message.seq
+        self.received += 1
+        for callback in list(self.subscribers):
+            try:
+                callback(message)
+            except Exception:
+                pass    # one broken screen must not stop the others from updating
+
+    def stats(self):
+        return {"kiosk": self.kiosk_id, "sent": self.sent, "received": self.received, "gaps": self.gaps,
+                "rejected": self.rejected, "peers": len(self._last_seq)}
+
+    def close(self):
+        self._stop.set()
+        if self._receiver is not None:
+            self._receiver.join(timeout=2)
+        self._out.close()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_change_bus():
+    # None when the bus is switched off, has no key, or the network refuses multicast
+    global _bus
+    if _bus is None and ENABLED and KEY:
+        with _bus_lock:
+            if _bus is None:
+                try:
+                    _bus = ChangeBus()
+                except OSError:
+                    return None
+                atexit.register(_bus.close)
+    return _bus
+
+
+def publish(deltas=(), reload=()):
+    bus = get_change_bus()
+    return bus.publish(deltas, reload) if bus is not None else False
+
+
+# --- Simulation: several kiosks in one process, one group; every kiosk must converge ---
+def simulate(kiosks=4, events=200, lockers=16, interval_ms=2.0, port=None):
+    import random
+    import secrets
+    # every simulated kiosk has its own sockets, but all listen on one port: that is how a multicast
+    # group is joined. PORT + 1 keeps them clear of real kiosks on this machine.
+    port = port or PORT + 1
+    key = secrets.token_bytes(32)
+    buses = [ChangeBus(key, port=port, kiosk_id=f"sim-{n}") for n in range(kiosks)]
+    views = [{lid: None for lid in range(1, lockers + 1)} for _ in buses]
+    latencies = [[] for _ in buses]
+    reloads = [0] * kiosks
+    lock = threading.Lock()
+
+    def subscriber(n):
+        def on_message(message):
+            received_at = time.time()
+            with lock:
+                for locker_id, user_id in message.deltas:
+                    views[n][locker_id] = user_id
+                if message.gap:
+                    reloads[n] += 1
+                latencies[n].append((received_at - message.sent_at) * 1000)
+        return on_message
+
+    for n, bus in enumerate(buses):
+        bus.subscribe(subscriber(n))
+    time.sleep(0.2)     # let every receiver join the group
+
+    truth = {lid: None for lid in range(1, lockers + 1)}
+    rng = random.Random(7)
+    for _ in range(events):
+        n = rng.randrange(kiosks)
+        locker_id = rng.randint(1, lockers)
+        user_id = None if truth[locker_id] is not None else rng.randint(1, 50)
+        truth[locker_id] = user_id
+        with lock:
+            views[n][locker_id] = user_id       # the claiming kiosk updates its own screen directly
+        buses[n].publish([(locker_id, user_id)])
+        time.sleep(interval_ms / 1000)
+
+    deadline = time.time() + 2
+    while time.time() < deadline and any(v != truth for v in views):
+        time.sleep(0.01)
+
+    # a datagram under another key must be dropped by everyone
+    before = [dict(v) for v in views]
+    forged = ChangeMessage("intruder", 1, time.time(), [(1, 999)]).encode(b"not the kiosks' key")
+    buses[0]._out.sendto(forged, (buses[0].group, port))
+    time.sleep(0.2)
+    forged_ok = views == before and all(b.rejected for b in buses)
+
+    for bus in buses:
+        bus.close()
+    all_latencies = sorted(x for per in latencies for x in per)
+
+    def pct(p):
+        return all_latencies[min(len(all_latencies) - 1, int(len(all_latencies) * p))] if all_latencies else float("nan")
+
+    converged = [v == truth for v in views]
+    print(f"{kiosks} kiosks, {events} changes over {lockers} lockers: "
+          f"{sum(converged)}/{kiosks} converged, {sum(b.gaps for b in buses)} gap(s) -> {sum(reloads)} reload(s)")
+    print(f"publish -> applied on the other kiosks: p50 {pct(0.5):.2f} ms  p95 {pct(0.95):.2f} ms  "
+          f"max {max(all_latencies, default=0):.2f} ms over {len(all_latencies)} deliveries")
+    if not forged_ok:
+        print("  REGRESSION: a message under the wrong key was applied or not counted as rejected")
+    # a kiosk that saw a gap would reload from MySQL, so it converges either way
+    return forged_ok and all(c or reloads[n] for n, c in enumerate(converged))
+
+
+if __name__ == "__main__":
+    # usage: python change_bus.py [KIOSKS [EVENTS [LOCKERS]]]
+    sys.exit(0 if simulate(*[int(a) for a in sys.argv[1:4]]) else 1)
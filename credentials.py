@@ -0,0 +1,139 @@
+import os
+import sys
+import hmac
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+# scrypt cost; the defaults take ~100 ms and 16 MiB on a Pi 4, tune down for a Pi 3
+SCRYPT_N = int(os.environ.get("LOCKER_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("LOCKER_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("LOCKER_SCRYPT_P", "1"))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+VERIFY_CACHE_SIZE = 256
+VERIFY_CACHE_TTL = float(os.environ.get("LOCKER_VERIFY_CACHE_TTL", "900"))
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2), dklen=HASH_BYTES)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith("scrypt$")
+
+
+def verify_password(password, stored):
+    # returns (matches, needs_rehash); plaintext rows from before hashing still verify once
+    if not stored:
+        return False, False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    _, n, r, p, salt, digest = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    ok = hmac.compare_digest(_scrypt(password, _unb64(salt), n, r, p), _unb64(digest))
+    return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# --- Short-lived memory of recent successful verifications ---
+class VerificationCache:
+    def __init__(self, size=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._key = os.urandom(32)      # per process, so entries are useless outside it
+        self._entries = OrderedDict()   # username -> (token, stored hash, expiry)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _token(self, username, password):
+        return hmac.new(self._key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+    def check(self, username, password, stored):
+        # a hit needs the same password AND an unchanged stored hash, so resets invalidate it
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                token, cached_stored, expiry = entry
+                if (time.monotonic() < expiry and cached_stored == stored and
+                        hmac.compare_digest(token, self._token(username, password))):
+                    self._entries.move_to_end(username)
+                    self.hits += 1
+                    return True
+                del self._entries[username]
+            self.misses += 1
+            return False
+
+    def remember(self, username, password, stored):
+        with self._lock:
+            self._entries[username] = (self._token(username, password), stored, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def forget(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+
+_cache = VerificationCache()
+
+
+def get_verification_cache():
+    return _cache
+
+
+def check_login(username, password, stored):
+    # returns (matches, new_hash); new_hash is set when the stored value should be replaced
+    if _cache.check(username, password, stored):
+        return True, None
+    ok, needs_rehash = verify_password(password, stored)
+    if not ok:
+        return False, None
+    new_hash = hash_password(password) if needs_rehash else None
+    _cache.remember(username, password, new_hash or stored)
+    return True, new_hash
+
+
+# --- Benchmark: hash cost vs. login latency on this machine ---
+def benchmark(rounds=5):
+    print(f"{'N':>8} {'r':>3} {'p':>3} {'hash ms':>9} {'verify ms':>10} {'cached ms':>10}")
+    for n in (2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15):
+        cache = VerificationCache()
+        hashes, verifies, cached = [], [], []
+        for i in range(rounds):
+            t = time.perf_counter()
+            stored = hash_password("correct horse", n=n)
+            hashes.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            verify_password("correct horse", stored)
+            verifies.append(time.perf_counter() - t)
+            cache.remember("bench", "correct horse", stored)
+            t = time.perf_counter()
+            cache.check("bench", "correct horse", stored)
+            cached.append(time.perf_counter() - t)
+        avg = lambda xs: sum(xs) / len(xs) * 1000
+        print(f"{n:>8} {SCRYPT_R:>3} {SCRYPT_P:>3} {avg(hashes):>9.1f} {avg(verifies):>10.1f} {avg(cached):>10.3f}")
+    print(f"current setting: N={SCRYPT_N} r={SCRYPT_R} p={SCRYPT_P} (LOCKER_SCRYPT_N/R/P)")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
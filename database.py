@@ -1,9 +1,13 @@
-import mysql.connector
+import sys
+from api_client import get_client
+from table_model import PagedTableModel
+from db_executor import run_busy
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QMessageBox, QTableWidget, QTableWidgetItem,
-    QDialog, QDialogButtonBox, QComboBox, QInputDialog
+    QVBoxLayout, QHBoxLayout, QMessageBox, QTableView,
+    QDialog, QDialogButtonBox, QComboBox, QInputDialog, QTabWidget
 )
+from analytics_tab import AnalyticsTab
 
 # --- Dialog for Creating a New Table ---
 class CreateTableDialog(QDialog):
@@ -93,12 +97,19 @@ class DeleteColumnDialog(QDialog):
 
 # --- Dialog for Locker Data Input ---
 class LockerDataInputDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, locker_ids, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Locker Data Input")
-        self.setFixedSize(300, 200)
+        self.setFixedSize(300, 260)
         layout = QVBoxLayout(self)
 
+        layout.addWidget(QLabel("Locker:"))
+        self.locker_combo = QComboBox()
+        self.locker_combo.addItem("All Lockers", locker_ids)
+        for locker_id in locker_ids:
+            self.locker_combo.addItem(f"Locker {locker_id}", [locker_id])
+        layout.addWidget(self.locker_combo)
+
         layout.addWidget(QLabel("User ID:"))
         self.user_id_input = QLineEdit()
         layout.addWidget(self.user_id_input)
@@ -118,21 +129,43 @@ class LockerDataInputDialog(QDialog):
     def get_object_in_locker(self):
         return self.object_input.text().strip()
 
+    def get_locker_ids(self):
+        return self.locker_combo.currentData()
+
 # --- Main Admin Viewer ---
 class AdminViewer(QWidget):
-    def __init__(self):
+    def __init__(self, session):
         super().__init__()
+        # an admin session on the locker service; every read and write goes through its /admin endpoints
+        self.session = session
         self.setWindowTitle("Admin Table Viewer")
         self.setFixedSize(1100, 700)
 
-        self.layout = QVBoxLayout(self)
+        # raw tables on the first tab, usage rollups on the second
+        self.tabs = QTabWidget()
+        QVBoxLayout(self).addWidget(self.tabs)
+        tables_page = QWidget()
+        self.body = QVBoxLayout(tables_page)
+        self.tabs.addTab(tables_page, "Tables")
+        analytics = AnalyticsTab()
+        analytics.session = session
+        self.tabs.addTab(analytics, "Analytics")
 
         self.table_selector = QComboBox()
         self.table_selector.currentIndexChanged.connect(self.load_data_from_selected_table)
-        self.layout.addWidget(self.table_selector)
+        self.body.addWidget(self.table_selector)
+
+        # rows are paged in from the server as the view scrolls
+        self.model = PagedTableModel(lambda *page: get_client().table_rows(self.session, *page), self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.body.addWidget(self.table)
 
-        self.table = QTableWidget()
-        self.layout.addWidget(self.table)
+        self.row_count_label = QLabel()
+        self.body.addWidget(self.row_count_label)
+        self.model.modelReset.connect(self.update_row_count)
+        self.model.rowsInserted.connect(self.update_row_count)
+        self.model.load_failed.connect(self.show_error)
 
         btn_layout = QHBoxLayout()
         for name, slot in [
@@ -140,193 +173,159 @@ class AdminViewer(QWidget):
             ("Add Column", self.show_add_column_dialog),
             ("Delete Column", self.show_delete_column_dialog),
             ("Remove User", self.show_remove_user_dialog),
-            ("Refresh Data", self.load_data),
+            ("Refresh Data", self.refresh),
             ("Save Changes", self.save_changes),
             ("Locker Data Input", self.show_locker_data_input_dialog),
         ]:
             btn = QPushButton(name)
             btn.clicked.connect(slot)
             btn_layout.addWidget(btn)
-        self.layout.addLayout(btn_layout)
+        self.body.addLayout(btn_layout)
 
         self.load_data()
 
-    def db_connect(self):
-        return mysql.connector.connect(
-            host="localhost", user="adminuser", password="adminpass", database="locker_system"
-        )
-
-    def load_data(self):
-        try:
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
-            self.table_selector.clear()
-            for table in tables:
-                self.table_selector.addItem(table[0])
-            cursor.close()
-            conn.close()
-            self.load_data_from_selected_table()
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Error", str(e))
+    def show_error(self, e):
+        QMessageBox.critical(self, "Error", str(e))
+
+    def run_api(self, name, *args, on_result=None):
+        # LockerClient.<name>(session, *args) on the DB executor; the viewer shows busy until it answers
+        return run_busy(self, lambda: getattr(get_client(), name)(self.session, *args),
+                        on_result=on_result, on_error=self.show_error)
+
+    def refresh(self):
+        self.load_data(refresh=True)
+
+    def load_data(self, refresh=False):
+        self.run_api("tables", refresh, on_result=self.show_tables)
+
+    def show_tables(self, tables):
+        current = self.table_selector.currentText()
+        self.table_selector.blockSignals(True)
+        self.table_selector.clear()
+        self.table_selector.addItems(tables)
+        if current in tables:
+            self.table_selector.setCurrentText(current)
+        self.table_selector.blockSignals(False)
+        self.load_data_from_selected_table()
 
     def load_data_from_selected_table(self):
         selected_table = self.table_selector.currentText()
         if not selected_table:
             return
-        try:
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute(f"DESCRIBE {selected_table}")
-            cols = [c[0] for c in cursor.fetchall()]
-            cursor.execute(f"SELECT * FROM {selected_table}")
-            rows = cursor.fetchall()
-            cursor.close()
-            conn.close()
-
-            self.table.setColumnCount(len(cols))
-            self.table.setHorizontalHeaderLabels(cols)
-            self.table.setRowCount(len(rows))
-            for r, row in enumerate(rows):
-                for c, val in enumerate(row):
-                    self.table.setItem(r, c, QTableWidgetItem(str(val)))
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Error", str(e))
+        self.run_api("describe_table", selected_table, on_result=lambda info: self.model.load(selected_table, *info))
+
+    def after_write(self, message):
+        QMessageBox.information(self, "Success", message)
+        self.load_data()
 
     def show_create_table_dialog(self):
         dlg = CreateTableDialog(self)
         if dlg.exec() == QDialog.Accepted:
-            try:
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                cursor.execute(f"CREATE TABLE {dlg.get_table_name()} ({dlg.get_column_name()} {dlg.get_data_type()})")
-                conn.commit()
-                cursor.close()
-                conn.close()
-                QMessageBox.information(self, "Success", "Table created.")
-                self.load_data()
-            except mysql.connector.Error as e:
-                QMessageBox.critical(self, "Error", str(e))
+            self.run_api("create_table", dlg.get_table_name(), dlg.get_column_name(), dlg.get_data_type(),
+                         on_result=lambda _: self.after_write("Table created."))
 
     def show_add_column_dialog(self):
         dlg = AddColumnDialog(self)
         if dlg.exec() == QDialog.Accepted:
-            try:
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                cursor.execute(f"ALTER TABLE {self.table_selector.currentText()} ADD COLUMN {dlg.get_column_name()} {dlg.get_data_type()}")
-                conn.commit()
-                cursor.close()
-                conn.close()
-                QMessageBox.information(self, "Success", "Column added.")
-                self.load_data()
-            except mysql.connector.Error as e:
-                QMessageBox.critical(self, "Error", str(e))
+            self.run_api("add_column", self.table_selector.currentText(), dlg.get_column_name(), dlg.get_data_type(),
+                         on_result=lambda _: self.after_write("Column added."))
 
     def show_delete_column_dialog(self):
         selected_table = self.table_selector.currentText()
         if not selected_table:
             return
-        try:
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute(f"DESCRIBE {selected_table}")
-            columns = [c[0] for c in cursor.fetchall()]
-            cursor.close()
-            conn.close()
-
-            dlg = DeleteColumnDialog(columns, self)
-            if dlg.exec() == QDialog.Accepted:
-                column_to_delete = dlg.get_column_to_delete()
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                cursor.execute(f"ALTER TABLE {selected_table} DROP COLUMN {column_to_delete}")
-                conn.commit()
-                cursor.close()
-                conn.close()
-                QMessageBox.information(self, "Success", f"Column {column_to_delete} deleted.")
-                self.load_data()
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Error", str(e))
+        self.run_api("describe_table", selected_table,
+                     on_result=lambda info: self.confirm_delete_column(selected_table, info[0]))
+
+    def confirm_delete_column(self, selected_table, columns):
+        dlg = DeleteColumnDialog(columns, self)
+        if dlg.exec() == QDialog.Accepted:
+            column_to_delete = dlg.get_column_to_delete()
+            self.run_api("drop_column", selected_table, column_to_delete,
+                         on_result=lambda _: self.after_write(f"Column {column_to_delete} deleted."))
 
     def show_remove_user_dialog(self):
         user_to_remove, ok = QInputDialog.getText(self, "Remove User", "Enter user ID:")
+        user_to_remove = user_to_remove.strip()
         if ok and user_to_remove:
-            try:
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                cursor.execute(f"DELETE FROM users WHERE user_id = {user_to_remove}")
-                conn.commit()
-                cursor.close()
-                conn.close()
-                QMessageBox.information(self, "Success", f"User {user_to_remove} removed.")
-                self.load_data()
-            except mysql.connector.Error as e:
-                QMessageBox.critical(self, "Error", str(e))
+            if not user_to_remove.isdigit():
+                QMessageBox.warning(self, "Remove User", "User ID must be a number.")
+                return
+            # removed and audited by the locker service
+            self.run_api("remove_user", int(user_to_remove),
+                         on_result=lambda _: self.after_write(f"User {user_to_remove} removed."))
 
     def show_locker_data_input_dialog(self):
-        dlg = LockerDataInputDialog(self)
+        run_busy(self, lambda: get_client().layout(), on_result=self.open_locker_data_input,
+                 on_error=self.show_error)
+
+    def open_locker_data_input(self, bank):
+        dlg = LockerDataInputDialog(bank.ids(), self)
         if dlg.exec() == QDialog.Accepted:
             user_id = dlg.get_user_id()
+            if user_id and not user_id.isdigit():
+                QMessageBox.warning(self, "Locker Data Input", "User ID must be a number, or empty to free the lockers.")
+                return
             object_in_locker = dlg.get_object_in_locker()
-            try:
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                for locker_id in [1, 2]:
-                    cursor.execute(f"UPDATE lockers SET user_id = %s, object_in_locker = %s WHERE locker_id = %s",
-                                   (user_id, object_in_locker, locker_id))
-                conn.commit()
-                cursor.close()
-                conn.close()
-                QMessageBox.information(self, "Success", "Locker data updated.")
-                self.load_data()
-            except mysql.connector.Error as e:
-                QMessageBox.critical(self, "Error", str(e))
+            # one transaction on the locker service, audited and announced there
+            self.run_api("assign_lockers", int(user_id) if user_id else None, object_in_locker, dlg.get_locker_ids(),
+                         on_result=lambda _: self.after_write("Locker data updated."))
+
+    def update_row_count(self):
+        loaded = self.model.rowCount()
+        if self.model.exhausted:
+            self.row_count_label.setText(f"Rows: {loaded}")
+        else:
+            self.row_count_label.setText(f"Rows: {loaded} loaded of ~{max(loaded, self.model.estimated_rows)}")
 
     def save_changes(self):
         selected_table = self.table_selector.currentText()
         if not selected_table:
             return
-        
-        try:
-            conn = self.db_connect()
-            cursor = conn.cursor()
-
-            # Handle the users table separately
-            if selected_table == 'users':
-                for row in range(self.table.rowCount()):
-                    user_id = self.table.item(row, 0).text()  # Assuming first column is user_id
-                    set_values = []
-                    for col in range(1, self.table.columnCount()):  # Start from 1 to skip user_id
-                        col_name = self.table.horizontalHeaderItem(col).text()
-                        set_values.append(f"{col_name} = '{self.table.item(row, col).text()}'")
-                    set_clause = ", ".join(set_values)
-                    cursor.execute(f"UPDATE {selected_table} SET {set_clause} WHERE user_id = {user_id}")
-
-            # Handle the lockers table separately
-            elif selected_table == 'lockers':
-                for row in range(self.table.rowCount()):
-                    locker_id = self.table.item(row, 0).text()  # Assuming first column is locker_id
-                    set_values = []
-                    for col in range(1, self.table.columnCount()):  # Start from 1 to skip locker_id
-                        col_name = self.table.horizontalHeaderItem(col).text()
-                        set_values.append(f"{col_name} = '{self.table.item(row, col).text()}'")
-                    set_clause = ", ".join(set_values)
-                    cursor.execute(f"UPDATE {selected_table} SET {set_clause} WHERE locker_id = {locker_id}")
-
-            conn.commit()
-            cursor.close()
-            conn.close()
-            QMessageBox.information(self, "Success", "Changes saved.")
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Error", str(e))
+        if not self.model.edits:
+            QMessageBox.information(self, "Save Changes", "No changes to save.")
+            return
+        if not self.model.primary_key:
+            QMessageBox.warning(self, "Save Changes", f"Table {selected_table} has no primary key; cannot save edits.")
+            return
+
+        headers = self.model.columns
+        changes = [(self.model.edited_row_key(row), {headers[c]: v for c, v in edited.items()})
+                   for row, edited in self.model.edits.items()]
+        # written in one transaction, audited and announced by the locker service
+        self.run_api("save_rows", selected_table, changes, on_result=self.on_saved)
+
+    def on_saved(self, saved):
+        self.model.apply_edits()
+        QMessageBox.information(self, "Success", f"Changes saved ({saved} row(s)).")
+
+
+def admin_login():
+    # the editor works on an admin session of the locker service; None if cancelled or not an admin
+    while True:
+        username, ok = QInputDialog.getText(None, "Admin Login", "Username:")
+        if not ok:
+            return None
+        password, ok = QInputDialog.getText(None, "Admin Login", "Password:", QLineEdit.Password)
+        if not ok:
+            return None
+        session = get_client().login(username, password)
+        if session is not None and session.is_admin:
+            return session
+        if session is not None:
+            get_client().logout(session)
+        QMessageBox.warning(None, "Admin Login", "Invalid credentials, or not an administrator.")
+
 
 # --- Main Program ---
 if __name__ == "__main__":
     app = QApplication([])
-    viewer = AdminViewer()
+    session = admin_login()
+    if session is None:
+        sys.exit(0)
+    viewer = AdminViewer(session)
     viewer.show()
     app.exec()
+    get_client().logout(session)
 
 
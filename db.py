@@ -0,0 +1,257 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import errors
+
+# --- Connection settings (the only place credentials live) ---
+DB_CONFIG = {
+    "host": os.environ.get("LOCKER_DB_HOST", "localhost"),
+    "user": os.environ.get("LOCKER_DB_USER", "adminuser"),
+    "password": os.environ.get("LOCKER_DB_PASSWORD", "adminpass"),
+    "database": os.environ.get("LOCKER_DB_NAME", "locker_system"),
+    "connection_timeout": int(os.environ.get("LOCKER_DB_CONNECT_TIMEOUT", "5")),
+}
+POOL_SIZE = int(os.environ.get("LOCKER_DB_POOL_SIZE", "4"))
+CHECKOUT_TIMEOUT = float(os.environ.get("LOCKER_DB_CHECKOUT_TIMEOUT", "5"))
+# connections idle longer than this get pinged before being handed out
+HEALTH_CHECK_AFTER = float(os.environ.get("LOCKER_DB_HEALTH_CHECK_AFTER", "30"))
+# prepared cursors kept per connection; IN-lists and filters make new SQL text, so the cache is an LRU
+STATEMENT_CACHE_SIZE = int(os.environ.get("LOCKER_DB_STATEMENT_CACHE", "64"))
+
+
+# --- Pool counters ---
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.health_failures = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_checkout(self, hit, wait):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_health_failure(self):
+        with self.lock:
+            self.health_failures += 1
+
+    def snapshot(self):
+        with self.lock:
+            avg = self.total_wait / self.checkouts if self.checkouts else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "health_failures": self.health_failures,
+                "checkouts": self.checkouts,
+                "avg_checkout_ms": avg * 1000,
+                "max_checkout_ms": self.max_wait * 1000,
+            }
+
+
+# --- A pooled connection with its own prepared-statement cache ---
+class PooledConnection:
+    def __init__(self, conn, cache_size=STATEMENT_CACHE_SIZE):
+        self.conn = conn
+        self.cache_size = cache_size
+        self.statements = OrderedDict()     # sql -> prepared cursor, least recently used first
+        self.evictions = 0
+        self.last_used = time.monotonic()
+
+    def prepared(self, sql):
+        # one prepared cursor per distinct statement; the least recently used is closed past cache_size
+        cur = self.statements.get(sql)
+        if cur is not None:
+            self.statements.move_to_end(sql)
+            return cur
+        cur = self.conn.cursor(prepared=True)
+        self.statements[sql] = cur
+        while len(self.statements) > self.cache_size:
+            _, evicted = self.statements.popitem(last=False)
+            self._close_cursor(evicted)
+            self.evictions += 1
+        return cur
+
+    @staticmethod
+    def _close_cursor(cur):
+        # closing a prepared cursor deallocates its statement on the server
+        try:
+            cur.close()
+        except mysql.connector.Error:
+            pass
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def is_healthy(self):
+        try:
+            self.conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def close(self):
+        for cur in self.statements.values():
+            self._close_cursor(cur)
+        self.statements.clear()
+        try:
+            self.conn.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, checkout_timeout=CHECKOUT_TIMEOUT, **config):
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.config = config or dict(DB_CONFIG)
+        self.stats = PoolStats()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = mysql.connector.connect(autocommit=False, **self.config)
+        return PooledConnection(conn)
+
+    def _discard(self, pc):
+        pc.close()
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self):
+        start = time.perf_counter()
+        hit = True
+        try:
+            pc = self._idle.get_nowait()
+        except queue.Empty:
+            pc = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    hit = False
+            if not hit:
+                try:
+                    pc = self._open()
+                except mysql.connector.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    pc = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    raise errors.PoolError("No database connection available (pool exhausted)")
+
+        if hit and time.monotonic() - pc.last_used > HEALTH_CHECK_AFTER and not pc.is_healthy():
+            self.stats.record_health_failure()
+            self._discard(pc)
+            with self._lock:
+                self._created += 1
+            hit = False
+            try:
+                pc = self._open()
+            except mysql.connector.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        self.stats.record_checkout(hit, time.perf_counter() - start)
+        return pc
+
+    def release(self, pc, broken=False):
+        if broken:
+            self._discard(pc)
+            return
+        try:
+            if pc.conn.in_transaction:
+                pc.rollback()
+        except mysql.connector.Error:
+            self._discard(pc)
+            return
+        pc.last_used = time.monotonic()
+        self._idle.put(pc)
+
+    @contextmanager
+    def connection(self):
+        pc = self.acquire()
+        broken = False
+        try:
+            yield pc
+        except (errors.OperationalError, errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(pc, broken)
+
+    def close_all(self):
+        while True:
+            try:
+                pc = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pc)
+
+
+# --- Process-wide pool and shortcuts used by the GUIs ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+def fetchone(sql, params=()):
+    with connection() as pc:
+        cur = pc.prepared(sql)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        return rows[0] if rows else None
+
+
+def fetchall(sql, params=()):
+    with connection() as pc:
+        cur = pc.prepared(sql)
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def execute(sql, params=()):
+    # single statement in its own transaction, returns the affected row count
+    with connection() as pc:
+        cur = pc.prepared(sql)
+        cur.execute(sql, params)
+        pc.commit()
+        return cur.rowcount
+
+
+def pool_stats():
+    return get_pool().stats.snapshot()
@@ -0,0 +1,145 @@
+import os
+import threading
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal, Qt
+from PySide6.QtWidgets import QApplication
+
+DEFAULT_TIMEOUT_MS = int(os.environ.get("LOCKER_DB_JOB_TIMEOUT_MS", "8000"))
+# worker threads for the screens' blocking calls (locker service requests, MySQL in the admin tool)
+MAX_THREADS = int(os.environ.get("LOCKER_GUI_THREADS", "4"))
+
+
+class DbTimeoutError(Exception):
+    pass
+
+
+# --- One unit of database work run on the pool ---
+class DbJob(QRunnable):
+    def __init__(self, executor, fn, args, kwargs, on_result, on_error, on_finally):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.executor = executor
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_finally = on_finally
+        self.cancelled = False
+        self.settled = False        # result/error/timeout already delivered (GUI thread only)
+        self._started = threading.Event()
+
+    def run(self):
+        self._started.set()
+        if self.cancelled:
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.executor._job_done.emit(self, None, e)
+        else:
+            self.executor._job_done.emit(self, result, None)
+
+    def started(self):
+        return self._started.is_set()
+
+    def cancel(self):
+        # a job still queued is dropped; a running one finishes but its result is discarded
+        self.cancelled = True
+        if not self.started():
+            self.executor.pool.tryTake(self)
+        self.executor._settle(self)
+
+
+# --- Runs query jobs off the UI thread and hands results back through signals ---
+class DbExecutor(QObject):
+    busy_changed = Signal(bool)
+    _job_done = Signal(object, object, object)     # job, result, error (emitted from workers)
+
+    def __init__(self, max_threads=MAX_THREADS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.pending = set()
+        self._job_done.connect(self._on_job_done, Qt.QueuedConnection)
+
+    def submit(self, fn, *args, on_result=None, on_error=None, on_finally=None,
+               timeout_ms=DEFAULT_TIMEOUT_MS, **kwargs):
+        job = DbJob(self, fn, args, kwargs, on_result, on_error, on_finally)
+        self.pending.add(job)
+        if len(self.pending) == 1:
+            self.busy_changed.emit(True)
+        if timeout_ms:
+            QTimer.singleShot(timeout_ms, self, lambda: self._on_timeout(job, timeout_ms))
+        self.pool.start(job)
+        return job
+
+    def is_busy(self):
+        return bool(self.pending)
+
+    def wait_for_done(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _on_job_done(self, job, result, error):
+        if job.settled or job.cancelled:
+            return
+        self._settle(job)
+        if error is not None:
+            if job.on_error is not None:
+                job.on_error(error)
+        elif job.on_result is not None:
+            job.on_result(result)
+
+    def _on_timeout(self, job, timeout_ms):
+        if job.settled:
+            return
+        job.cancelled = True
+        if not job.started():
+            self.pool.tryTake(job)
+        self._settle(job)
+        if job.on_error is not None:
+            job.on_error(DbTimeoutError(f"Database did not respond within {timeout_ms / 1000:.0f}s"))
+
+    def _settle(self, job):
+        if job.settled:
+            return
+        job.settled = True
+        self.pending.discard(job)
+        if not self.pending:
+            self.busy_changed.emit(False)
+        if job.on_finally is not None:
+            job.on_finally()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = DbExecutor()
+    return _executor
+
+
+def run_async(fn, *args, **kwargs):
+    return get_executor().submit(fn, *args, **kwargs)
+
+
+# --- Busy state for screens waiting on the database ---
+def run_busy(widget, fn, *args, **kwargs):
+    # like run_async, but the screen stays disabled with a busy cursor until the job settles
+    set_busy(widget, True)
+    return run_async(fn, *args, on_finally=lambda: set_busy(widget, False), **kwargs)
+
+
+def set_busy(widget, busy):
+    count = getattr(widget, "_db_busy", 0) + (1 if busy else -1)
+    count = max(count, 0)
+    was_busy = getattr(widget, "_db_busy", 0) > 0
+    widget._db_busy = count
+    if (count > 0) == was_busy:
+        return
+    widget.setEnabled(count == 0)
+    if count:
+        QApplication.setOverrideCursor(Qt.BusyCursor)
+    else:
+        QApplication.restoreOverrideCursor()
@@ -0,0 +1,395 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# "gpio" on the Pi, "mock" for gpiozero's MockFactory, "sim" for a pure-Python timeline;
+# a bank with a relay_driver section drives its solenoids through relay_driver instead of one pin each
+BACKEND = os.environ.get("LOCKER_HARDWARE", "gpio")
+# lifetime activation counts per relay, kept across restarts to track wear
+COUNTERS_PATH = os.environ.get("LOCKER_COUNTERS_PATH",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "relay_counters.json"))
+# how often the locker service writes them out, so a power cut loses at most this much wear history
+COUNTERS_SAVE_SECONDS = int(os.environ.get("LOCKER_COUNTERS_SAVE_SECONDS", "60"))
+
+# sequence timings in ms (same feel as the old blocking beep/sleep calls)
+OPEN_BEEPS = ((200, 100), (200, 100))
+UNLOCK_HOLD_MS = 5000
+CLOSE_BEEP_MS = 500
+
+
+# --- Actuation sequences as (action, arg, delay_ms) steps, run by the locker service's AsyncActuator ---
+def unlock_steps(hold_ms=UNLOCK_HOLD_MS):
+    steps = []
+    for on_ms, off_ms in OPEN_BEEPS:
+        steps.append(("buzz", True, on_ms))
+        steps.append(("buzz", False, off_ms))
+    steps.append(("lock", True, hold_ms))
+    steps.extend(beep_steps(CLOSE_BEEP_MS))
+    steps.append(("lock", False, 0))
+    return steps
+
+
+def beep_steps(ms=CLOSE_BEEP_MS):
+    return [("buzz", True, ms), ("buzz", False, 0)]
+
+
+def sequence_ms(steps):
+    return sum(delay for _, _, delay in steps)
+
+
+# --- What the actuation code needs from the cabinet, whatever drives it ---
+class LockerHardware:
+    max_active = None       # solenoids that may be energised at once; None for no limit
+
+    def __init__(self, bank):
+        self.bank = bank
+
+    def set_lock(self, locker_id, unlocked):
+        raise NotImplementedError
+
+    def set_buzzer(self, on):
+        raise NotImplementedError
+
+    def is_unlocked(self, locker_id):
+        raise NotImplementedError
+
+    def buzzer_on(self):
+        raise NotImplementedError
+
+    def all_off(self):
+        for slot in self.bank:
+            self.set_lock(slot.locker_id, False)
+        self.set_buzzer(False)
+
+    def close(self):
+        pass
+
+
+# --- gpiozero devices; pin_factory=None uses whatever gpiozero picks on this machine ---
+class GpioHardware(LockerHardware):
+    def __init__(self, bank, pin_factory=None):
+        super().__init__(bank)
+        from gpiozero import OutputDevice, Buzzer
+        self.solenoids = {
+            slot.locker_id: OutputDevice(slot.gpio_pin, active_high=False, initial_value=False,
+                                         pin_factory=pin_factory)
+            for slot in bank
+        }
+        self.buzzer = Buzzer(bank.buzzer_pin, pin_factory=pin_factory)
+
+    def set_lock(self, locker_id, unlocked):
+        device = self.solenoids[locker_id]
+        device.on() if unlocked else device.off()
+
+    def set_buzzer(self, on):
+        self.buzzer.on() if on else self.buzzer.off()
+
+    def is_unlocked(self, locker_id):
+        return bool(self.solenoids[locker_id].value)
+
+    def buzzer_on(self):
+        return bool(self.buzzer.value)
+
+    def close(self):
+        for device in self.solenoids.values():
+            device.close()
+        self.buzzer.close()
+
+
+class MockHardware(GpioHardware):
+    # real gpiozero devices on simulated pins; pin.state shows the electrical level (active low)
+    def __init__(self, bank):
+        from gpiozero.pins.mock import MockFactory
+        self.factory = MockFactory()
+        super().__init__(bank, pin_factory=self.factory)
+
+    def pin_state(self, locker_id):
+        return self.solenoids[locker_id].pin.state
+
+
+# --- No gpiozero at all: every transition is appended to a timeline for inspection ---
+class SimulatedHardware(LockerHardware):
+    def __init__(self, bank, clock=time.perf_counter):
+        super().__init__(bank)
+        self.clock = clock
+        self.timeline = []      # (timestamp, channel, value); channel is a locker_id or "buzzer"
+        self._state = {slot.locker_id: False for slot in bank}
+        self._buzzer = False
+        self._lock = threading.Lock()
+
+    def _record(self, channel, value):
+        with self._lock:
+            self.timeline.append((self.clock(), channel, value))
+
+    def set_lock(self, locker_id, unlocked):
+        if locker_id not in self._state:
+            raise KeyError(locker_id)
+        if self._state[locker_id] != unlocked:
+            self._state[locker_id] = unlocked
+            self._record(locker_id, unlocked)
+
+    def set_buzzer(self, on):
+        if self._buzzer != on:
+            self._buzzer = on
+            self._record("buzzer", on)
+
+    def is_unlocked(self, locker_id):
+        return self._state[locker_id]
+
+    def buzzer_on(self):
+        return self._buzzer
+
+    def transitions(self, channel):
+        with self._lock:
+            return [(t, v) for t, c, v in self.timeline if c == channel]
+
+    def unlock_windows(self, locker_id):
+        # [(unlocked_at, locked_at)] for every completed unlock of one locker
+        windows, opened = [], None
+        for t, value in self.transitions(locker_id):
+            if value:
+                opened = t
+            elif opened is not None:
+                windows.append((opened, t))
+                opened = None
+        return windows
+
+    def clear(self):
+        with self._lock:
+            self.timeline.clear()
+
+
+def _relay_bank(bank):
+    from relay_driver import RelayBankHardware    # imports this module, so loaded on demand
+    return RelayBankHardware.from_bank(bank)
+
+
+BACKENDS = {
+    "gpio": GpioHardware,
+    "mock": MockHardware,
+    "sim": SimulatedHardware,
+    "relay": _relay_bank,
+}
+
+
+def create_hardware(bank, backend=None):
+    backend = backend or BACKEND
+    if backend == "gpio" and bank.relay_driver:
+        backend = "relay"
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown hardware backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](bank)
+
+
+class DeviceBusyError(Exception):
+    pass
+
+
+# --- A window's claim on some lockers' relays; the pins stay open when it is released ---
+class DeviceLease(LockerHardware):
+    def __init__(self, manager, locker_ids, owner):
+        super().__init__(manager.bank)
+        self.manager = manager
+        self.max_active = manager.hardware.max_active
+        self.locker_ids = frozenset(locker_ids)
+        self.owner = owner
+        self.active = True
+
+    def _check(self, locker_id=None):
+        if not self.active:
+            raise DeviceBusyError(f"lease held by {self.owner!r} was released")
+        if locker_id is not None and locker_id not in self.locker_ids:
+            raise DeviceBusyError(f"locker {locker_id} is not part of the lease held by {self.owner!r}")
+
+    def set_lock(self, locker_id, unlocked):
+        self._check(locker_id)
+        self.manager.set_lock(locker_id, unlocked)
+
+    def set_buzzer(self, on):
+        self._check()
+        self.manager.set_buzzer(on)
+
+    def is_unlocked(self, locker_id):
+        return self.manager.is_unlocked(locker_id)
+
+    def buzzer_on(self):
+        return self.manager.buzzer_on()
+
+    def all_off(self):
+        if not self.active:
+            return
+        for locker_id in self.locker_ids:
+            self.manager.set_lock(locker_id, False)
+        self.manager.set_buzzer(False)
+
+    def close(self):
+        # relock what we drove and hand the lockers back; the devices themselves stay open
+        self.all_off()
+        self.manager._release(self)
+
+
+# --- Owns the cabinet's devices for the life of the process and counts actuations ---
+class DeviceManager:
+    def __init__(self, hardware, counters_path=COUNTERS_PATH):
+        self.hardware = hardware
+        self.bank = hardware.bank
+        self.counters_path = counters_path
+        self.counters = self._load_counters()   # "locker:<id>" / "buzzer" -> activations, lifetime
+        self._saved = dict(self.counters)       # as last written to counters_path
+        self.leases = {}                        # locker_id -> DeviceLease
+        self.opened_at = time.time()
+        self._lock = threading.Lock()
+
+    def lease(self, owner, locker_ids=None):
+        locker_ids = self.bank.ids() if locker_ids is None else list(locker_ids)
+        with self._lock:
+            busy = {self.leases[lid].owner for lid in locker_ids if lid in self.leases}
+            if busy:
+                raise DeviceBusyError(f"lockers already leased by {', '.join(map(str, busy))}")
+            lease = DeviceLease(self, locker_ids, owner)
+            for locker_id in locker_ids:
+                self.leases[locker_id] = lease
+            return lease
+
+    def _release(self, lease):
+        with self._lock:
+            lease.active = False
+            for locker_id in lease.locker_ids:
+                if self.leases.get(locker_id) is lease:
+                    del self.leases[locker_id]
+        self.save_counters()
+
+    def set_lock(self, locker_id, unlocked):
+        with self._lock:
+            was_unlocked = self.hardware.is_unlocked(locker_id)
+            self.hardware.set_lock(locker_id, unlocked)
+            # count only relays that actually energised; a refused unlock raises before this
+            if unlocked and not was_unlocked and self.hardware.is_unlocked(locker_id):
+                key = f"locker:{locker_id}"
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def set_buzzer(self, on):
+        with self._lock:
+            if on and not self.hardware.buzzer_on():
+                self.counters["buzzer"] = self.counters.get("buzzer", 0) + 1
+            self.hardware.set_buzzer(on)
+
+    def is_unlocked(self, locker_id):
+        return self.hardware.is_unlocked(locker_id)
+
+    def buzzer_on(self):
+        return self.hardware.buzzer_on()
+
+    # --- introspection ---
+    def pin_states(self):
+        states = {slot.locker_id: self.hardware.is_unlocked(slot.locker_id) for slot in self.bank}
+        states["buzzer"] = self.hardware.buzzer_on()
+        return states
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.hardware).__name__,
+                "uptime_s": time.time() - self.opened_at,
+                "actuations": dict(self.counters),
+                "pins": self.pin_states(),
+                "leased": {lid: lease.owner for lid, lease in self.leases.items()},
+            }
+
+    def _load_counters(self):
+        try:
+            with open(self.counters_path) as f:
+                return {str(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def save_counters(self):
+        # writes the counters if they changed since the last save, so it is cheap to call often
+        with self._lock:
+            if self.counters == self._saved:
+                return False
+            counters = dict(self.counters)
+        tmp = self.counters_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(counters, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.counters_path)
+        self._saved = counters
+        return True
+
+    def close(self):
+        with self._lock:
+            for lease in set(self.leases.values()):
+                lease.active = False
+            self.leases.clear()
+            self.hardware.all_off()
+            self.hardware.close()
+        self.save_counters()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_device_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                from locker_bank import get_bank
+                _manager = DeviceManager(create_hardware(get_bank()))
+    return _manager
+
+
+def shutdown_devices():
+    # the only place pins are released; call once when the application quits
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+
+
+# --- Self-check: unlock_steps on gpiozero's mock pins, checking the electrical levels it leaves ---
+def self_check(lockers=4, hold_ms=UNLOCK_HOLD_MS):
+    from locker_bank import LockerBank
+    bank = LockerBank.from_dict({"buzzer_pin": 22,
+                                 "lockers": [{"locker_id": i + 1, "gpio_pin": 4 + i} for i in range(lockers)]})
+    hw = MockHardware(bank)
+    try:
+        # solenoid relays are active low: a locked door is a high pin
+        assert all(hw.pin_state(lid) for lid in bank.ids()), "every relay must start locked (pin high)"
+        assert not hw.buzzer_on(), "the buzzer must start off"
+        steps = unlock_steps(hold_ms)
+        assert sequence_ms(steps) == sum(on + off for on, off in OPEN_BEEPS) + hold_ms + CLOSE_BEEP_MS, \
+            "the sequence must last beeps + hold + closing beep"
+        # the steps are applied without their delays; only the pin levels along the way are checked
+        beeps = opened = 0
+        for action, arg, _ in steps:
+            if action == "buzz":
+                hw.set_buzzer(arg)
+                beeps += arg
+            else:
+                hw.set_lock(1, arg)
+                if arg:
+                    opened += 1
+                    assert hw.is_unlocked(1) and not hw.pin_state(1), "an open relay must drive its pin low"
+                    assert all(hw.pin_state(lid) for lid in bank.ids() if lid != 1), "only locker 1 may open"
+        assert opened == 1, f"the relay opened {opened} times, expected once"
+        assert beeps == len(OPEN_BEEPS) + 1, f"{beeps} beeps, expected {len(OPEN_BEEPS) + 1}"
+        assert not hw.is_unlocked(1) and hw.pin_state(1), "locker 1 must end locked (pin high)"
+        assert not hw.buzzer_on(), "the buzzer must end off"
+        hw.set_lock(2, True)
+        hw.set_buzzer(True)
+        hw.all_off()
+        assert all(hw.pin_state(lid) for lid in bank.ids()) and not hw.buzzer_on(), "all_off must relock everything"
+    finally:
+        hw.close()
+    print(f"{lockers} lockers on mock pins: unlock sequence of {len(steps)} steps leaves every relay locked, "
+          f"buzzer off")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if self_check(*[int(a) for a in sys.argv[1:3]]) else 1)
@@ -0,0 +1,163 @@
+import os
+import hmac
+import hashlib
+import secrets
+import mysql.connector
+import db
+import credentials
+import audit_log
+import change_bus
+import otp_service
+from locker_bank import get_bank
+from locker_state import get_state_cache
+from offline_journal import get_journal, is_connection_error
+from registration import register_user, get_identity_index
+from session import Session
+
+# Everything a kiosk can do, as plain blocking functions with no Qt in sight. locker_server.py puts
+# them behind the JSON API; claim/release live in locker_service.py and registration in registration.py.
+
+# taken usernames are re-read at most this often for the as-you-type hints
+IDENTITY_INDEX_MAX_AGE = 60
+# keys the tag a failed login for an unknown name is audited under; without it the tags only match
+# within one run of the service
+AUDIT_KEY = os.environ.get("LOCKER_AUDIT_KEY", "").encode() or secrets.token_bytes(32)
+
+USER_OVERVIEW_SQL = """
+    SELECT
+        u.username,
+        u.name,
+        u.birthday,
+        TIMESTAMPDIFF(YEAR, u.birthday, CURDATE()) AS age,
+        l.locker_id
+    FROM users u
+    LEFT JOIN lockers l ON u.user_id = l.user_id
+"""
+ASSIGN_SQL = "UPDATE lockers SET user_id = %s, object_in_locker = %s WHERE locker_id = %s"
+REMOVE_USER_SQL = "DELETE FROM users WHERE user_id = %s"
+# BINARY keeps the username lookup on the index while matching case exactly
+LOGIN_SQL = "SELECT user_id, role, password, name FROM users WHERE username=%s AND BINARY username=%s"
+USER_EXISTS_SQL = "SELECT 1 FROM users WHERE username=%s"
+OTP_LOOKUP_SQL = (
+    "SELECT user_id FROM users "
+    "WHERE username=%s AND BINARY username=%s AND BINARY name=%s AND birthday=%s AND age=%s"
+)
+
+
+# --- Login ---
+def authenticate(username, password):
+    # returns a Session or None; falls back to the offline credential cache while MySQL is down
+    session, user_id = _authenticate(username, password)
+    if session:
+        audit_log.record(audit_log.LOGIN, user_id=session.user_id)
+    elif user_id is not None:
+        audit_log.record(audit_log.LOGIN_FAILED, user_id=user_id)
+    else:
+        # no such account. What was typed is sometimes a password, so only a keyed tag is kept: it shows
+        # repeated tries of one name without being reversible from a dictionary
+        tag = hmac.new(AUDIT_KEY, username.encode(), hashlib.sha256).hexdigest()[:16]
+        audit_log.record(audit_log.LOGIN_FAILED, detail=f"unknown username tag={tag}")
+    return session
+
+
+def _authenticate(u, p):
+    # (session or None, user_id of the account u names or None)
+    journal = get_journal()
+    if journal.is_offline():
+        return _offline(journal, u, p)
+    try:
+        row = db.fetchone(LOGIN_SQL, (u, u))
+    except mysql.connector.Error as e:
+        if not is_connection_error(e):
+            raise
+        # MySQL is down: fall back to the credentials cached at the last online login
+        journal.mark_offline()
+        return _offline(journal, u, p)
+    if not row:
+        return None, None
+    user_id, role, stored, name = row
+    ok, new_hash = credentials.check_login(u, p, stored)
+    if not ok:
+        return None, user_id
+    if new_hash:
+        # plaintext or outdated hash: upgrade it now that we know the password
+        db.execute("UPDATE users SET password=%s WHERE user_id=%s", (new_hash, user_id))
+        stored = new_hash
+    session = Session(user_id, u, role, name)
+    journal.remember_login(session, stored)
+    if not session.is_admin:
+        get_bank()  # the locker screen needs the layout next; load it now
+    return session, user_id
+
+
+def _offline(journal, u, p):
+    session = journal.check_login(u, p)
+    return session, session.user_id if session else None
+
+
+def user_exists(username):
+    return db.fetchone(USER_EXISTS_SQL, (username,)) is not None
+
+
+# --- Registration hints ---
+def check_identity(username, name, birthday):
+    # (username_taken, identity_taken); either may be None if the index could not be read yet
+    index = get_identity_index().refresh(IDENTITY_INDEX_MAX_AGE)
+    return (index.username_taken(username) if username else False,
+            index.identity_taken(name, birthday) if name else False)
+
+
+def register(username, password, name, age, birthday):
+    return register_user(username, password, name, age, birthday)
+
+
+# --- Password reset by one-time code ---
+def issue_otp(username, name, birthday, age):
+    # (user_id, username, otp) when the details match the account, else None
+    r = db.fetchone(OTP_LOOKUP_SQL, (username, username, name, birthday, age))
+    if not r:
+        return None
+    return r[0], username, otp_service.get_otp_service().issue(r[0])
+
+
+def reset_password(user_id, username, otp, new_password):
+    # (status, retry_after seconds); status is one of otp_service.OK/INVALID/EXPIRED/THROTTLED.
+    # user_id and username are the account issue_otp matched, as the service remembered it
+    service = otp_service.get_otp_service()
+    status = service.verify(user_id, otp)
+    if status == otp_service.OK:
+        db.execute("UPDATE users SET password=%s WHERE user_id=%s",
+                   (credentials.hash_password(new_password), user_id))
+        credentials.get_verification_cache().forget(username)
+    retry_after = service.retry_after(user_id) if status == otp_service.THROTTLED else 0
+    return status, retry_after
+
+
+# --- Lockers ---
+def locker_states():
+    cache = get_state_cache()
+    cache.refresh()
+    return [cache.states[lid] for lid in sorted(cache.states)]
+
+
+# --- Admin ---
+def user_overview():
+    return db.fetchall(USER_OVERVIEW_SQL)
+
+
+def assign_lockers(actor_id, user_id, object_in_locker, locker_ids):
+    params = [(user_id, object_in_locker, locker_id) for locker_id in locker_ids]
+    with db.connection() as pc:
+        cursor = pc.cursor()
+        try:
+            cursor.executemany(ASSIGN_SQL, params)
+            pc.commit()
+        except mysql.connector.Error:
+            pc.rollback()
+            raise
+        finally:
+            cursor.close()
+    for locker_id in locker_ids:
+        audit_log.record(audit_log.ADMIN_ASSIGN, locker_id, user_id or None, actor_id, object_in_locker)
+    change_bus.publish(reload=list(locker_ids))
+    return len(params)
@@ -0,0 +1,113 @@
+import os
+import json
+import math
+
+# used when neither a config file nor the lockers table provides a layout
+DEFAULT_LAYOUT = {
+    "buzzer_pin": 22,
+    "lockers": [
+        {"locker_id": 1, "gpio_pin": 17, "relay_channel": 0, "row": 0, "col": 0},
+        {"locker_id": 2, "gpio_pin": 27, "relay_channel": 1, "row": 0, "col": 1},
+    ],
+}
+CONFIG_PATH = os.environ.get("LOCKER_BANK_CONFIG",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "lockers.json"))
+
+
+class LockerSlot:
+    __slots__ = ("locker_id", "gpio_pin", "relay_channel", "row", "col")
+
+    def __init__(self, locker_id, gpio_pin=None, relay_channel=None, row=None, col=None):
+        self.locker_id = int(locker_id)
+        self.gpio_pin = gpio_pin
+        self.relay_channel = relay_channel
+        self.row = row
+        self.col = col
+
+    def __repr__(self):
+        return f"LockerSlot({self.locker_id}, gpio_pin={self.gpio_pin}, relay_channel={self.relay_channel})"
+
+
+# --- Registry of every compartment in the cabinet, indexed by locker_id ---
+class LockerBank:
+    def __init__(self, slots, buzzer_pin=DEFAULT_LAYOUT["buzzer_pin"], relay_driver=None):
+        self.buzzer_pin = buzzer_pin
+        self.relay_driver = relay_driver    # expander/shift-register settings; None = one GPIO per locker
+        self._slots = {}
+        for slot in slots:
+            self._slots[slot.locker_id] = slot
+        self._fill_missing_positions()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        return iter(sorted(self._slots.values(), key=lambda s: (s.row, s.col, s.locker_id)))
+
+    def __contains__(self, locker_id):
+        return locker_id in self._slots
+
+    def get(self, locker_id):
+        return self._slots[locker_id]
+
+    def ids(self):
+        return sorted(self._slots)
+
+    def grid_size(self):
+        rows = max((s.row for s in self._slots.values()), default=-1) + 1
+        cols = max((s.col for s in self._slots.values()), default=-1) + 1
+        return rows, cols
+
+    def _fill_missing_positions(self):
+        # lockers without an explicit grid position are laid out in a near-square grid
+        missing = [s for s in sorted(self._slots.values(), key=lambda s: s.locker_id)
+                   if s.row is None or s.col is None]
+        if not missing:
+            return
+        cols = max(1, math.ceil(math.sqrt(len(self._slots))))
+        for n, slot in enumerate(missing):
+            slot.row, slot.col = divmod(n, cols)
+
+    @classmethod
+    def from_dict(cls, data):
+        slots = [LockerSlot(d["locker_id"], d.get("gpio_pin"), d.get("relay_channel"),
+                            d.get("row"), d.get("col"))
+                 for d in data["lockers"]]
+        return cls(slots, data.get("buzzer_pin", DEFAULT_LAYOUT["buzzer_pin"]), data.get("relay_driver"))
+
+    @classmethod
+    def from_file(cls, path=CONFIG_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_database(cls):
+        import db     # loaded here, so a kiosk that only draws the grid from the service needs no MySQL
+        rows = db.fetchall(
+            "SELECT locker_id, gpio_pin, relay_channel, grid_row, grid_col FROM lockers ORDER BY locker_id"
+        )
+        return cls([LockerSlot(*row) for row in rows])
+
+    @classmethod
+    def load(cls):
+        # config file wins, then the lockers table, then the built-in two-locker layout
+        if os.path.exists(CONFIG_PATH):
+            return cls.from_file(CONFIG_PATH)
+        import mysql.connector
+        try:
+            bank = cls.from_database()
+            if len(bank):
+                return bank
+        except mysql.connector.Error:
+            pass
+        return cls.from_dict(DEFAULT_LAYOUT)
+
+
+_bank = None
+
+
+def get_bank():
+    global _bank
+    if _bank is None:
+        _bank = LockerBank.load()
+    return _bank
@@ -1,66 +1,36 @@
 import sys
-import time
-import random
-import mysql.connector
-from PySide6.QtWidgets import (
-    QApplication, QWidget, QLabel, QLineEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QMessageBox, QDialog, QFormLayout,
-    QDateEdit, QInputDialog
-)
-from PySide6.QtGui import QFont, QIcon
-from PySide6.QtCore import Qt
-from gpiozero import OutputDevice, Buzzer
+import startup
+profiler = startup.get_profiler()
+with profiler.phase("import qt"):
+    from PySide6.QtWidgets import (
+        QApplication, QWidget, QLabel, QLineEdit, QPushButton,
+        QVBoxLayout, QHBoxLayout, QMessageBox, QFormLayout,
+        QDateEdit, QInputDialog, QGridLayout
+    )
+    from PySide6.QtGui import QFont, QIcon
+    from PySide6.QtCore import Qt, QTimer, QObject, Signal
 from datetime import date
-from admin_login_gui import AdminViewer  # or use the class inline if not using a separate file
+import theme
+from api_client import API_URL, get_client, stop_embedded, RemoteStateCache, RESET_OK, RESET_EXPIRED, RESET_THROTTLED
+from db_executor import run_async, run_busy
+from hardware import shutdown_devices
+from navigation import ScreenStack
+# The screens are clients of the locker service (locker_server.py) and never touch MySQL or the relays
+# themselves; the service and the admin layer are loaded after the login screen is painted.
 # single age‑calculator used by both forms
 def calculate_age(qdate):
     today = date.today()
     return today.year - qdate.year() - ((today.month, today.day) < (qdate.month(), qdate.day()))
 
-# theme colors
-BG_COLOR = "#F4F4F4"
-TEXT_COLOR = "#333333"
-BORDER_COLOR = "#CCCCCC"
-ACCENT_COLOR = "#4CAF50"
-ACCENT_HOVER = "#45A049"
-WIDGET_FONT = "Segoe UI"
+CHECK_DEBOUNCE_MS = 400
 
 class LockerSystem(QWidget):
-    def __init__(self):
-        super().__init__()
-
-        # Set window title and icon
-        self.setWindowTitle("System Shapers' Smart Lock System")
-        self.setWindowIcon(QIcon("/home/SystemShapers/LockerSystem/icon.png"))
-        self.setFixedSize(1100, 700)
-
-        # Apply global stylesheet
-        self.setStyleSheet(f"""
-            QWidget {{
-                background-color: {BG_COLOR};
-                font-family: {WIDGET_FONT};
-            }}
-            QLabel {{
-                color: {TEXT_COLOR};
-            }}
-            QLineEdit {{
-                background-color: white;
-                border: 1px solid {BORDER_COLOR};
-                border-radius: 8px;
-                padding: 12px;
-            }}
-            QPushButton {{
-                background-color: white;
-                color: black;
-                border: 2px solid black;
-                border-radius: 8px;
-                padding: 12px 24px;
-            }}
-            QPushButton:hover {{
-                background-color: black;
-                color: white;
-            }}
-        """)
+    def __init__(self, nav):
+        super().__init__(nav)
+        self.nav = nav
+        # styled by the app-wide theme (theme.py); the attribute lets a plain QWidget paint its background
+        self.setAttribute(Qt.WA_StyledBackground, True)
+        self.setProperty("screen", "login")
 
         # Title
         title = QLabel("System Shapers' Smart Lock System", alignment=Qt.AlignCenter)
@@ -70,14 +40,12 @@ class LockerSystem(QWidget):
         self.username_input = QLineEdit()
         self.username_input.setPlaceholderText("Username")
         self.username_input.setFont(QFont("Segoe UI", 18))
-        self.username_input.setStyleSheet("padding: 12px;")
 
         # Password input
         self.password_input = QLineEdit()
         self.password_input.setPlaceholderText("Password")
         self.password_input.setEchoMode(QLineEdit.Password)
         self.password_input.setFont(QFont("Segoe UI", 18))
-        self.password_input.setStyleSheet("padding: 12px;")
 
         # Buttons
         login_btn = QPushButton("Login")
@@ -113,34 +81,33 @@ class LockerSystem(QWidget):
 
         self.setLayout(main)
 
+    def enter(self):
+        self.username_input.clear()
+        self.password_input.clear()
+        self.username_input.setFocus()
+
     def login(self):
         u, p = self.username_input.text(), self.password_input.text()
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser", password="adminpass", database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("SELECT role FROM users WHERE BINARY username=%s AND password=%s", (u, p))
-            result = c.fetchone()
-            if result:
-                role = result[0]
-                QMessageBox.information(self, "Login", "Welcome " + u + "!")
-                self.hide()
-                if role == "admin":
-                    self.admin_win = AdminViewer()
-                    self.admin_win.show()
-                else:
-                    self.lw = LockerStatusWindow(u, self)
-                    self.lw.show()
-            else:
-                QMessageBox.critical(self, "Login Failed", "Invalid credentials.")
-            c.close()
-            conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+
+        def check():
+            client = get_client()
+            session = client.login(u, p)
+            if session and not session.is_admin:
+                client.layout()  # the locker screen needs the layout next; fetch it here, off the UI thread
+            return session
+
+        run_busy(self, check, on_result=self.on_login_result,
+                 on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
+
+    def on_login_result(self, session):
+        if session:
+            QMessageBox.information(self, "Login", "Welcome " + session.username + "!")
+            self.nav.show_screen("admin" if session.is_admin else "lockers", session=session)
+        else:
+            QMessageBox.critical(self, "Login Failed", "Invalid credentials.")
 
     def register_user(self):
-        RegisterWindow().exec()
+        self.nav.show_screen("register")
 
     def forgot_password(self):
         username = self.username_input.text().strip()
@@ -148,64 +115,22 @@ class LockerSystem(QWidget):
             QMessageBox.warning(self, "Input Required", "Please enter your username before proceeding.")
             return
 
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="adminuser",
-                password="adminpass",
-                database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("SELECT * FROM users WHERE username=%s", (username,))
-            result = c.fetchone()
-            c.close()
-            conn.close()
-
-            if result:
-                ForgotWindow(username, self).exec()
-            else:
-                QMessageBox.warning(self, "User Not Found", "The username you entered does not exist.")
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", str(e))
+        run_busy(self, lambda: get_client().user_exists(username),
+                 on_result=lambda exists: self.on_forgot_lookup(username, exists),
+                 on_error=lambda e: QMessageBox.critical(self, "Database Error", str(e)))
+
+    def on_forgot_lookup(self, username, exists):
+        if exists:
+            self.nav.show_screen("forgot", username=username)
+        else:
+            QMessageBox.warning(self, "User Not Found", "The username you entered does not exist.")
 
-class RegisterWindow(QDialog):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Register New User")
-        self.setFixedSize(1100, 700)
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {BG_COLOR};
-                font-family: {WIDGET_FONT};
-            }}
-            QLabel {{
-                color: {TEXT_COLOR};
-                font-size: 18px;
-            }}
-            QLineEdit, QDateEdit {{
-                background-color: white;
-                border: 1px solid {BORDER_COLOR};
-                border-radius: 8px;
-                padding: 12px;
-                font-size: 16px;
-            }}
-            QPushButton {{
-                background-color: white;
-                color: black;
-                border: 2px solid black;
-                border-radius: 8px;
-                padding: 12px 24px;
-                font-size: 16px;
-            }}
-            QPushButton:hover {{
-                background-color: black;
-                color: white;
-            }}
-            QPushButton:disabled {{
-                background-color: #95a5a6;
-                color: white;
-            }}
-        """)
+class RegisterWindow(QWidget):
+    def __init__(self, nav):
+        super().__init__(nav)
+        self.nav = nav
+        self.setAttribute(Qt.WA_StyledBackground, True)
+        self.setProperty("screen", "register")
 
         # Build form layout
         form = QFormLayout()
@@ -217,7 +142,9 @@ class RegisterWindow(QDialog):
         # Username
         self.un = QLineEdit()
         form.addRow("Username:", self.un)
-        self.un.editingFinished.connect(self.check_username_availability)
+        self.un_hint = QLabel()
+        self.un_hint.setProperty("role", "hint")
+        form.addRow("", self.un_hint)
 
         # Password
         self.pw = QLineEdit()
@@ -227,7 +154,6 @@ class RegisterWindow(QDialog):
         # Name
         self.nm = QLineEdit()
         form.addRow("Name:", self.nm)
-        self.nm.editingFinished.connect(self.check_name_birthday_availability)
 
         # Birthday
         self.bd = QDateEdit(calendarPopup=True)
@@ -240,6 +166,18 @@ class RegisterWindow(QDialog):
         self.age_lbl = QLabel()
         form.addRow("Age:", self.age_lbl)
         self.on_bd_change(self.bd.date())
+        self.nm_hint = QLabel()
+        self.nm_hint.setProperty("role", "hint")
+        form.addRow("", self.nm_hint)
+
+        # As-you-type duplicate hints, asked of the locker service once typing pauses
+        self.check_timer = QTimer(self)
+        self.check_timer.setSingleShot(True)
+        self.check_timer.setInterval(CHECK_DEBOUNCE_MS)
+        self.check_timer.timeout.connect(self.check_availability)
+        self.un.textEdited.connect(self.check_timer.start)
+        self.nm.textEdited.connect(self.check_timer.start)
+        self.bd.dateChanged.connect(self.check_timer.start)
 
         # Register button
         self.btn = QPushButton("Register")
@@ -248,7 +186,7 @@ class RegisterWindow(QDialog):
 
         # Back to Login button
         self.back_btn = QPushButton("Back to Login")
-        self.back_btn.clicked.connect(self.close)
+        self.back_btn.clicked.connect(lambda: self.nav.show_screen("login"))
         form.addRow("", self.back_btn)
 
         # Wrap form inside a central layout to make it bigger and padded like the login
@@ -260,48 +198,39 @@ class RegisterWindow(QDialog):
 
         self.setLayout(container)
 
+    def enter(self):
+        # built once; every visit starts from an empty form
+        self.check_timer.stop()
+        for field in (self.un, self.pw, self.nm, self.un_hint, self.nm_hint):
+            field.clear()
+        self.bd.setDate(date.today())
+        self.btn.setEnabled(True)
+
     def on_bd_change(self, d):
         age = calculate_age(d)
         self.age_lbl.setText(str(age) if age >= 0 else "")
 
-    def check_username_availability(self):
+    def check_availability(self):
         username = self.un.text().strip()
-        if not username:
-            return
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser", password="adminpass", database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("SELECT 1 FROM users WHERE username=%s", (username,))
-            if c.fetchone():
-                QMessageBox.warning(self, "Username Taken", f"The username '{username}' is already in use.")
-                self.un.clear()
-                self.un.setFocus()
-            c.close()
-            conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", str(e))
-
-    def check_name_birthday_availability(self):
         name = self.nm.text().strip()
         birthday = self.bd.date().toString("yyyy-MM-dd")
-        if not name:
-            return
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser", password="adminpass", database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("SELECT 1 FROM users WHERE name=%s AND birthday=%s", (name, birthday))
-            if c.fetchone():
-                QMessageBox.warning(self, "Duplicate Detected", f"A user with the name '{name}' and birthday '{birthday}' already exists.")
-                self.nm.clear()
-                self.nm.setFocus()
-            c.close()
-            conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", str(e))
+        run_async(lambda: get_client().check_identity(username, name, birthday),
+                  on_result=lambda taken: self.show_availability(username, name, birthday, *taken),
+                  on_error=lambda e: None)
+
+    def show_availability(self, username, name, birthday, username_taken, identity_taken):
+        if (username, name, birthday) != (self.un.text().strip(), self.nm.text().strip(),
+                                          self.bd.date().toString("yyyy-MM-dd")):
+            return      # typing went on while we asked; the next check answers for the new text
+        if username and username_taken:
+            self.un_hint.setText(f"The username '{username}' is already in use.")
+        else:
+            self.un_hint.clear()
+        if name and identity_taken:
+            self.nm_hint.setText(f"A user with the name '{name}' and birthday '{birthday}' already exists.")
+        else:
+            self.nm_hint.clear()
+        self.btn.setEnabled(not self.un_hint.text() and not self.nm_hint.text())
 
     def save(self):
         username = self.un.text().strip()
@@ -314,76 +243,27 @@ class RegisterWindow(QDialog):
             QMessageBox.warning(self, "Input Error", "Please fill in all required fields.")
             return
 
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser", password="adminpass", database="locker_system"
-            )
-            c = conn.cursor()
-
-            # Final duplicate checks
-            c.execute("SELECT 1 FROM users WHERE username=%s", (username,))
-            if c.fetchone():
-                QMessageBox.warning(self, "Duplicate Username", "This username is already taken.")
-                c.close()
-                conn.close()
-                return
-
-            c.execute("SELECT 1 FROM users WHERE name=%s AND birthday=%s", (name, birthday))
-            if c.fetchone():
-                QMessageBox.warning(self, "Duplicate User", "A user with the same name and birthday already exists.")
-                c.close()
-                conn.close()
-                return
-
-            # Register user
-            c.execute(
-                "INSERT INTO users(username, password, name, age, birthday, role) VALUES (%s, %s, %s, %s, %s, 'user')",
-                (username, password, name, age, birthday)
-            )
-            conn.commit()
-            c.close()
-            conn.close()
+        # the service's INSERT is the duplicate check; the hints above are only a preview
+        run_busy(self, lambda: get_client().register(username, password, name, age, birthday),
+                 on_result=self.on_registered, on_error=lambda e: QMessageBox.critical(self, "Database Error", str(e)))
 
+    def on_registered(self, duplicate):
+        if duplicate == "username":
+            QMessageBox.warning(self, "Duplicate Username", "This username is already taken.")
+        elif duplicate == "name_birthday":
+            QMessageBox.warning(self, "Duplicate User", "A user with the same name and birthday already exists.")
+        else:
             QMessageBox.information(self, "Success", "Registered successfully!")
-            self.accept()
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", str(e))
+            self.nav.show_screen("login")
 
-class ForgotWindow(QDialog):
-    def __init__(self, username, parent=None):
-        super().__init__(parent)
-        self.username = username
-        self.setWindowTitle("Forgot Password")
-        self.setFixedSize(1100, 700)  # Window size remains the same
-
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {BG_COLOR};
-                font-family: {WIDGET_FONT};
-            }}
-            QLabel {{
-                color: {TEXT_COLOR};
-                font-size: 16px;
-            }}
-            QLineEdit, QDateEdit {{
-                background-color: white;
-                border: 1px solid {BORDER_COLOR};
-                border-radius: 8px;
-                padding: 12px;
-                font-size: 18px;
-            }}
-            QPushButton {{
-                background-color: black;
-                color: white;
-                border: none;
-                border-radius: 8px;
-                padding: 12px 24px;
-                font-size: 18px;
-            }}
-            QPushButton:hover {{
-                background-color: #333;
-            }}
-        """)
+class ForgotWindow(QWidget):
+    def __init__(self, nav):
+        super().__init__(nav)
+        self.nav = nav
+        self.setAttribute(Qt.WA_StyledBackground, True)
+        self.setProperty("screen", "forgot")
+        self.username = None
+        self.reset_token = None
 
         form = QFormLayout()
         form.setLabelAlignment(Qt.AlignRight)
@@ -421,47 +301,41 @@ class ForgotWindow(QDialog):
         self.rt.clicked.connect(self.reset)
         form.addRow("", self.rt)
 
-        for w in (self.otp, self.np, self.rt):
-            w.setEnabled(False)
+        back = QPushButton("Back to Login")
+        back.clicked.connect(lambda: self.nav.show_screen("login"))
+        form.addRow("", back)
 
         self.setLayout(form)
 
+    def enter(self, username):
+        self.username = username
+        self.reset_token = None
+        for field in (self.fn, self.otp, self.np):
+            field.clear()
+        self.bd2.setDate(date.today())
+        for w in (self.otp, self.np, self.rt):
+            w.setEnabled(False)
+
     def on_bd2(self, d):
         self.age2.setText(str(calculate_age(d)))
 
     def verify(self):
         fn = self.fn.text()
         bd = self.bd2.date().toString("yyyy-MM-dd")
-        ag = self.age2.text()
-
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="adminuser",
-                password="adminpass",
-                database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("""
-                SELECT user_id FROM users
-                WHERE BINARY username=%s AND BINARY name=%s AND birthday=%s AND age=%s
-            """, (self.username, fn, bd, ag))
-
-            r = c.fetchone()
-            if r:
-                self.uid = r[0]
-                otp = str(random.randint(100000, 999999))
-                c.execute("UPDATE users SET otp=%s WHERE user_id=%s", (otp, self.uid))
-                conn.commit()
-                QMessageBox.information(self, "OTP Sent", f"Your OTP: {otp}")
-                for w in (self.otp, self.np, self.rt):
-                    w.setEnabled(True)
-            else:
-                QMessageBox.warning(self, "Verify Failed", "Info mismatch.")
-            c.close()
-            conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        ag = calculate_age(self.bd2.date())
+        username = self.username
+
+        run_busy(self, lambda: get_client().issue_otp(username, fn, bd, ag), on_result=self.on_verified,
+                 on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
+
+    def on_verified(self, issued):
+        if issued:
+            self.reset_token, otp = issued
+            QMessageBox.information(self, "OTP Sent", f"Your OTP: {otp}")
+            for w in (self.otp, self.np, self.rt):
+                w.setEnabled(True)
+        else:
+            QMessageBox.warning(self, "Verify Failed", "Info mismatch.")
 
     def reset(self):
         ent = self.otp.text()
@@ -470,85 +344,91 @@ class ForgotWindow(QDialog):
             QMessageBox.warning(self, "Invalid Password", "Password cannot be blank or only spaces.")
             return
 
-        try:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="adminuser",
-                password="adminpass",
-                database="locker_system"
-            )
-            c = conn.cursor()
-            c.execute("SELECT otp FROM users WHERE user_id=%s", (self.uid,))
-            result = c.fetchone()
-
-            if result and str(result[0]) == ent:
-                c.execute("UPDATE users SET password=%s, otp=0 WHERE user_id=%s", (newp, self.uid))
-                conn.commit()
-                QMessageBox.information(self, "Success", "Password reset successfully.")
-                self.accept()
-            else:
-                QMessageBox.warning(self, "OTP Failed", "Incorrect OTP.")
-            c.close()
-            conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        token = self.reset_token
+        run_busy(self, lambda: get_client().reset_password(token, ent, newp), on_result=self.on_reset,
+                 on_error=lambda e: QMessageBox.critical(self, "Error", str(e)))
+
+    def on_reset(self, result):
+        status, wait = result
+        if status == RESET_OK:
+            QMessageBox.information(self, "Success", "Password reset successfully.")
+            self.nav.show_screen("login")
+        elif status == RESET_THROTTLED:
+            QMessageBox.warning(self, "Too Many Attempts",
+                                f"Too many incorrect OTPs. Try again in {max(1, round(wait))} seconds.")
+        elif status == RESET_EXPIRED:
+            QMessageBox.warning(self, "OTP Expired", "This OTP has expired. Press Verify to get a new one.")
+        else:
+            QMessageBox.warning(self, "OTP Failed", "Incorrect OTP.")
+
+
+# --- Hands change-bus messages from the receiver thread to the locker screen on the GUI thread ---
+class ChangeRelay(QObject):
+    received = Signal(object)
 
 
 class LockerStatusWindow(QWidget):
-    def __init__(self, logged_in_user, login_window):
-        super().__init__()
-        self.setWindowTitle("Locker Status")
-        self.setFixedSize(1100, 700)
-        self.logged_in_user = logged_in_user
-        self.login_window = login_window
-
-        # Solenoid locks and buzzer setup (gpiozero)
-        self.solenoid_lock_1 = OutputDevice(17, active_high=False, initial_value=False)
-        self.solenoid_lock_2 = OutputDevice(27, active_high=False, initial_value=False)
-        self.buzzer = Buzzer(22)
+    def __init__(self, nav):
+        super().__init__(nav)
+        self.nav = nav
+        self.session = None
+
+        # the service drives the relays; this screen only mirrors its timing on the status labels
+        self.client = get_client()
+        self.bank = self.client.layout()
+        self.unlocking = {}     # locker_id -> token of the unlock whose status is showing
 
         # UI setup
         top = QHBoxLayout()
-        lbl = QLabel(f"Welcome, {self.logged_in_user}")
-        lbl.setFont(QFont("Segoe UI", 34, QFont.Weight.Bold))
-        top.addWidget(lbl, alignment=Qt.AlignmentFlag.AlignLeft)
+        self.welcome = QLabel()
+        self.welcome.setFont(QFont("Segoe UI", 34, QFont.Weight.Bold))
+        top.addWidget(self.welcome, alignment=Qt.AlignmentFlag.AlignLeft)
         back = QPushButton("←")
         back.setFixedSize(40, 40)
         back.clicked.connect(self.go_back)
         top.addWidget(back, alignment=Qt.AlignmentFlag.AlignRight)
 
-        self.title_labels = []
-        self.status_labels = []
-        self.boxes = []
+        # locker_id -> widget, so refreshes and clicks never scan the whole bank
+        self.title_labels = {}
+        self.status_labels = {}
+        self.boxes = {}
+
+        lockers = QGridLayout()
+        lockers.setSpacing(30 if len(self.bank) <= 4 else 8)
 
-        lockers = QHBoxLayout()
-        lockers.setSpacing(30)
+        # shrink boxes and fonts as the grid grows so the whole cabinet fits on screen
+        rows, cols = self.bank.grid_size()
+        box_w = max(40, min(400, (1020 - lockers.spacing() * (cols - 1)) // max(cols, 1)))
+        box_h = max(30, min(300, (560 - lockers.spacing() * (rows - 1)) // max(rows, 1) - 60))
+        compact = len(self.bank) > 4
 
-        for i in range(2):
+        for slot in self.bank:
+            locker_id = slot.locker_id
             col = QVBoxLayout()
-            col.setSpacing(10)
+            col.setSpacing(4 if compact else 10)
 
-            title = QLabel(f"Locker {i+1}")
-            title.setFont(QFont("Segoe UI", 26, QFont.Weight.Bold))
+            title = QLabel(f"Locker {locker_id}")
+            title.setFont(QFont("Segoe UI", 12 if compact else 26, QFont.Weight.Bold))
             title.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
             status = QLabel("Status: Closed")
-            status.setFont(QFont("Segoe UI", 16))
+            status.setFont(QFont("Segoe UI", 9 if compact else 16))
             status.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            status.setProperty("locker", "status")
 
             box = QLabel("")
-            box.setFixedSize(400, 300)
-            box.setStyleSheet("border:2px solid #2c3e50; border-radius:8px;")
-            box.mousePressEvent = lambda e, idx=i: self.handle_locker_click(idx)
+            box.setFixedSize(box_w, box_h)
+            box.setProperty("locker", "box")      # colours come from the theme's state=free|occupied|mine
+            box.mousePressEvent = lambda e, lid=locker_id: self.handle_locker_click(lid)
 
             col.addWidget(title)
             col.addWidget(status)
             col.addWidget(box, alignment=Qt.AlignmentFlag.AlignCenter)
 
-            lockers.addLayout(col)
-            self.title_labels.append(title)
-            self.status_labels.append(status)
-            self.boxes.append(box)
+            lockers.addLayout(col, slot.row, slot.col)
+            self.title_labels[locker_id] = title
+            self.status_labels[locker_id] = status
+            self.boxes[locker_id] = box
 
         main = QVBoxLayout()
         main.setContentsMargins(40, 20, 40, 20)
@@ -557,154 +437,177 @@ class LockerStatusWindow(QWidget):
         main.addLayout(lockers)
         self.setLayout(main)
 
-        self.update_lockers()
-
-    def beep_opening(self):
-        for _ in range(2):
-            self.buzzer.on()
-            time.sleep(0.2)
-            self.buzzer.off()
-            time.sleep(0.1)
-
-    def beep_closing(self):
-        self.buzzer.on()
-        time.sleep(0.5)
-        self.buzzer.off()
+        self.state_cache = RemoteStateCache(self.client)
+
+        # other kiosks' claims and releases arrive over the change bus and repaint just those lockers
+        from change_bus import get_change_bus
+        self.relay = ChangeRelay(self)
+        self.relay.received.connect(self.on_bus_message, Qt.QueuedConnection)
+        bus = get_change_bus()
+        if bus is not None:
+            bus.subscribe(self.relay.received.emit)
+
+    def enter(self, session):
+        self.session = session
+        self.welcome.setText(f"Welcome, {session.username}")
+        # repaint from the cache right away so no box still shows the previous user's name
+        for locker_id in self.boxes:
+            self.render_locker(locker_id)
+        self.update_lockers(full=True)
+
+    def leave(self):
+        # logging out relocks everything this user opened and silences the buzzer
+        self.unlocking.clear()
+        if self.session is not None:
+            run_async(self.client.logout, self.session, on_error=lambda e: None)
+            self.session = None
+
+    def show_unlock(self, locker_id, opened):
+        token = object()
+        self.unlocking[locker_id] = token
+        QTimer.singleShot(opened["open_ms"], self, lambda: self.on_unlock_step(locker_id, token, True))
+        QTimer.singleShot(opened["closed_ms"], self, lambda: self.on_unlock_step(locker_id, token, False))
+
+    def on_unlock_step(self, locker_id, token, is_open):
+        if self.unlocking.get(locker_id) is not token:
+            return      # logged out, or a newer unlock of this locker owns the label now
+        if is_open:
+            self.status_labels[locker_id].setText("Status: Open")
+        else:
+            del self.unlocking[locker_id]
+            self.render_locker(locker_id)
 
     def go_back(self):
-        self.solenoid_lock_1.off()
-        self.solenoid_lock_2.off()
-        self.buzzer.off()        # Turn off buzzer
-        self.solenoid_lock_1.close()
-        self.solenoid_lock_2.close()
-        self.buzzer.close()      # Properly release buzzer pin
-
         reply = QMessageBox.question(self, "Logout", "Do you want to log out?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             QMessageBox.information(self, "Thank You", "Thank you for using the Locker system!")
-            self.login_window.username_input.clear()
-            self.login_window.password_input.clear()
-            self.close()
-            self.login_window.show()
-
-    def update_lockers(self):
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser",
-                password="adminpass", database="locker_system"
-            )
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT lockers.locker_id, users.username, lockers.object_in_locker
-                FROM lockers
-                LEFT JOIN users ON lockers.user_id=users.user_id
-            """)
-            rows = cursor.fetchall()
-            for i in range(2):
-                if i < len(rows) and rows[i][1] == self.logged_in_user:
-                    self.title_labels[i].setText(f"Locker {i+1} - {self.logged_in_user}")
-                else:
-                    self.title_labels[i].setText(f"Locker {i+1}")
-
-                occupied = (i < len(rows) and rows[i][1] is not None)
-                if occupied:
-                    color = "#e74c3c"  # Red for occupied
-                    status_text = "Status: Closed"
-                else:
-                    color = "#2ecc71"  # Green for free
-                    status_text = "Status: Open"
-
-                self.boxes[i].setStyleSheet(
-                    f"background-color: {color}; border:2px solid #2c3e50; border-radius:8px;"
-                )
-                self.status_labels[i].setText(status_text)
-                self.status_labels[i].setStyleSheet(f"color: {color};")
-
-            cursor.close()
-            conn.close()
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Database Error", str(e))
+            self.nav.show_screen("login")
+
+    def update_lockers(self, full=False):
+        # refresh runs on the DB executor; only lockers whose cached state changed get restyled
+        run_async(self.state_cache.refresh, self.session, on_result=lambda changed: self.apply_changes(changed, full),
+                  on_error=self.on_refresh_error)
 
-    def handle_locker_click(self, index):
-        locker_id = index + 1
-        try:
-            conn = mysql.connector.connect(
-                host="localhost", user="adminuser",
-                password="adminpass", database="locker_system"
-            )
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id FROM users WHERE username=%s", (self.logged_in_user,))
-            user_id = cursor.fetchone()[0]
-            cursor.execute("SELECT user_id, object_in_locker FROM lockers WHERE locker_id=%s", (locker_id,))
-            assigned, obj = cursor.fetchone()
-
-            if assigned is None:
-                text, ok = QInputDialog.getText(self, f"Locker {locker_id}", "Enter object to place:")
-                if ok and text:
-                    cursor.execute(
-                        "UPDATE lockers SET user_id=%s, object_in_locker=%s WHERE locker_id=%s",
-                        (user_id, text, locker_id)
-                    )
-                    conn.commit()
-
-                    if locker_id == 1:
-                        self.beep_opening()
-                        self.solenoid_lock_1.on()
-                        self.status_labels[0].setText("Status: Open")
-                        time.sleep(5)
-                        self.beep_closing()
-                        self.solenoid_lock_1.off()
-                        self.status_labels[0].setText("Status: Closed")
-                    elif locker_id == 2:
-                        self.beep_opening()
-                        self.solenoid_lock_2.on()
-                        self.status_labels[1].setText("Status: Open")
-                        time.sleep(5)
-                        self.beep_closing()
-                        self.solenoid_lock_2.off()
-                        self.status_labels[1].setText("Status: Closed")
-
-            elif assigned == user_id:
-                if QMessageBox.question(self, "Claim?", f"Claim '{obj}' from Locker {locker_id}?",
-                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                    cursor.execute(
-                        "UPDATE lockers SET user_id=NULL, object_in_locker=NULL WHERE locker_id=%s",
-                        (locker_id,)
-                    )
-                    conn.commit()
-
-                    if locker_id == 1:
-                        self.beep_opening()
-                        self.solenoid_lock_1.on()
-                        self.status_labels[0].setText("Status: Open")
-                        time.sleep(5)
-                        self.beep_closing()
-                        self.solenoid_lock_1.off()
-                        self.status_labels[0].setText("Status: Closed")
-                    elif locker_id == 2:
-                        self.beep_opening()
-                        self.solenoid_lock_2.on()
-                        self.status_labels[1].setText("Status: Open")
-                        time.sleep(5)
-                        self.beep_closing()
-                        self.solenoid_lock_2.off()
-                        self.status_labels[1].setText("Status: Closed")
-
-                    QMessageBox.information(self, "Thank You", "Thank you for using the Locker system!")
-            else:
-                QMessageBox.warning(self, "Denied", "Not your locker.")
-
-            cursor.close()
-            conn.close()
-            self.update_lockers()
-        except mysql.connector.Error as e:
+    def on_refresh_error(self, e):
+        if self.session is not None:    # a refresh answered after logout is nobody's business
             QMessageBox.critical(self, "Database Error", str(e))
 
+    def on_bus_message(self, message):
+        changed = [lid for lid, user_id in message.deltas if self.state_cache.apply_delta(lid, user_id)]
+        self.apply_changes(changed)
+        if (message.gap or message.reload) and self.session is not None:
+            self.update_lockers()     # missed messages, or an admin edit: let the service say what changed
+
+    def apply_changes(self, changed, full=False):
+        if self.session is None:
+            return      # answered after logout
+        for locker_id in (self.boxes if full else changed):
+            if locker_id in self.boxes:
+                self.render_locker(locker_id)
+
+    def render_locker(self, locker_id):
+        state = self.state_cache.get(locker_id)
+        if self.session.owns(state):
+            self.title_labels[locker_id].setText(f"Locker {locker_id} - {self.session.username}")
+        else:
+            self.title_labels[locker_id].setText(f"Locker {locker_id}")
+
+        if state is not None and state.occupied:
+            look = theme.MINE if self.session.owns(state) else theme.OCCUPIED
+            status_text = "Status: Closed"
+        else:
+            look = theme.FREE
+            status_text = "Status: Open"
+
+        # flipping the property re-polishes just these two widgets, and only if the look changed
+        theme.set_state(self.boxes[locker_id], look)
+        if locker_id not in self.unlocking:
+            self.status_labels[locker_id].setText(status_text)
+        theme.set_state(self.status_labels[locker_id], look)
+
+    def handle_locker_click(self, locker_id):
+        # make sure the prompt reflects the latest owner before asking anything
+        run_busy(self, self.state_cache.refresh, self.session,
+                 on_result=lambda changed: (self.apply_changes(changed), self.prompt_locker(locker_id)),
+                 on_error=lambda e: QMessageBox.critical(self, "Database Error", str(e)))
+
+    def prompt_locker(self, locker_id):
+        state = self.state_cache.get(locker_id)
+        if state is None:
+            return
+
+        if not state.occupied:
+            text, ok = QInputDialog.getText(self, f"Locker {locker_id}", "Enter object to place:")
+            if ok and text:
+                run_busy(self, self.client.claim, self.session, locker_id, text,
+                         on_result=lambda opened: self.on_claimed(locker_id, opened),
+                         on_error=lambda e: QMessageBox.critical(self, "Database Error", str(e)))
+
+        elif self.session.owns(state):
+            if QMessageBox.question(self, "Claim?", f"Claim '{state.object_in_locker}' from Locker {locker_id}?",
+                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
+                run_busy(self, self.client.release, self.session, locker_id,
+                         on_result=lambda opened: self.on_released(locker_id, opened),
+                         on_error=lambda e: QMessageBox.critical(self, "Database Error", str(e)))
+        else:
+            QMessageBox.warning(self, "Denied", "Not your locker.")
+
+    def on_claimed(self, locker_id, opened):
+        if opened["won"]:
+            self.show_unlock(locker_id, opened)
+        else:
+            QMessageBox.warning(self, "Taken", f"Locker {locker_id} was just taken by someone else.")
+        self.update_lockers()
+
+    def on_released(self, locker_id, opened):
+        if opened["won"]:
+            self.show_unlock(locker_id, opened)
+            QMessageBox.information(self, "Thank You", "Thank you for using the Locker system!")
+        else:
+            QMessageBox.warning(self, "Denied", "This locker is no longer assigned to you.")
+        self.update_lockers()
+
+def build_kiosk():
+    # one fixed-size window; screens are built the first time they are shown and reused after that
+    theme.install(QApplication.instance())
+    kiosk = ScreenStack()
+    kiosk.setWindowTitle("System Shapers' Smart Lock System")
+    kiosk.setWindowIcon(QIcon("/home/SystemShapers/LockerSystem/icon.png"))
+    kiosk.setFixedSize(1100, 700)
+    kiosk.register("login", LockerSystem)
+    kiosk.register("register", RegisterWindow)
+    kiosk.register("forgot", ForgotWindow)
+    kiosk.register("lockers", LockerStatusWindow)
+    kiosk.register("admin", admin_screen)
+    kiosk.show_screen("login")
+    return kiosk
+
+
+def admin_screen(nav):
+    from admin_login_gui import AdminViewer
+    viewer = AdminViewer(nav)
+    viewer.logout_requested.connect(lambda: nav.show_screen("login"))
+    return viewer
+
+
+def on_first_frame(app):
+    profiler.write()
+    if startup.EXIT_AFTER_FRAME:
+        app.quit()      # time-to-first-frame benchmark: nothing past this point is measured
+    else:
+        # start the locker service (or find the remote one) before the first login asks for it
+        startup.preload(startup.PRELOAD_REMOTE if API_URL else startup.PRELOAD_BACKGROUND,
+                        on_done=lambda: run_async(get_client, on_error=lambda e: None))
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = LockerSystem()
+    with profiler.phase("create app"):
+        app = QApplication(sys.argv)
+    app.aboutToQuit.connect(stop_embedded)     # relock through the service before the pins are released
+    app.aboutToQuit.connect(shutdown_devices)
+    with profiler.phase("build login screen"):
+        window = build_kiosk()
+    startup.after_first_frame(window, lambda: on_first_frame(app))
     window.show()
     sys.exit(app.exec())
-
-
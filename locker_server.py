@@ -0,0 +1,781 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import secrets
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+import mysql.connector
+import db
+import analytics
+import otp_service
+import admin_service
+import kiosk_service
+import locker_service
+from hardware import UNLOCK_HOLD_MS, COUNTERS_SAVE_SECONDS, DeviceBusyError, unlock_steps, sequence_ms
+from locker_bank import get_bank
+from offline_journal import get_journal
+from session import Session
+
+# The locker logic as one headless process: a small HTTP/1.1 server on asyncio speaking JSON.
+# Blocking work (MySQL, scrypt) runs on a thread pool the size of the DB pool; relay sequences
+# are asyncio tasks. The kiosk windows are clients of this API (api_client.py).
+HOST = os.environ.get("LOCKER_API_HOST", "127.0.0.1")
+PORT = int(os.environ.get("LOCKER_API_PORT", "8765"))
+MAX_BODY = 64 * 1024
+# a kiosk left logged in is logged out after this long without a request
+SESSION_IDLE_SECONDS = int(os.environ.get("LOCKER_API_SESSION_IDLE", "1800"))
+REPLAY_INTERVAL_SECONDS = 30
+# addresses the kiosk screens connect from; the one-time code and /stats are only served to them
+KIOSK_ADDRESSES = set(os.environ.get("LOCKER_API_KIOSKS", "127.0.0.1,::1").split(","))
+# offline-journal entries the server would not accept, newest first, shown on /stats
+STATS_CONFLICTS = 20
+# how long a busy thread (MySQL, burst of requests) may hold the GIL before the event loop gets it back;
+# Python's 5 ms default shows up as tens of milliseconds of relay jitter under load. Process-wide,
+# so only serve() and start_in_thread() set it, never a constructor
+SWITCH_INTERVAL_SECONDS = 0.001
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- Logged-in kiosks, by bearer token ---
+class SessionStore:
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS, clock=time.monotonic):
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._sessions = {}     # token -> [Session, last seen]; only touched on the event loop
+
+    def open(self, session):
+        self.expire()
+        session.token = secrets.token_urlsafe(24)
+        self._sessions[session.token] = [session, self.clock()]
+        return session.token
+
+    def get(self, token):
+        entry = self._sessions.get(token)
+        if entry is None:
+            return None
+        if self.clock() - entry[1] > self.idle_seconds:
+            del self._sessions[token]
+            return None
+        entry[1] = self.clock()
+        return entry[0]
+
+    def close(self, token):
+        entry = self._sessions.pop(token, None)
+        return entry[0] if entry else None
+
+    def expire(self):
+        cutoff = self.clock() - self.idle_seconds
+        for token in [t for t, (_, seen) in self._sessions.items() if seen < cutoff]:
+            del self._sessions[token]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+# --- Unlock/relock/beep sequences (hardware.unlock_steps) as asyncio tasks ---
+class AsyncActuator:
+    def __init__(self, hardware=None):
+        self._hardware = hardware       # leased from the device manager on first use when None
+        self._lease_lock = threading.Lock()
+        self._buzzer_holders = 0        # overlapping sequences share one buzzer
+        self._tasks = {}                # locker_id -> task running its current sequence
+        self._windows = {}              # locker_id -> loop times (relay on, relocked) of that sequence
+        self._reserved = {}             # locker_id -> requests holding a relay slot while their claim is written
+
+    def hardware(self):
+        # blocking the first time (gpiozero, pins), so the server calls it on the thread pool
+        if self._hardware is None:
+            with self._lease_lock:
+                if self._hardware is None:
+                    from hardware import get_device_manager
+                    self._hardware = get_device_manager().lease("locker server")
+        return self._hardware
+
+    def device_manager(self):
+        # the manager behind a leased backend; None for hardware handed in directly (benchmarks, tests)
+        return getattr(self._hardware, "manager", None)
+
+    def is_active(self, locker_id):
+        task = self._tasks.get(locker_id)
+        return task is not None and not task.done()
+
+    def active(self):
+        return sorted(lid for lid in self._tasks if self.is_active(lid))
+
+    def reserve(self, locker_id):
+        # False when opening locker_id would energise more solenoids than the power supply allows;
+        # taken before the database write so the caller is told to retry instead of being queued
+        limit = self.hardware().max_active
+        if not self.is_active(locker_id) and locker_id not in self._reserved and limit is not None:
+            if len(set(self.active()) | set(self._reserved)) >= limit:
+                return False
+        self._reserved[locker_id] = self._reserved.get(locker_id, 0) + 1
+        return True
+
+    def unreserve(self, locker_id):
+        if self._reserved.get(locker_id, 0) > 1:
+            self._reserved[locker_id] -= 1
+        else:
+            self._reserved.pop(locker_id, None)
+
+    def unlock(self, locker_id, hold_ms=UNLOCK_HOLD_MS):
+        # returns (open_ms, closed_ms) from now; a locker already mid-sequence is open anyway,
+        # so a second claim or release just reports the running sequence instead of queuing another
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if not self.is_active(locker_id):
+            steps = unlock_steps(hold_ms)
+            relay_on = next(i for i, step in enumerate(steps) if step[0] == "lock")
+            self._windows[locker_id] = (now + sequence_ms(steps[:relay_on]) / 1000, now + sequence_ms(steps) / 1000)
+            self._tasks[locker_id] = loop.create_task(self._run(locker_id, steps, now))
+        open_at, closed_at = self._windows[locker_id]
+        return max(open_at - now, 0) * 1000, (closed_at - now) * 1000
+
+    async def stop_all(self):
+        # service shutdown only: relock and silence every sequence. A sequence belongs to a claim or
+        # release the database already holds, so nothing else may cut it short
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, locker_id, steps, started):
+        # each step waits for its own deadline from the start, so a late wake-up does not push back the rest
+        loop = asyncio.get_running_loop()
+        hardware = self.hardware()
+        buzzing = False
+        due = started
+        try:
+            for action, arg, delay in steps:
+                if action == "buzz":
+                    self._set_buzzer(arg)
+                    buzzing = arg
+                else:
+                    hardware.set_lock(locker_id, arg)
+                if delay:
+                    due += delay / 1000
+                    await asyncio.sleep(max(due - loop.time(), 0))
+        except DeviceBusyError:
+            pass    # reserve() keeps this from happening; if it does, the door simply stays shut
+        finally:
+            if buzzing:
+                self._set_buzzer(False)
+            hardware.set_lock(locker_id, False)
+
+    def _set_buzzer(self, on):
+        self._buzzer_holders = max(self._buzzer_holders + (1 if on else -1), 0)
+        self.hardware().set_buzzer(bool(self._buzzer_holders))
+
+
+# --- One request as the handlers see it ---
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "peer", "params", "session")
+
+    def __init__(self, method, path, query, headers, body, peer=None):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.peer = peer            # client IP address
+        self.params = ()
+        self.session = None
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object.")
+        return data
+
+    def field(self, data, name, kind=str):
+        value = data.get(name)
+        if value is None or (kind is str and not isinstance(value, str)):
+            raise ApiError(400, f"Missing or invalid field {name!r}.")
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"Missing or invalid field {name!r}.")
+
+
+# --- The server: routes, sessions, thread pool and actuator ---
+class LockerServer:
+    def __init__(self, hardware=None, max_threads=None):
+        self.sessions = SessionStore()
+        # password resets in progress, by the token /password/otp hands out; the account is resolved
+        # here, never taken from the client
+        self.resets = SessionStore(otp_service.OTP_TTL_SECONDS)
+        self.actuator = AsyncActuator(hardware)
+        self.pool = ThreadPoolExecutor(max_threads or db.POOL_SIZE, thread_name_prefix="api")
+        self.requests = 0
+        self.errors = 0
+        self.server = None
+        self.loop = None
+        self._background = []           # replay, rollup and wear-counter loops
+        self._connections = {}          # writer -> handler task, for every open keep-alive connection
+        # (method, path regex, handler, who may call it: None, "kiosk", "user" or "admin")
+        self.routes = [
+            ("POST", r"/login", self.login, None),
+            ("POST", r"/logout", self.logout, "user"),
+            ("GET", r"/users/exists", self.user_exists, None),
+            ("GET", r"/register/check", self.check_identity, None),
+            ("POST", r"/register", self.register, None),
+            ("POST", r"/password/otp", self.issue_otp, "kiosk"),
+            ("POST", r"/password/reset", self.reset_password, None),
+            ("GET", r"/bank", self.bank, None),
+            ("GET", r"/lockers", self.lockers, "user"),
+            ("POST", r"/lockers/(\d+)/claim", self.claim, "user"),
+            ("POST", r"/lockers/(\d+)/release", self.release, "user"),
+            ("GET", r"/admin/users", self.admin_users, "admin"),
+            ("DELETE", r"/admin/users/(\d+)", self.remove_user, "admin"),
+            ("POST", r"/admin/lockers/assign", self.assign_lockers, "admin"),
+            ("GET", r"/admin/analytics", self.analytics, "admin"),
+            ("GET", r"/admin/tables", self.admin_tables, "admin"),
+            ("POST", r"/admin/tables", self.create_table, "admin"),
+            ("GET", r"/admin/tables/(\w+)", self.describe_table, "admin"),
+            ("GET", r"/admin/tables/(\w+)/rows", self.table_rows, "admin"),
+            ("POST", r"/admin/tables/(\w+)/rows", self.save_rows, "admin"),
+            ("POST", r"/admin/tables/(\w+)/columns", self.add_column, "admin"),
+            ("DELETE", r"/admin/tables/(\w+)/columns/(\w+)", self.drop_column, "admin"),
+            ("GET", r"/stats", self.stats, "kiosk"),
+        ]
+        self.routes = [(m, re.compile(p + "$"), h, a) for m, p, h, a in self.routes]
+
+    # --- lifecycle ---
+    async def start(self, host=HOST, port=PORT):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+        self._background = [self.loop.create_task(self._replay_forever()),
+                            self.loop.create_task(self._fold_forever()),
+                            self.loop.create_task(self._save_counters_forever())]
+        sock = self.server.sockets[0].getsockname()
+        return f"http://{sock[0]}:{sock[1]}"
+
+    async def close(self):
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            # idle keep-alive clients would otherwise hold wait_closed() open; a closed socket ends their reads
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+        await self.actuator.stop_all()      # every relay relocked, buzzer off
+        self.pool.shutdown(wait=False)
+
+    def close_threadsafe(self, timeout=5):
+        # for a server started with start_in_thread; returns once its sequences have relocked
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def call(self, fn, *args):
+        return await self.loop.run_in_executor(self.pool, functools.partial(fn, *args))
+
+    async def _replay_forever(self):
+        # push claims journaled during a MySQL outage once the server answers again
+        while True:
+            await asyncio.sleep(REPLAY_INTERVAL_SECONDS)
+            if get_journal().has_pending():
+                try:
+                    await self.call(locker_service.replay_journal)
+                except Exception:
+                    pass    # still down, or a conflict the journal keeps for the admin
+
+    async def _fold_forever(self):
+        # fold new audit events into the usage rollups, so the admin tab never has to
+        while True:
+            await asyncio.sleep(analytics.FOLD_INTERVAL_SECONDS)
+            try:
+                await self.call(analytics.update_rollups)
+            except mysql.connector.Error:
+                pass    # down or not migrated yet; the next round picks up where the cursor stopped
+
+    async def _save_counters_forever(self):
+        # relay wear counts survive a power cut, not just a clean shutdown
+        while True:
+            await asyncio.sleep(COUNTERS_SAVE_SECONDS)
+            manager = self.actuator.device_manager()
+            if manager is not None:
+                try:
+                    await self.call(manager.save_counters)
+                except OSError:
+                    pass    # read-only or full disk; the next round tries again
+
+    # --- HTTP/1.1 with keep-alive; enough for JSON requests from our own clients ---
+    async def _serve_connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader, peer[0] if peer else None)
+                except ApiError as e:
+                    writer.write(self._response(e.status, {"error": e.message}, False))
+                    break
+                if request is None:
+                    break
+                status, payload = await self.dispatch(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_request(self, reader, peer):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ApiError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise ApiError(400, "Bad Content-Length.")
+        if length > MAX_BODY:
+            raise ApiError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return Request(method.upper(), url.path.rstrip("/") or "/", dict(parse_qsl(url.query)), headers, body,
+                       peer)
+
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        body = json.dumps(payload, default=str, separators=(",", ":")).encode()
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode() + body
+
+    async def dispatch(self, request):
+        self.requests += 1
+        try:
+            handler, access = self._route(request)
+            if access == "kiosk":
+                self._kiosk_only(request)
+            elif access is not None:
+                request.session = self._authorize(request, access)
+            return 200, await handler(request)
+        except ApiError as e:
+            status, payload = e.status, {"error": e.message}
+        except admin_service.AdminError as e:
+            status, payload = 400, {"error": str(e)}
+        except mysql.connector.errors.PoolError:
+            # every DB connection is in use; MySQL itself is fine, so this is not an outage
+            status, payload = 503, {"error": "The locker service is busy. Please try again in a few seconds."}
+        except mysql.connector.Error as e:
+            status, payload = 503, {"error": f"Database error: {e}"}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        self.errors += 1
+        return status, payload
+
+    def _route(self, request):
+        allowed = False
+        for method, pattern, handler, access in self.routes:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method:
+                    request.params = match.groups()
+                    return handler, access
+                allowed = True
+        if allowed:
+            raise ApiError(405, f"{request.method} is not allowed on {request.path}.")
+        raise ApiError(404, f"No such endpoint {request.path}.")
+
+    @staticmethod
+    def _kiosk_only(request):
+        if request.peer not in KIOSK_ADDRESSES:
+            raise ApiError(403, "Only the kiosks may call this.")
+
+    def _authorize(self, request, access):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        session = self.sessions.get(token) if scheme.lower() == "bearer" else None
+        if session is None:
+            raise ApiError(401, "Not logged in, or the session has expired.")
+        if access == "admin" and not session.is_admin:
+            raise ApiError(403, "Administrators only.")
+        return session
+
+    # --- accounts ---
+    async def login(self, request):
+        data = request.json()
+        session = await self.call(kiosk_service.authenticate, request.field(data, "username"),
+                                  request.field(data, "password"))
+        if session is None:
+            raise ApiError(401, "Invalid credentials.")
+        token = self.sessions.open(session)
+        return {"token": token, "user_id": session.user_id, "username": session.username,
+                "role": session.role, "display_name": session.display_name}
+
+    async def logout(self, request):
+        # a door still opening for this user keeps going; its claim or release is already committed
+        self.sessions.close(request.session.token)
+        return {}
+
+    async def user_exists(self, request):
+        return {"exists": await self.call(kiosk_service.user_exists, request.field(request.query, "username"))}
+
+    async def check_identity(self, request):
+        q = request.query
+        username_taken, identity_taken = await self.call(
+            kiosk_service.check_identity, q.get("username", ""), q.get("name", ""), q.get("birthday", ""))
+        return {"username_taken": username_taken, "identity_taken": identity_taken}
+
+    async def register(self, request):
+        data = request.json()
+        duplicate = await self.call(kiosk_service.register, request.field(data, "username"),
+                                    request.field(data, "password"), request.field(data, "name"),
+                                    request.field(data, "age", int), request.field(data, "birthday"))
+        return {"duplicate": duplicate}
+
+    async def issue_otp(self, request):
+        data = request.json()
+        issued = await self.call(kiosk_service.issue_otp, request.field(data, "username"),
+                                 request.field(data, "name"), request.field(data, "birthday"),
+                                 request.field(data, "age", int))
+        if issued is None:
+            return {"reset_token": None, "otp": None}
+        user_id, username, otp = issued
+        return {"reset_token": self.resets.open(Session(user_id, username, "user")), "otp": otp}
+
+    async def reset_password(self, request):
+        data = request.json()
+        token = request.field(data, "reset_token")
+        account = self.resets.get(token)
+        if account is None:
+            raise ApiError(401, "This password reset has expired. Press Verify to start again.")
+        status, retry_after = await self.call(kiosk_service.reset_password, account.user_id, account.username,
+                                              request.field(data, "otp"), request.field(data, "new_password"))
+        if status == otp_service.OK:
+            self.resets.close(token)
+        return {"status": status, "retry_after": retry_after}
+
+    # --- lockers ---
+    async def bank(self, request):
+        bank = await self.call(get_bank)
+        return {"lockers": [{"locker_id": s.locker_id, "row": s.row, "col": s.col} for s in bank]}
+
+    async def lockers(self, request):
+        states = await self.call(kiosk_service.locker_states)
+        session = request.session
+        # what is inside a locker is only told to the user holding it
+        return {"lockers": [{"locker_id": s.locker_id, "user_id": s.user_id,
+                             "object": s.object_in_locker if session.owns(s) else None} for s in states],
+                "unlocking": self.actuator.active()}
+
+    async def claim(self, request):
+        locker_id = self._locker_id(request)
+        obj = request.field(request.json(), "object")
+        return await self._with_relay(locker_id, request.session, locker_service.claim, obj)
+
+    async def release(self, request):
+        locker_id = self._locker_id(request)
+        return await self._with_relay(locker_id, request.session, locker_service.release)
+
+    def _locker_id(self, request):
+        locker_id = int(request.params[0])
+        if locker_id not in get_bank().ids():
+            raise ApiError(404, f"No locker {locker_id}.")
+        return locker_id
+
+    async def _with_relay(self, locker_id, session, action, *args):
+        await self.call(self.actuator.hardware)
+        if not self.actuator.reserve(locker_id):
+            raise ApiError(503, "Too many lockers are open right now. Please try again in a few seconds.")
+        try:
+            won = await self.call(action, locker_id, session, *args)
+            if not won:
+                return {"won": False, "open_ms": None, "closed_ms": None}
+            open_ms, closed_ms = self.actuator.unlock(locker_id)
+            return {"won": True, "open_ms": round(open_ms), "closed_ms": round(closed_ms)}
+        finally:
+            self.actuator.unreserve(locker_id)
+
+    # --- admin ---
+    async def admin_users(self, request):
+        rows = await self.call(kiosk_service.user_overview)
+        return {"users": [dict(zip(("username", "name", "birthday", "age", "locker_id"), r)) for r in rows]}
+
+    async def assign_lockers(self, request):
+        data = request.json()
+        locker_ids = data.get("locker_ids")
+        if (not isinstance(locker_ids, list) or not locker_ids
+                or not all(isinstance(lid, int) and lid in get_bank() for lid in locker_ids)):
+            raise ApiError(400, "Missing or invalid field 'locker_ids'.")
+        # None empties the lockers
+        user_id = request.field(data, "user_id", int) if data.get("user_id") is not None else None
+        obj = request.field(data, "object") if data.get("object") is not None else None
+        updated = await self.call(kiosk_service.assign_lockers, request.session.user_id, user_id, obj, locker_ids)
+        return {"updated": updated}
+
+    async def remove_user(self, request):
+        removed = await self.call(admin_service.remove_user, request.session.user_id, int(request.params[0]))
+        if not removed:
+            raise ApiError(404, f"No user {request.params[0]}.")
+        return {}
+
+    async def analytics(self, request):
+        # the rollups are kept current by _fold_forever; this only reads a window of them
+        days = request.field(request.query, "days", int) if "days" in request.query else analytics.SUMMARY_DAYS
+        if not 1 <= days <= 366:
+            raise ApiError(400, "Missing or invalid field 'days'.")
+        summary = await self.call(analytics.summary, days)
+        return {"days": summary.days, "lockers": summary.lockers, "peak_hours": summary.peak_hours,
+                "users": summary.users}
+
+    # --- admin table editor (database.py) ---
+    async def admin_tables(self, request):
+        return {"tables": await self.call(admin_service.tables, request.query.get("refresh") == "1")}
+
+    async def describe_table(self, request):
+        columns, primary_key, estimated_rows = await self.call(admin_service.describe, request.params[0])
+        return {"columns": columns, "primary_key": primary_key, "estimated_rows": estimated_rows}
+
+    async def table_rows(self, request):
+        q = request.query
+        # the primary key of the last row of the previous page, as a JSON list
+        try:
+            after = json.loads(q["after"]) if q.get("after") else None
+        except ValueError:
+            after = ""
+        if after is not None and not isinstance(after, list):
+            raise ApiError(400, "Missing or invalid field 'after'.")
+        rows = await self.call(admin_service.table_page, request.params[0], request.field(q, "page", int),
+                               after, request.field(q, "limit", int))
+        return {"rows": rows}
+
+    async def save_rows(self, request):
+        changes = request.json().get("changes")
+        if (not isinstance(changes, list) or not changes or
+                not all(isinstance(c, dict) and isinstance(c.get("key"), list) and isinstance(c.get("values"), dict)
+                        for c in changes)):
+            raise ApiError(400, "Missing or invalid field 'changes'.")
+        saved = await self.call(admin_service.save_edits, request.session.user_id, request.params[0],
+                                [(c["key"], c["values"]) for c in changes])
+        return {"saved": saved}
+
+    async def create_table(self, request):
+        data = request.json()
+        await self.call(admin_service.create_table, request.field(data, "table"), request.field(data, "column"),
+                        request.field(data, "type"))
+        return {}
+
+    async def add_column(self, request):
+        data = request.json()
+        await self.call(admin_service.add_column, request.params[0], request.field(data, "column"),
+                        request.field(data, "type"))
+        return {}
+
+    async def drop_column(self, request):
+        await self.call(admin_service.drop_column, *request.params)
+        return {}
+
+    async def stats(self, request):
+        journal = get_journal()
+        recent = await self.call(journal.conflicts, STATS_CONFLICTS)
+        total = await self.call(journal.conflict_count)
+        manager = self.actuator.device_manager()
+        # lifetime relay activations and current pin states, once the service has leased the devices
+        devices = await self.call(manager.stats) if manager is not None else None
+        conflicts = [{"seq": seq, "op": op, "locker_id": locker_id, "username": username, "object": obj,
+                      "at": created_at, "detail": detail}
+                     for seq, op, locker_id, username, obj, created_at, detail in recent]
+        return {"requests": self.requests, "errors": self.errors, "sessions": len(self.sessions),
+                "unlocking": self.actuator.active(), "db_pool": db.pool_stats(), "devices": devices,
+                "journal": {"pending": journal.has_pending(), "conflicts": total, "recent_conflicts": conflicts}}
+
+
+def start_in_thread(host=HOST, port=0, hardware=None):
+    # runs a server on its own event loop thread (the kiosk's embedded mode); returns (server, url).
+    # The relay timing needs the short GIL switch interval here too; it also makes the GUI thread
+    # hand the GIL over sooner, which costs it nothing noticeable
+    sys.setswitchinterval(min(sys.getswitchinterval(), SWITCH_INTERVAL_SECONDS))
+    started = threading.Event()
+    result = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = LockerServer(hardware)
+        try:
+            result["url"] = loop.run_until_complete(server.start(host, port))
+        except Exception as e:
+            result["error"] = e
+            started.set()
+            return
+        result["server"] = server
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="locker-api", daemon=True).start()
+    if not started.wait(10) or "error" in result:
+        raise RuntimeError(f"locker API did not start: {result.get('error', 'timed out')}")
+    return result["server"], result["url"]
+
+
+async def serve(host=HOST, port=PORT):
+    # the service owns this process, so the relay timing gets the short GIL switch interval
+    sys.setswitchinterval(min(sys.getswitchinterval(), SWITCH_INTERVAL_SECONDS))
+    server = LockerServer()
+    url = await server.start(host, port)
+    print(f"locker API listening on {url}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+        from hardware import shutdown_devices
+        shutdown_devices()
+
+
+# --- Benchmark: logins and claim/release round trips per second against the real database ---
+def bench(seconds=5.0, clients=8, url=None):
+    # needs MySQL; creates bench users (removed afterwards) and drives free lockers on simulated relays
+    from api_client import LockerClient
+    from hardware import SimulatedHardware
+
+    server = None
+    if url is None:
+        server, url = start_in_thread(hardware=SimulatedHardware(get_bank()))
+    password = "bench-password"
+    # a random run id keeps clear of real accounts; only the user_ids inserted here are deleted afterwards
+    run_id = secrets.token_hex(4)
+    names = [f"bench-{run_id}-{n}" for n in range(clients)]
+    user_ids = []
+    try:
+        for n, name in enumerate(names):
+            if kiosk_service.register(name, password, name, 30, f"1990-01-{1 + n % 28:02d}") is not None:
+                raise RuntimeError(f"could not create bench user {name}")
+            user_ids.append(db.fetchone(kiosk_service.LOGIN_SQL, (name, name))[0])
+    except BaseException:
+        _remove_bench_users(user_ids)
+        raise
+
+    def run_phase(label, work):
+        # every client loops over work(client, session) until time is up; returns (rps, latencies)
+        latencies, failures = [], [0]
+        lock = threading.Lock()
+        deadline = [0.0]
+        barrier = threading.Barrier(clients + 1)
+
+        def worker(n):
+            client = LockerClient(url)
+            session = client.login(names[n], password)
+            state = {}
+            barrier.wait()
+            mine = []
+            while time.perf_counter() < deadline[0]:
+                t = time.perf_counter()
+                try:
+                    work(client, session, n, state)
+                except Exception:
+                    with lock:
+                        failures[0] += 1
+                    continue
+                mine.append((time.perf_counter() - t) * 1000)
+            with lock:
+                latencies.extend(mine)
+            cleanup = state.get("cleanup")
+            if cleanup:
+                cleanup()
+            client.logout(session)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+        for t in threads:
+            t.start()
+        deadline[0] = time.perf_counter() + seconds
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float("nan")
+
+        print(f"{label:<16} {len(latencies) / elapsed:8.1f} req/s  p50 {pct(0.5):6.1f} ms  "
+              f"p95 {pct(0.95):6.1f} ms  ({len(latencies)} ok, {failures[0]} failed, {clients} clients)")
+        return len(latencies) / elapsed
+
+    def login(client, session, n, state):
+        client.logout(client.login(names[n], password))
+
+    def claim_release(client, session, n, state):
+        # each client cycles one free locker of its own; a race lost to a real user is still a round trip
+        if "locker" not in state:
+            free = [s["locker_id"] for s in client.lockers(session)["lockers"] if s["user_id"] is None]
+            if not free:
+                raise RuntimeError("no free locker")
+            state["locker"] = free[n % len(free)]
+            state["cleanup"] = lambda: client.release(session, state["locker"])
+        if client.claim(session, state["locker"], "bench")["won"]:
+            client.release(session, state["locker"])
+
+    try:
+        print(f"locker API at {url}, {seconds:.0f} s per phase")
+        results = {"login": run_phase("login+logout", login),
+                   "claim": run_phase("claim+release", claim_release)}
+    finally:
+        _remove_bench_users(user_ids)
+        if server is not None:
+            server.close_threadsafe()
+    return results
+
+
+def _remove_bench_users(user_ids):
+    for user_id in user_ids:
+        db.execute(kiosk_service.REMOVE_USER_SQL, (user_id,))
+
+
+if __name__ == "__main__":
+    # usage: python locker_server.py [serve [HOST [PORT]]]  |  python locker_server.py bench [SECONDS [CLIENTS [URL]]]
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "serve":
+        host = sys.argv[2] if len(sys.argv) > 2 else HOST
+        port = int(sys.argv[3]) if len(sys.argv) > 3 else PORT
+        try:
+            asyncio.run(serve(host, port))
+        except KeyboardInterrupt:
+            pass
+    elif command == "bench":
+        bench(float(sys.argv[2]) if len(sys.argv) > 2 else 5.0,
+              int(sys.argv[3]) if len(sys.argv) > 3 else 8,
+              sys.argv[4] if len(sys.argv) > 4 else None)
+    else:
+        sys.exit(f"unknown command {command!r}")
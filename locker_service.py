@@ -0,0 +1,105 @@
+import sys
+import threading
+import mysql.connector
+import db
+import audit_log
+import change_bus
+import offline_journal
+from session import Session
+
+# claim/release are single conditional statements: the WHERE clause is the lock check,
+# InnoDB's row lock on locker_id serialises racing kiosks, and rowcount says who won
+# callers pass the session's user_id, so neither statement touches users
+CLAIM_SQL = """
+    UPDATE lockers SET user_id=%s, object_in_locker=%s
+    WHERE locker_id=%s AND user_id IS NULL
+"""
+RELEASE_SQL = """
+    UPDATE lockers SET user_id=NULL, object_in_locker=NULL
+    WHERE locker_id=%s AND user_id=%s
+"""
+
+
+def claim(locker_id, session, object_in_locker):
+    won, journaled = _run_or_journal(
+        lambda: db.execute(CLAIM_SQL, (session.user_id, object_in_locker, locker_id)) == 1,
+        lambda journal: journal.claim(locker_id, session, object_in_locker)
+    )
+    # a journaled claim is not real yet: the replay audits and announces it once MySQL accepts it
+    if won and not journaled:
+        audit_log.record(audit_log.CLAIM, locker_id, session.user_id, detail=object_in_locker)
+        change_bus.publish([(locker_id, session.user_id)])
+    return won
+
+
+def release(locker_id, session):
+    won, journaled = _run_or_journal(
+        lambda: db.execute(RELEASE_SQL, (locker_id, session.user_id)) == 1,
+        lambda journal: journal.release(locker_id, session)
+    )
+    if won and not journaled:
+        audit_log.record(audit_log.RELEASE, locker_id, session.user_id)
+        change_bus.publish([(locker_id, None)])
+    return won
+
+
+def _run_or_journal(online, offline):
+    # (won, journaled); while MySQL is unreachable the claim is decided against the local mirror and journaled
+    journal = offline_journal.get_journal()
+    if journal.is_offline():
+        return offline(journal), True
+    try:
+        result = online()
+    except mysql.connector.Error as e:
+        if not offline_journal.is_connection_error(e):
+            raise
+        journal.mark_offline()
+        return offline(journal), True
+    if journal.has_pending():
+        replay_journal()
+    return result, False
+
+
+def replay_journal():
+    journal = offline_journal.get_journal()
+    try:
+        return journal.replay()
+    except mysql.connector.Error as e:
+        if not offline_journal.is_connection_error(e):
+            raise
+        journal.mark_offline()
+        return 0, 0
+
+
+# --- Concurrency check: many threads race for one free locker, exactly one must win ---
+def hammer(locker_id, sessions, rounds=1):
+    wins = []
+    lock = threading.Lock()
+    start = threading.Barrier(len(sessions))
+
+    def worker(session):
+        start.wait()
+        for _ in range(rounds):
+            if claim(locker_id, session, "hammer"):
+                with lock:
+                    wins.append(session.user_id)
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return wins
+
+
+if __name__ == "__main__":
+    # usage: python locker_service.py LOCKER_ID USER_ID [USER_ID ...]
+    # the locker must be free; it is released again afterwards
+    locker_id = int(sys.argv[1])
+    sessions = [Session(int(uid), f"user {uid}", "user") for uid in sys.argv[2:]]
+    db.get_pool().size = max(db.POOL_SIZE, len(sessions))
+    winners = hammer(locker_id, sessions, rounds=5)
+    print(f"{len(sessions)} threads x 5 claims -> {len(winners)} won: {winners}")
+    if winners:
+        release(locker_id, next(s for s in sessions if s.user_id == winners[0]))
+    sys.exit(0 if len(winners) == 1 else 1)
@@ -0,0 +1,200 @@
+import time
+import threading
+import mysql.connector
+import db
+import offline_journal
+
+# lockers_changes and its triggers are created by migration 6; readers poll it by change_id
+CHANGE_LOG_RETENTION_HOURS = 24
+# a change_id is taken when a transaction writes, not when it commits, so a lower id can become
+# visible after a higher one; ids skipped over are re-read until they show up or this many seconds
+# pass (a rolled-back transaction leaves an id that never does)
+CHANGE_GAP_SECONDS = 30
+# more missing ids than this in one poll is not a commit race; reload everything instead
+MAX_CHANGE_GAPS = 1000
+CHANGES_SQL = "SELECT change_id, locker_id FROM lockers_changes WHERE change_id > %s"
+
+# owners are compared by user_id against the session, so users is not joined
+STATE_SQL = "SELECT locker_id, user_id, object_in_locker FROM lockers"
+
+
+def prune_change_log():
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM lockers_changes WHERE changed_at < NOW() - INTERVAL %s HOUR",
+            (CHANGE_LOG_RETENTION_HOURS,)
+        )
+        conn.commit()
+        cursor.close()
+
+
+class LockerState:
+    __slots__ = ("locker_id", "user_id", "object_in_locker")
+
+    def __init__(self, locker_id, user_id, object_in_locker):
+        self.locker_id = locker_id
+        self.user_id = user_id
+        self.object_in_locker = object_in_locker
+
+    @property
+    def occupied(self):
+        return self.user_id is not None
+
+    def __eq__(self, other):
+        return (isinstance(other, LockerState) and
+                (self.locker_id, self.user_id, self.object_in_locker) ==
+                (other.locker_id, other.user_id, other.object_in_locker))
+
+
+# --- locker_id -> LockerState, kept current by diffs from lockers_changes ---
+class LockerStateCache:
+    def __init__(self):
+        self.states = {}
+        self.last_change_id = None     # None until the first full load
+        self.gaps = {}                 # change_id below last_change_id not seen yet -> when first missed
+        self.change_log = None         # unknown until the first load; False without lockers_changes
+        self.hits = 0
+        self.misses = 0
+        self.rows_reloaded = 0
+        # serialises refreshes only; readers never wait on a query because
+        # refreshes swap in a new states dict instead of mutating it
+        self._lock = threading.Lock()
+
+    def get(self, locker_id):
+        state = self.states.get(locker_id)
+        if state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return state
+
+    def refresh(self):
+        # returns the locker_ids whose state actually changed since the last refresh
+        journal = offline_journal.get_journal()
+        with self._lock:
+            if not journal.is_offline():
+                try:
+                    if journal.has_pending():
+                        # offline claims go to MySQL before we read its state back
+                        journal.replay()
+                    changed = self._refresh_online()
+                except mysql.connector.Error as e:
+                    if not offline_journal.is_connection_error(e):
+                        raise
+                    journal.mark_offline()
+                else:
+                    if changed:
+                        journal.mirror_lockers([self.states[lid] for lid in changed if lid in self.states])
+                    return changed
+            # MySQL unreachable: serve the local mirror, and reload fully once it is back
+            self.last_change_id = None
+            return self._swap({r[0]: LockerState(*r) for r in journal.locker_rows()})
+
+    def _refresh_online(self):
+        if self.last_change_id is None or not self.change_log:
+            return self._full_load()
+        now = time.monotonic()
+        self.gaps = {cid: t for cid, t in self.gaps.items() if now - t < CHANGE_GAP_SECONDS}
+        # read from the oldest id still missing, so a change that commits late is not skipped for good
+        floor = min(self.gaps, default=self.last_change_id + 1) - 1
+        rows = db.fetchall(CHANGES_SQL, (floor,))
+        touched = set()
+        for change_id, locker_id in rows:
+            if change_id > self.last_change_id or self.gaps.pop(change_id, None) is not None:
+                touched.add(locker_id)
+        newest = max((r[0] for r in rows), default=self.last_change_id)
+        if not self._note_gaps({r[0] for r in rows}, self.last_change_id, newest, now):
+            return self._full_load()
+        self.last_change_id = newest
+        if not touched:
+            self.hits += 1
+            return []
+        self.misses += 1
+        return self._reload(sorted(touched))
+
+    def _note_gaps(self, seen, low, high, now):
+        # ids in (low, high) that have not committed yet; False if there are too many to track
+        missing = high - low - 1 - sum(1 for cid in seen if low < cid < high)
+        if missing + len(self.gaps) > MAX_CHANGE_GAPS:
+            return False
+        for change_id in range(low + 1, high):
+            if change_id not in seen:
+                self.gaps.setdefault(change_id, now)
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self.last_change_id = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "rows_reloaded": self.rows_reloaded,
+            "cached_lockers": len(self.states),
+        }
+
+    def _full_load(self):
+        self.misses += 1
+        if self.change_log is None:
+            try:
+                prune_change_log()
+                self.change_log = True
+            except mysql.connector.Error as e:
+                if offline_journal.is_connection_error(e) or isinstance(e, mysql.connector.errors.PoolError):
+                    raise
+                # schema not migrated to the change log yet: fall back to full reloads
+                self.change_log = False
+        if self.change_log:
+            try:
+                # read the high-water mark first so nothing written during the load is missed
+                row = db.fetchone("SELECT COALESCE(MAX(change_id), 0) FROM lockers_changes")
+                self.last_change_id = row[0]
+                # ids just below the mark that have not committed yet are watched like any other gap
+                window = max(self.last_change_id - MAX_CHANGE_GAPS // 4, 0)
+                recent = {r[0] for r in db.fetchall(CHANGES_SQL, (window,)) if r[0] <= self.last_change_id}
+                self.gaps = {}
+                self._note_gaps(recent, window, self.last_change_id + 1, time.monotonic())
+            except mysql.connector.ProgrammingError:
+                self.change_log = False
+        rows = db.fetchall(STATE_SQL)
+        self.rows_reloaded += len(rows)
+        return self._swap({r[0]: LockerState(*r) for r in rows})
+
+    def _swap(self, fresh):
+        changed = [lid for lid in fresh if self.states.get(lid) != fresh[lid]]
+        changed += [lid for lid in self.states if lid not in fresh]
+        self.states = fresh
+        return changed
+
+    def _reload(self, locker_ids):
+        placeholders = ", ".join(["%s"] * len(locker_ids))
+        rows = db.fetchall(f"{STATE_SQL} WHERE locker_id IN ({placeholders})", tuple(locker_ids))
+        self.rows_reloaded += len(rows)
+        states = dict(self.states)
+        changed = []
+        seen = set()
+        for r in rows:
+            state = LockerState(*r)
+            seen.add(state.locker_id)
+            if states.get(state.locker_id) != state:
+                states[state.locker_id] = state
+                changed.append(state.locker_id)
+        for locker_id in locker_ids:
+            if locker_id not in seen and states.pop(locker_id, None) is not None:
+                changed.append(locker_id)
+        self.states = states
+        return changed
+
+
+_cache = None
+
+
+def get_state_cache():
+    global _cache
+    if _cache is None:
+        _cache = LockerStateCache()
+    return _cache
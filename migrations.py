@@ -0,0 +1,317 @@
+import sys
+import time
+import mysql.connector
+import db
+import audit_log
+import analytics
+import otp_service
+import registration
+import kiosk_service
+import locker_service
+import locker_state
+
+# MySQL commits DDL implicitly, so a migration cannot be rolled back half way; every step
+# checks information_schema first and is safe to re-run after a failure
+VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+# --- Idempotent building blocks ---
+def _scalar(cursor, sql, params):
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def has_table(cursor, table):
+    return bool(_scalar(cursor, "SELECT COUNT(*) FROM information_schema.TABLES "
+                                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,)))
+
+
+def has_column(cursor, table, column):
+    return bool(_scalar(cursor, "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                        (table, column)))
+
+
+def has_index(cursor, table, index):
+    return bool(_scalar(cursor, "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+                        (table, index)))
+
+
+def column_type(cursor, table, column):
+    return _scalar(cursor, "SELECT COLUMN_TYPE FROM information_schema.COLUMNS "
+                           "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                   (table, column))
+
+
+def add_column(table, column, definition):
+    def step(cursor):
+        if not has_column(cursor, table, column):
+            cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+    return step
+
+
+def add_index(table, index, definition):
+    def step(cursor):
+        if not has_index(cursor, table, index):
+            cursor.execute(f"ALTER TABLE `{table}` ADD {definition}")
+    return step
+
+
+def drop_column(table, column):
+    def step(cursor):
+        if has_column(cursor, table, column):
+            cursor.execute(f"ALTER TABLE `{table}` DROP COLUMN `{column}`")
+    return step
+
+
+def sql(statement):
+    return lambda cursor: cursor.execute(statement)
+
+
+def _widen_password(cursor):
+    # scrypt strings are ~100 chars; older schemas sized the column for plaintext
+    if column_type(cursor, "users", "password") != "varchar(255)":
+        cursor.execute("ALTER TABLE users MODIFY password VARCHAR(255) NOT NULL")
+
+
+# --- The schema, one version at a time. Append only; never edit an applied migration ---
+MIGRATIONS = [
+    (1, "baseline users and lockers", [
+        sql("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                name VARCHAR(100) NOT NULL,
+                age INT,
+                birthday DATE,
+                role VARCHAR(20) NOT NULL DEFAULT 'user',
+                otp VARCHAR(10)
+            )
+        """),
+        sql("""
+            CREATE TABLE IF NOT EXISTS lockers (
+                locker_id INT PRIMARY KEY,
+                user_id INT NULL,
+                object_in_locker VARCHAR(255)
+            )
+        """),
+    ]),
+    # login, forgot-password and registration look users up by name
+    (2, "users lookup keys", [
+        add_index("users", "uq_users_username", "UNIQUE KEY uq_users_username (username)"),
+        add_index("users", "uq_users_name_birthday", "UNIQUE KEY uq_users_name_birthday (name, birthday)"),
+    ]),
+    # lockers.user_id = users.user_id is the join in the admin user list
+    (3, "lockers user_id index", [
+        add_index("lockers", "idx_lockers_user_id", "KEY idx_lockers_user_id (user_id)"),
+    ]),
+    (4, "password column fits scrypt hashes", [
+        _widen_password,
+    ]),
+    (5, "locker bank layout columns", [
+        add_column("lockers", "gpio_pin", "INT NULL"),
+        add_column("lockers", "relay_channel", "INT NULL"),
+        add_column("lockers", "grid_row", "INT NULL"),
+        add_column("lockers", "grid_col", "INT NULL"),
+    ]),
+    # change log read by LockerStateCache; the triggers feed it on every lockers write
+    (6, "lockers change log", [
+        sql("""
+            CREATE TABLE IF NOT EXISTS lockers_changes (
+                change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                locker_id INT NOT NULL,
+                changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_lockers_changes_changed_at (changed_at)
+            )
+        """),
+        sql("""
+            CREATE TRIGGER IF NOT EXISTS lockers_after_insert AFTER INSERT ON lockers
+            FOR EACH ROW INSERT INTO lockers_changes (locker_id) VALUES (NEW.locker_id)
+        """),
+        sql("""
+            CREATE TRIGGER IF NOT EXISTS lockers_after_update AFTER UPDATE ON lockers
+            FOR EACH ROW INSERT INTO lockers_changes (locker_id) VALUES (NEW.locker_id)
+        """),
+        sql("""
+            CREATE TRIGGER IF NOT EXISTS lockers_after_delete AFTER DELETE ON lockers
+            FOR EACH ROW INSERT INTO lockers_changes (locker_id) VALUES (OLD.locker_id)
+        """),
+    ]),
+    # OTPs are stored hashed with an expiry; per-user guess budgets survive restarts
+    (7, "hashed expiring otp and guess budgets", [
+        add_column("users", "otp_hash", "VARCHAR(100) NULL"),
+        add_column("users", "otp_expires_at", "DATETIME NULL"),
+        drop_column("users", "otp"),
+        sql("""
+            CREATE TABLE IF NOT EXISTS otp_buckets (
+                user_id INT PRIMARY KEY,
+                tokens DOUBLE NOT NULL,
+                updated_at DOUBLE NOT NULL
+            )
+        """),
+    ]),
+    # append-only audit trail, partitioned by month; later months are split off by audit_log
+    (8, "locker events log", [
+        lambda cursor: cursor.execute(audit_log.create_table_sql()),
+        audit_log.ensure_partitions,
+    ]),
+    # hourly/daily rollups of locker_events for the admin analytics tab
+    (9, "usage rollups", [
+        analytics.ensure_tables,
+    ]),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(pool=None):
+    with (pool or db.get_pool()).connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(VERSION_DDL)
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {r[0] for r in cursor.fetchall()}
+        cursor.close()
+        return versions
+
+
+def migrate(target=LATEST_VERSION, pool=None, log=print):
+    # applies every missing migration up to target, in order; returns the versions applied
+    done = applied_versions(pool)
+    applied = []
+    with (pool or db.get_pool()).connection() as conn:
+        cursor = conn.cursor()
+        for version, name, steps in MIGRATIONS:
+            if version > target or version in done:
+                continue
+            start = time.perf_counter()
+            for step in steps:
+                step(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+            log(f"  {version:>3} {name} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        cursor.close()
+    return applied
+
+
+# --- EXPLAIN regression check for the queries the GUIs run on every interaction ---
+# name -> (statement, params, tables allowed to be scanned in full)
+HOT_QUERIES = {
+    "login": (kiosk_service.LOGIN_SQL, ("user1", "user1"), set()),
+    "forgot password lookup": (kiosk_service.USER_EXISTS_SQL, ("user1",), set()),
+    "forgot password verify": (
+        kiosk_service.OTP_LOOKUP_SQL, ("user1", "user1", "Name 1", "2000-01-02", 25), set()),
+    "otp check": (otp_service.OTP_CHECK_SQL, (1,), set()),
+    "otp bucket restore": (otp_service.BUCKET_SQL, (1,), set()),
+    "claim": (locker_service.CLAIM_SQL, (1, "bag", 1), set()),
+    "release": (locker_service.RELEASE_SQL, (1, 1), set()),
+    "locker state reload": (
+        f"{locker_state.STATE_SQL} WHERE locker_id IN (%s, %s)", (1, 2), set()),
+    # the full-state load, the identity index and the admin user list read every row on purpose
+    "locker state full load": (locker_state.STATE_SQL, (), {"lockers"}),
+    "registration identity index": (registration.IDENTITY_INDEX_SQL, (), {"users"}),
+    "admin user list": (kiosk_service.USER_OVERVIEW_SQL, (), {"u"}),
+    "admin assign locker": (kiosk_service.ASSIGN_SQL, (1, "bag", 1), set()),
+    "admin remove user": (kiosk_service.REMOVE_USER_SQL, (1,), set()),
+    "events by locker": (*audit_log.history_query(locker_id=1, since="2000-01-01"), set()),
+    "events by user": (*audit_log.history_query(user_id=1, since="2000-01-01"), set()),
+    "locker holder at time": (
+        audit_log.HOLDER_AT_SQL, (1, "2030-01-01") + audit_log.OWNERSHIP_EVENTS, set()),
+    "rollup new events": (
+        analytics.ROLLUP_EVENTS_SQL, (1,) + audit_log.OWNERSHIP_EVENTS + (analytics.ROLLUP_BATCH,), set()),
+    "analytics lockers window": (analytics.LOCKER_WINDOW_SQL, ("2030-01-01",), set()),
+    "analytics peak hours": (analytics.PEAK_HOURS_SQL, ("2030-01-01",), set()),
+    "analytics users window": (analytics.USER_WINDOW_SQL, ("2030-01-01", analytics.TOP_USERS), set()),
+    "change log poll": (locker_state.CHANGES_SQL, (1,), set()),
+}
+
+
+def explain(name, pool=None):
+    # returns the EXPLAIN rows of one hot query that scan a table they should not
+    statement, params, allowed = HOT_QUERIES[name]
+    with (pool or db.get_pool()).connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("EXPLAIN " + statement, params)
+        plan = cursor.fetchall()
+        cursor.close()
+    return [row for row in plan
+            if row.get("type") in ("ALL", "index") and row.get("table") not in allowed]
+
+
+def check_plans(pool=None, log=print):
+    regressions = {}
+    for name in HOT_QUERIES:
+        bad = explain(name, pool)
+        if bad:
+            regressions[name] = bad
+        log(f"  {'FULL SCAN' if bad else 'ok':>9}  {name}" +
+            "".join(f"  [{r['table']}: type={r['type']} key={r['key']}]" for r in bad))
+    return regressions
+
+
+# --- Harness: build the schema from nothing in a scratch database and check every plan ---
+def self_test(database="locker_system_migration_test", users=500, lockers=48):
+    admin = mysql.connector.connect(**{k: v for k, v in db.DB_CONFIG.items() if k != "database"})
+    cursor = admin.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    pool = db.ConnectionPool(size=1, **{**db.DB_CONFIG, "database": database})
+    try:
+        print(f"migrating {database} from empty:")
+        assert migrate(pool=pool) == [v for v, _, _ in MIGRATIONS]
+        print("re-running (must be a no-op):")
+        assert migrate(pool=pool) == []
+
+        # enough rows that the optimizer prefers the indexes over reading tiny tables whole
+        with pool.connection() as conn:
+            c = conn.cursor()
+            c.executemany(
+                "INSERT INTO users (username, password, name, age, birthday) VALUES (%s, 'x', %s, 25, %s)",
+                [(f"user{i}", f"Name {i}", f"2000-01-{i % 28 + 1:02d}") for i in range(users)])
+            c.executemany(
+                "INSERT INTO lockers (locker_id, user_id, object_in_locker) VALUES (%s, %s, %s)",
+                [(i, i if i % 2 else None, "bag" if i % 2 else None) for i in range(1, lockers + 1)])
+            conn.commit()
+            c.execute("ANALYZE TABLE users, lockers, lockers_changes, otp_buckets, locker_events")
+            c.fetchall()
+            c.close()
+
+        print("query plans:")
+        regressions = check_plans(pool)
+    finally:
+        pool.close_all()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+        cursor.close()
+        admin.close()
+    return not regressions
+
+
+def status(pool=None):
+    done = applied_versions(pool)
+    for version, name, _ in MIGRATIONS:
+        print(f"  {version:>3} {'applied' if version in done else 'pending':>8}  {name}")
+
+
+if __name__ == "__main__":
+    # usage: python migrations.py [migrate [VERSION] | status | explain | selftest]
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        target = int(sys.argv[2]) if len(sys.argv) > 2 else LATEST_VERSION
+        applied = migrate(target)
+        print(f"schema at version {max(applied_versions())}" if applied else "schema is up to date")
+    elif command == "status":
+        status()
+    elif command == "explain":
+        sys.exit(1 if check_plans() else 0)
+    elif command == "selftest":
+        sys.exit(0 if self_test() else 1)
+    else:
+        sys.exit(f"unknown command {command!r}")
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+from PySide6.QtCore import QObject
+from PySide6.QtWidgets import QApplication, QStackedWidget
+
+
+# --- One kiosk window; every screen is built on first use, then reused for the life of the app ---
+class ScreenStack(QStackedWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.factories = {}     # name -> callable(stack) returning the screen widget
+        self.screens = {}       # name -> screen widget, once built
+        self.current_name = None
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+
+    def screen(self, name):
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = self.screens[name] = self.factories[name](self)
+            self.addWidget(screen)
+        return screen
+
+    def show_screen(self, name, **state):
+        # the screen being left drops per-visit state (timers, relays); the new one resets itself
+        if self.current_name is not None and self.current_name != name:
+            leaving = self.screens[self.current_name]
+            if hasattr(leaving, "leave"):
+                leaving.leave()
+        screen = self.screen(name)
+        if hasattr(screen, "enter"):
+            screen.enter(**state)
+        self.current_name = name
+        self.setCurrentWidget(screen)
+        return screen
+
+    def closeEvent(self, event):
+        if self.current_name is not None and hasattr(self.screens[self.current_name], "leave"):
+            self.screens[self.current_name].leave()
+        super().closeEvent(event)
+
+
+# --- Soak: log in and out many times; memory and QObject counts must stay flat ---
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss    # peak, still enough to see growth
+
+
+def qobject_count(app):
+    return len(app.findChildren(QObject)) + sum(
+        1 + len(w.findChildren(QObject)) for w in app.topLevelWidgets()
+    )
+
+
+def soak(cycles=2000, username=None, password=None, admin_username=None, admin_password=None,
+         warmup=200, rss_slack_kb=2048):
+    # drives the kiosk's real screens with real logins against the locker service (LOCKER_HARDWARE=sim
+    # is fine); warmup cycles let Qt fill its style and font caches before the baseline is taken
+    from api_client import get_client
+    from locker_gui import build_kiosk
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    client = get_client()
+    kiosk = build_kiosk()
+    kiosk.show()
+    probe = client.login(username, password)
+    if probe is None:
+        sys.exit(f"soak: cannot log in as {username!r}")
+    client.logout(probe)
+    client.layout()
+
+    def settle():
+        for _ in range(3):
+            app.processEvents()
+
+    def cycle(n):
+        # every visit is a fresh login; leaving the screen logs the session out again
+        kiosk.show_screen("lockers", session=client.login(username, password))
+        settle()
+        kiosk.show_screen("login")
+        settle()
+        if admin_username is not None and n % 10 == 0:
+            kiosk.show_screen("admin", session=client.login(admin_username, admin_password))
+            settle()
+            kiosk.show_screen("login")
+            settle()
+
+    start = time.perf_counter()
+    for n in range(warmup):
+        cycle(n)
+    qobject_count(app)      # the first count loads shiboken's wrappers for every type; keep that out of the baseline
+    samples = []
+    for n in range(cycles):
+        cycle(n)
+        if n % max(1, cycles // 10) == 0 or n == cycles - 1:
+            samples.append((n, rss_kb(), qobject_count(app)))
+    elapsed = time.perf_counter() - start
+    _, base_rss, base_objects = samples[0]
+
+    for n, rss, objects in samples:
+        print(f"  cycle {n:>6}: rss {rss / 1024:7.1f} MB ({(rss - base_rss) / 1024:+.1f}), "
+              f"qobjects {objects} ({objects - base_objects:+d})")
+    _, end_rss, end_objects = samples[-1]
+    print(f"{cycles} login/logout cycles in {elapsed:.1f} s ({elapsed / (cycles + warmup) * 1000:.2f} ms each), "
+          f"{len(kiosk.screens)} screens built")
+    ok = True
+    if end_objects != base_objects:
+        print(f"  LEAK: {end_objects - base_objects:+d} QObjects after {cycles} cycles")
+        ok = False
+    if end_rss - base_rss > rss_slack_kb:
+        print(f"  LEAK: rss grew {(end_rss - base_rss) / 1024:.1f} MB after {cycles} cycles")
+        ok = False
+    kiosk.close()
+    return ok
+
+
+if __name__ == "__main__":
+    # usage: python navigation.py CYCLES USERNAME PASSWORD [ADMIN_USERNAME ADMIN_PASSWORD]
+    sys.exit(0 if soak(int(sys.argv[1]), *sys.argv[2:6]) else 1)
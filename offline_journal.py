@@ -0,0 +1,256 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from mysql.connector import errors
+import db
+import audit_log
+import change_bus
+import credentials
+import locker_service
+from session import Session
+
+JOURNAL_PATH = os.environ.get("LOCKER_JOURNAL_PATH",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "locker_offline.db"))
+REPLAY_BATCH_SIZE = 50
+# after MySQL fails to answer, go straight to the journal for this long before trying again
+OFFLINE_BACKOFF_SECONDS = 15
+
+log = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS credentials (
+        username TEXT PRIMARY KEY,
+        secret TEXT NOT NULL,
+        role TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS lockers (
+        locker_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        object_in_locker TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL CHECK (op IN ('claim', 'release')),
+        locker_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        object_in_locker TEXT,
+        created_at REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        detail TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_journal_status_seq ON journal(status, seq)",
+]
+
+
+def is_connection_error(e):
+    # the server is unreachable, as opposed to a query that failed. An exhausted pool (PoolError) is
+    # neither: MySQL is up and busy, so the caller answers busy instead of going offline
+    return isinstance(e, (errors.InterfaceError, errors.OperationalError))
+
+
+# --- Local SQLite mirror of credential hashes/lockers plus a durable journal of offline claims ---
+class OfflineJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")    # a journaled claim must survive a power cut
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        self._pending = self.conn.execute("SELECT COUNT(*) FROM journal WHERE status='pending'").fetchone()[0]
+        self._offline_until = 0.0
+        self._replay_lock = threading.Lock()
+
+    # --- connectivity ---
+    def mark_offline(self):
+        self._offline_until = time.monotonic() + OFFLINE_BACKOFF_SECONDS
+
+    def mark_online(self):
+        self._offline_until = 0.0
+
+    def is_offline(self):
+        return time.monotonic() < self._offline_until
+
+    def has_pending(self):
+        return self._pending > 0
+
+    # --- credentials ---
+    def remember_login(self, session, secret):
+        # secret is the scrypt hash MySQL holds, so caching it costs no extra hashing
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO credentials (username, secret, role, user_id, name, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET secret=excluded.secret, role=excluded.role, "
+                "user_id=excluded.user_id, name=excluded.name, updated_at=excluded.updated_at",
+                (session.username, secret, session.role, session.user_id, session.display_name, time.time())
+            )
+
+    def check_login(self, username, password):
+        # returns a Session, or None
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT secret, role, user_id, name FROM credentials WHERE username=?", (username,)
+            ).fetchone()
+        if row and credentials.check_login(username, password, row[0])[0]:
+            return Session(row[2], username, row[1], row[3])
+        return None
+
+    # --- locker mirror ---
+    def mirror_lockers(self, states):
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO lockers (locker_id, user_id, object_in_locker) VALUES (?, ?, ?)",
+                [(s.locker_id, s.user_id, s.object_in_locker) for s in states]
+            )
+            self.conn.execute("COMMIT")
+
+    def locker_rows(self):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT locker_id, user_id, object_in_locker FROM lockers ORDER BY locker_id"
+            ).fetchall()
+
+    # --- offline claim/release: local conditional update + journal entry in one transaction ---
+    def claim(self, locker_id, session, object_in_locker):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            cur = self.conn.execute(
+                "UPDATE lockers SET user_id=?, object_in_locker=? WHERE locker_id=? AND user_id IS NULL",
+                (session.user_id, object_in_locker, locker_id)
+            )
+            won = cur.rowcount == 1
+            if won:
+                self._append("claim", locker_id, session, object_in_locker)
+            self.conn.execute("COMMIT")
+            return won
+
+    def release(self, locker_id, session):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            cur = self.conn.execute(
+                "UPDATE lockers SET user_id=NULL, object_in_locker=NULL WHERE locker_id=? AND user_id=?",
+                (locker_id, session.user_id)
+            )
+            won = cur.rowcount == 1
+            if won:
+                self._append("release", locker_id, session, None)
+            self.conn.execute("COMMIT")
+            return won
+
+    def _append(self, op, locker_id, session, object_in_locker):
+        # username is kept alongside user_id so conflicts can be reported by name
+        self.conn.execute(
+            "INSERT INTO journal (op, locker_id, user_id, username, object_in_locker, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (op, locker_id, session.user_id, session.username, object_in_locker, time.time())
+        )
+        self._pending += 1
+
+    # --- replay to MySQL ---
+    def replay(self, batch_size=REPLAY_BATCH_SIZE):
+        # returns (applied, conflicts); a conflict is an entry MySQL no longer agrees with,
+        # e.g. the locker was claimed elsewhere while this kiosk was offline
+        if not self._replay_lock.acquire(blocking=False):
+            return 0, 0     # another thread is already replaying
+        try:
+            return self._replay(batch_size)
+        finally:
+            self._replay_lock.release()
+
+    def _replay(self, batch_size):
+        applied = conflicts = 0
+        while True:
+            with self._lock:
+                batch = self.conn.execute(
+                    "SELECT seq, op, locker_id, user_id, username, object_in_locker FROM journal "
+                    "WHERE status='pending' ORDER BY seq LIMIT ?",
+                    (batch_size,)
+                ).fetchall()
+            if not batch:
+                break
+            outcomes = []
+            with db.connection() as pc:
+                for seq, op, locker_id, user_id, username, obj in batch:
+                    if op == "claim":
+                        cur = pc.prepared(locker_service.CLAIM_SQL)
+                        cur.execute(locker_service.CLAIM_SQL, (user_id, obj, locker_id))
+                    else:
+                        cur = pc.prepared(locker_service.RELEASE_SQL)
+                        cur.execute(locker_service.RELEASE_SQL, (locker_id, user_id))
+                    if cur.rowcount == 1:
+                        outcomes.append(("applied", None, seq))
+                    else:
+                        outcomes.append(("conflict", f"{op} of locker {locker_id} rejected by server", seq))
+                pc.commit()
+            with self._lock:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("UPDATE journal SET status=?, detail=? WHERE seq=?", outcomes)
+                self.conn.execute("COMMIT")
+                self._pending -= len(outcomes)
+            self._report(batch, outcomes)
+            applied += sum(1 for o in outcomes if o[0] == "applied")
+            conflicts += sum(1 for o in outcomes if o[0] == "conflict")
+        self.mark_online()
+        return applied, conflicts
+
+    @staticmethod
+    def _report(batch, outcomes):
+        # replayed entries are audited and announced now that MySQL has them; conflicts get their own event
+        changes = []
+        for (seq, op, locker_id, user_id, username, obj), (status, detail, _) in zip(batch, outcomes):
+            if status == "applied":
+                if op == "claim":
+                    audit_log.record(audit_log.CLAIM, locker_id, user_id, detail=obj)
+                    changes.append((locker_id, user_id))
+                else:
+                    audit_log.record(audit_log.RELEASE, locker_id, user_id)
+                    changes.append((locker_id, None))
+            else:
+                log.warning("offline journal entry %d not replayed: %s", seq, detail)
+                audit_log.record(audit_log.JOURNAL_CONFLICT, locker_id, user_id, detail=f"{op} by {username}: {detail}")
+        if changes:
+            change_bus.publish(changes)
+
+    def conflicts(self, limit=-1):
+        # newest first; these need an admin to sort out by hand
+        with self._lock:
+            return self.conn.execute(
+                "SELECT seq, op, locker_id, username, object_in_locker, created_at, detail "
+                "FROM journal WHERE status='conflict' ORDER BY seq DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def conflict_count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM journal WHERE status='conflict'").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = OfflineJournal()
+    return _journal
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+import db
+
+OTP_DIGITS = 6
+OTP_TTL_SECONDS = int(os.environ.get("LOCKER_OTP_TTL", "300"))
+# each user may guess BUCKET_CAPACITY times in a burst, then one guess per BUCKET_REFILL_SECONDS
+BUCKET_CAPACITY = int(os.environ.get("LOCKER_OTP_ATTEMPTS", "5"))
+BUCKET_REFILL_SECONDS = float(os.environ.get("LOCKER_OTP_REFILL_SECONDS", "60"))
+
+OK = "ok"
+INVALID = "invalid"
+EXPIRED = "expired"
+THROTTLED = "throttled"
+
+OTP_CHECK_SQL = "SELECT otp_hash, otp_expires_at > NOW() FROM users WHERE user_id=%s"
+BUCKET_SQL = "SELECT tokens, updated_at FROM otp_buckets WHERE user_id=%s"
+
+
+def _hash_otp(user_id, otp, salt):
+    return hmac.new(salt, f"{user_id}\0{otp}".encode(), hashlib.sha256).digest()
+
+
+def hash_otp(user_id, otp):
+    salt = secrets.token_bytes(16)
+    return base64.b64encode(salt).decode() + "$" + base64.b64encode(_hash_otp(user_id, otp, salt)).decode()
+
+
+def otp_matches(user_id, otp, stored):
+    salt, digest = stored.split("$")
+    return hmac.compare_digest(_hash_otp(user_id, otp, base64.b64decode(salt)), base64.b64decode(digest))
+
+
+# --- Per-key token bucket; pure bookkeeping, the service decides where it is stored ---
+class TokenBucket:
+    def __init__(self, capacity=BUCKET_CAPACITY, refill_seconds=BUCKET_REFILL_SECONDS, clock=time.time):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.clock = clock      # wall clock, because buckets outlive the process in otp_buckets
+        self.buckets = {}       # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.buckets
+
+    def restore(self, key, tokens, updated_at):
+        with self._lock:
+            self.buckets.setdefault(key, [tokens, updated_at])
+
+    def take(self, key):
+        # spends one token if there is one; returns (allowed, tokens, updated_at) for persisting
+        with self._lock:
+            now = self.clock()
+            tokens, updated_at = self.buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) / self.refill_seconds)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = [tokens, now]
+            return allowed, tokens, now
+
+    def retry_after(self, key):
+        with self._lock:
+            tokens, updated_at = self.buckets.get(key, (self.capacity, self.clock()))
+            return max(0.0, (1 - tokens) * self.refill_seconds - (self.clock() - updated_at))
+
+
+# --- One-time passwords for the forgot-password flow: hashed, expiring, single use, rate limited ---
+class OtpService:
+    def __init__(self, bucket=None):
+        self.bucket = bucket or TokenBucket()
+
+    def issue(self, user_id):
+        # returns the plaintext OTP to show the user; only its hash is stored
+        otp = f"{secrets.randbelow(10 ** OTP_DIGITS):0{OTP_DIGITS}d}"
+        db.execute(
+            "UPDATE users SET otp_hash=%s, otp_expires_at=NOW() + INTERVAL %s SECOND WHERE user_id=%s",
+            (hash_otp(user_id, otp), OTP_TTL_SECONDS, user_id)
+        )
+        return otp
+
+    def verify(self, user_id, otp):
+        # returns OK, INVALID, EXPIRED or THROTTLED; a correct OTP is consumed
+        if user_id not in self.bucket:
+            self._restore_bucket(user_id)
+        allowed, tokens, updated_at = self.bucket.take(user_id)
+        if not allowed:
+            return THROTTLED    # decided in memory, MySQL is not asked
+        with db.connection() as pc:
+            cur = pc.cursor()
+            try:
+                cur.execute(
+                    "INSERT INTO otp_buckets (user_id, tokens, updated_at) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE tokens=VALUES(tokens), updated_at=VALUES(updated_at)",
+                    (user_id, tokens, updated_at)
+                )
+                cur.execute(OTP_CHECK_SQL, (user_id,))
+                row = cur.fetchone()
+                if not row or not row[0]:
+                    status = INVALID
+                elif not row[1]:
+                    status = EXPIRED
+                elif not otp_matches(user_id, otp.strip(), row[0]):
+                    status = INVALID
+                else:
+                    # conditional clear, so the same OTP cannot be redeemed twice
+                    cur.execute("UPDATE users SET otp_hash=NULL, otp_expires_at=NULL "
+                                "WHERE user_id=%s AND otp_hash=%s", (user_id, row[0]))
+                    status = OK if cur.rowcount == 1 else INVALID
+                pc.commit()
+            finally:
+                cur.close()
+        return status
+
+    def retry_after(self, user_id):
+        return self.bucket.retry_after(user_id)
+
+    def _restore_bucket(self, user_id):
+        row = db.fetchone(BUCKET_SQL, (user_id,))
+        if row:
+            self.bucket.restore(user_id, row[0], row[1])
+
+
+_service = None
+
+
+def get_otp_service():
+    global _service
+    if _service is None:
+        _service = OtpService()
+    return _service
+
+
+# --- Throughput check: a guessing loop can never beat capacity + elapsed / refill ---
+def throughput_check(guesses_per_second=50, minutes=30):
+    now = [0.0]
+    bucket = TokenBucket(clock=lambda: now[0])
+    allowed = 0
+    total = int(guesses_per_second * minutes * 60)
+    for _ in range(total):
+        now[0] += 1.0 / guesses_per_second
+        allowed += bucket.take("attacker")[0]
+    cap = bucket.capacity + int(now[0] / bucket.refill_seconds)
+    space = 10 ** OTP_DIGITS
+    print(f"{total} guesses over {minutes} min -> {allowed} reached MySQL (cap {cap})")
+    print(f"chance of hitting one {OTP_DIGITS}-digit OTP within its {OTP_TTL_SECONDS}s lifetime: "
+          f"{(bucket.capacity + OTP_TTL_SECONDS / bucket.refill_seconds) / space:.6%}")
+    return allowed <= cap
+
+
+if __name__ == "__main__":
+    sys.exit(0 if throughput_check(*[float(a) for a in sys.argv[1:3]]) else 1)
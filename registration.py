@@ -0,0 +1,104 @@
+import time
+import threading
+import mysql.connector
+from mysql.connector import errorcode
+import db
+import credentials
+
+# unique keys created by migration 2; the INSERT is the check
+DUPLICATE_FIELDS = {
+    "uq_users_username": "username",
+    "uq_users_name_birthday": "name_birthday",
+}
+IDENTITY_INDEX_SQL = "SELECT username, name, birthday FROM users"
+
+
+def duplicate_field(error):
+    # maps "Duplicate entry '...' for key 'users.uq_users_username'" to the field that clashed
+    if getattr(error, "errno", None) != errorcode.ER_DUP_ENTRY:
+        return None
+    for key, field in DUPLICATE_FIELDS.items():
+        if key in str(error):
+            return field
+    return "username"
+
+
+def register_user(username, password, name, age, birthday):
+    # one round trip; returns None on success or the field that was a duplicate
+    try:
+        db.execute(
+            "INSERT INTO users(username, password, name, age, birthday, role) VALUES (%s, %s, %s, %s, %s, 'user')",
+            (username, credentials.hash_password(password), name, age, birthday)
+        )
+    except mysql.connector.IntegrityError as e:
+        field = duplicate_field(e)
+        if field is None:
+            raise
+        return field
+    get_identity_index().add(username, name, birthday)
+    return None
+
+
+# --- In-memory set of taken usernames and (name, birthday) pairs for as-you-type hints ---
+class IdentityIndex:
+    def __init__(self):
+        self.usernames = set()
+        self.identities = set()
+        self.loaded = False
+        self.loaded_at = None       # time.monotonic() of the last load
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        # runs on the DB executor
+        rows = db.fetchall(IDENTITY_INDEX_SQL)
+        usernames = {_fold(r[0]) for r in rows if r[0]}
+        identities = {(_fold(r[1]), str(r[2])) for r in rows if r[1]}
+        with self._lock:
+            self.usernames, self.identities = usernames, identities
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+        return self
+
+    def refresh(self, max_age):
+        # reloads once the index is older than max_age seconds; while one thread reloads, the others
+        # answer from what is already there instead of starting loads of their own
+        if not self._stale(max_age) or not self._load_lock.acquire(blocking=False):
+            return self
+        try:
+            if self._stale(max_age):
+                self.load()
+        finally:
+            self._load_lock.release()
+        return self
+
+    def _stale(self, max_age):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    def add(self, username, name, birthday):
+        with self._lock:
+            self.usernames.add(_fold(username))
+            self.identities.add((_fold(name), str(birthday)))
+
+    def username_taken(self, username):
+        # None means "don't know yet"; the INSERT still has the final word
+        if not self.loaded:
+            return None
+        return _fold(username) in self.usernames
+
+    def identity_taken(self, name, birthday):
+        if not self.loaded:
+            return None
+        return (_fold(name), str(birthday)) in self.identities
+
+
+def _fold(text):
+    # MySQL's default collations compare case- and trailing-space-insensitively
+    return text.strip().casefold()
+
+
+_index = IdentityIndex()
+
+
+def get_identity_index():
+    return _index
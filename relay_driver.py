@@ -0,0 +1,311 @@
+import sys
+import threading
+from contextlib import contextmanager
+from hardware import LockerHardware, DeviceBusyError
+
+# at most this many solenoids energised at once unless the bank config says otherwise
+DEFAULT_MAX_ACTIVE = 2
+
+MCP23017_IODIRA = 0x00
+MCP23017_OLATA = 0x14
+
+
+# --- Buses: one write call is one transaction on the wire ---
+class SMBusI2C:
+    def __init__(self, bus_number=1):
+        try:
+            from smbus2 import SMBus
+        except ImportError:
+            raise RuntimeError("I2C relay drivers need the smbus2 package (pip install smbus2)") from None
+        self.smbus = SMBus(bus_number)
+
+    def write_byte(self, address, value):
+        self.smbus.write_byte(address, value)
+
+    def write_block(self, address, register, values):
+        self.smbus.write_i2c_block_data(address, register, list(values))
+
+    def close(self):
+        self.smbus.close()
+
+
+class GpioShiftBus:
+    # bit-banged 74HC595 chain on three gpiozero pins; the latch makes every shift one transaction
+    def __init__(self, data_pin, clock_pin, latch_pin, pin_factory=None):
+        from gpiozero import DigitalOutputDevice
+        self.data = DigitalOutputDevice(data_pin, pin_factory=pin_factory)
+        self.clock = DigitalOutputDevice(clock_pin, pin_factory=pin_factory)
+        self.latch = DigitalOutputDevice(latch_pin, pin_factory=pin_factory)
+
+    def shift_out(self, values):
+        # values[0] ends up in the first register of the chain, so it is shifted last
+        self.latch.off()
+        for value in reversed(values):
+            for bit in range(7, -1, -1):
+                self.data.value = (value >> bit) & 1
+                self.clock.on()
+                self.clock.off()
+        self.latch.on()
+
+    def close(self):
+        for device in (self.data, self.clock, self.latch):
+            device.close()
+
+
+class FakeBus:
+    # in-memory stand-in for both bus kinds; records every transaction for inspection
+    def __init__(self):
+        self.transactions = []      # ("byte", address, value) / ("block", address, register, values) / ("shift", values)
+        self.registers = {}         # (address, register) -> value; register None for PCF8574-style writes
+        self.shifted = []
+
+    def write_byte(self, address, value):
+        self.transactions.append(("byte", address, value))
+        self.registers[(address, None)] = value
+
+    def write_block(self, address, register, values):
+        values = list(values)
+        self.transactions.append(("block", address, register, values))
+        for offset, value in enumerate(values):
+            self.registers[(address, register + offset)] = value
+
+    def shift_out(self, values):
+        self.transactions.append(("shift", list(values)))
+        self.shifted = list(values)
+
+    def close(self):
+        pass
+
+
+# --- Chips: stage channel changes in memory, write them out in one transaction on flush ---
+class RelayDriver:
+    channels = 0
+
+    def __init__(self, bus, active_low=True):
+        self.bus = bus
+        self.active_low = active_low    # most relay boards energise on a low output
+        self.state = [False] * self.channels
+        self._written = None
+
+    def set(self, channel, on):
+        self.state[channel] = on
+
+    def levels(self, count):
+        value = 0
+        for channel, on in enumerate(self.state):
+            if on != self.active_low:
+                value |= 1 << channel
+        return [(value >> (8 * i)) & 0xFF for i in range(count)]
+
+    def flush(self):
+        # skips the bus entirely when nothing changed since the last write
+        if self.state == self._written:
+            return False
+        self._write()
+        self._written = list(self.state)
+        return True
+
+    def _write(self):
+        raise NotImplementedError
+
+
+class Pcf8574Driver(RelayDriver):
+    channels = 8
+
+    def __init__(self, bus, address=0x20, active_low=True):
+        self.address = address
+        super().__init__(bus, active_low)
+
+    def _write(self):
+        self.bus.write_byte(self.address, self.levels(1)[0])
+
+
+class Mcp23017Driver(RelayDriver):
+    channels = 16
+
+    def __init__(self, bus, address=0x20, active_low=True):
+        self.address = address
+        super().__init__(bus, active_low)
+        # latch the idle level before switching the pins to outputs so no relay clicks at start-up
+        self._write()
+        self._written = list(self.state)
+        self.bus.write_block(self.address, MCP23017_IODIRA, [0x00, 0x00])
+
+    def _write(self):
+        # OLATA and OLATB are adjacent, so both ports go out in one block write
+        self.bus.write_block(self.address, MCP23017_OLATA, self.levels(2))
+
+
+class ShiftRegisterDriver(RelayDriver):
+    def __init__(self, bus, chain_length=1, active_low=True):
+        self.chain_length = chain_length
+        self.channels = 8 * chain_length
+        super().__init__(bus, active_low)
+
+    def _write(self):
+        self.bus.shift_out(self.levels(self.chain_length))
+
+
+# --- Keeps the number of energised solenoids under the power supply's limit ---
+class CurrentLimiter:
+    def __init__(self, max_active=DEFAULT_MAX_ACTIVE):
+        self.max_active = max_active
+        self.active = set()
+
+    def request(self, key):
+        # True if key may energise now; a refused key is not remembered, the caller retries
+        if key in self.active:
+            return True
+        if len(self.active) < self.max_active:
+            self.active.add(key)
+            return True
+        return False
+
+    def release(self, key):
+        self.active.discard(key)
+
+
+# --- LockerHardware over expander/shift-register channels; relay_channel is the global channel ---
+class RelayBankHardware(LockerHardware):
+    def __init__(self, bank, drivers, max_active=DEFAULT_MAX_ACTIVE, buzzer=None):
+        super().__init__(bank)
+        self.drivers = drivers
+        self.buzzer = buzzer            # gpiozero Buzzer or None
+        self.limiter = CurrentLimiter(max_active)
+        self.max_active = max_active
+        self.channels = {}              # locker_id -> (driver, local channel)
+        offsets = []
+        total = 0
+        for driver in drivers:
+            offsets.append((total, driver))
+            total += driver.channels
+        for slot in bank:
+            if slot.relay_channel is None or not 0 <= slot.relay_channel < total:
+                raise ValueError(f"locker {slot.locker_id} has no relay channel below {total}")
+            for start, driver in offsets:
+                if start <= slot.relay_channel < start + driver.channels:
+                    self.channels[slot.locker_id] = (driver, slot.relay_channel - start)
+        self._buzzer_on = False
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def batch(self):
+        # changes made inside are written out once per chip when the outermost batch ends
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self.flush()
+
+    def flush(self):
+        with self._lock:
+            return sum(driver.flush() for driver in self.drivers)
+
+    def _drive(self, locker_id, on):
+        driver, channel = self.channels[locker_id]
+        driver.set(channel, on)
+
+    def set_lock(self, locker_id, unlocked):
+        # an unlock over the limit is refused outright; queuing it would report a door open that is not
+        with self.batch():
+            if unlocked:
+                if not self.limiter.request(locker_id):
+                    raise DeviceBusyError(f"{self.limiter.max_active} solenoids are already energised")
+                self._drive(locker_id, True)
+            else:
+                self._drive(locker_id, False)
+                self.limiter.release(locker_id)
+
+    def set_buzzer(self, on):
+        self._buzzer_on = on
+        if self.buzzer is not None:
+            self.buzzer.on() if on else self.buzzer.off()
+
+    def is_unlocked(self, locker_id):
+        driver, channel = self.channels[locker_id]
+        return driver.state[channel]
+
+    def buzzer_on(self):
+        return self._buzzer_on
+
+    def all_off(self):
+        with self.batch():
+            for locker_id in self.channels:
+                self._drive(locker_id, False)
+            self.limiter = CurrentLimiter(self.limiter.max_active)
+        self.set_buzzer(False)
+
+    def close(self):
+        self.all_off()
+        buses = {id(d.bus): d.bus for d in self.drivers}
+        for bus in buses.values():
+            bus.close()
+        if self.buzzer is not None:
+            self.buzzer.close()
+
+    @classmethod
+    def from_bank(cls, bank, bus=None, buzzer=True):
+        # bank.relay_driver, e.g. {"type": "mcp23017", "addresses": [32, 33], "max_active": 2}
+        # or {"type": "shift_register", "data_pin": 10, "clock_pin": 11, "latch_pin": 8, "chain_length": 4}
+        config = bank.relay_driver or {}
+        kind = config.get("type")
+        active_low = config.get("active_low", True)
+        if kind in ("mcp23017", "pcf8574"):
+            bus = bus or SMBusI2C(config.get("bus", 1))
+            chip = Mcp23017Driver if kind == "mcp23017" else Pcf8574Driver
+            drivers = [chip(bus, address, active_low) for address in config.get("addresses", [0x20])]
+        elif kind == "shift_register":
+            bus = bus or GpioShiftBus(config["data_pin"], config["clock_pin"], config["latch_pin"])
+            drivers = [ShiftRegisterDriver(bus, config.get("chain_length", 1), active_low)]
+        else:
+            raise ValueError(f"unknown relay driver type {kind!r}")
+        if buzzer:
+            from gpiozero import Buzzer
+            buzzer = Buzzer(bank.buzzer_pin)
+        return cls(bank, drivers, config.get("max_active", DEFAULT_MAX_ACTIVE), buzzer or None)
+
+
+# --- Self-check on the fake bus: batching and the current limit ---
+def self_check(lockers=32, max_active=2):
+    from locker_bank import LockerBank
+    bank = LockerBank.from_dict({
+        "lockers": [{"locker_id": i + 1, "relay_channel": i} for i in range(lockers)],
+        "relay_driver": {"type": "mcp23017", "addresses": [0x20 + n for n in range((lockers + 15) // 16)],
+                         "max_active": max_active},
+    })
+    bus = FakeBus()
+    hw = RelayBankHardware.from_bank(bank, bus=bus, buzzer=False)
+    setup = len(bus.transactions)
+
+    hw.all_off()
+    assert len(bus.transactions) == setup, "all_off on idle relays must not touch the bus"
+    refused = 0
+    for locker_id in range(1, max_active + 3):
+        try:
+            hw.set_lock(locker_id, True)
+        except DeviceBusyError:
+            refused += 1
+    energised = [lid for lid in bank.ids() if hw.is_unlocked(lid)]
+    assert len(energised) == max_active, f"{len(energised)} solenoids on, limit is {max_active}"
+    assert refused == 2, f"{refused} unlocks refused over the limit, expected 2"
+    hw.set_lock(1, False)
+    assert not hw.is_unlocked(max_active + 1), "a refused unlock must not open later on its own"
+    hw.set_lock(max_active + 1, True)
+    assert hw.is_unlocked(max_active + 1), "a retried unlock must take the freed slot"
+
+    before = len(bus.transactions)
+    hw.all_off()
+    writes = len(bus.transactions) - before
+    chips = len({lid // 16 for lid in range(max_active + 2)})
+    assert writes <= chips, f"all_off took {writes} transactions for {chips} chip(s)"
+    print(f"{lockers} lockers on {len(hw.drivers)} MCP23017: limit {max_active} held, "
+          f"all_off in {writes} transaction(s), {len(bus.transactions)} bus writes total")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if self_check(*[int(a) for a in sys.argv[1:3]]) else 1)
@@ -0,0 +1,91 @@
+import threading
+import db
+
+CATALOG_SQL = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+# key order, not column order: keyset paging compares tuples in this order so the PK index can serve it
+PRIMARY_KEY_SQL = """
+    SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND CONSTRAINT_NAME = 'PRIMARY'
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+TABLE_ROWS_SQL = """
+    SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+
+class ColumnInfo:
+    __slots__ = ("name", "type", "nullable", "primary")
+
+    def __init__(self, name, type, nullable, primary):
+        self.name = name
+        self.type = type
+        self.nullable = nullable
+        self.primary = primary
+
+
+# --- Tables, columns, types and primary keys of the current schema, loaded in one batch ---
+class SchemaCatalog:
+    def __init__(self):
+        self._tables = None     # table -> [ColumnInfo], in column order
+        self._primary_keys = {}  # table -> primary key columns, in key order
+        self._row_estimates = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _ensure(self):
+        with self._lock:
+            if self._tables is None:
+                tables = {}
+                for table, column, col_type, nullable, key in db.fetchall(CATALOG_SQL):
+                    tables.setdefault(table, []).append(
+                        ColumnInfo(column, col_type, nullable == "YES", key == "PRI"))
+                primary_keys = {}
+                for table, column in db.fetchall(PRIMARY_KEY_SQL):
+                    primary_keys.setdefault(table, []).append(column)
+                self._tables = tables
+                self._primary_keys = primary_keys
+                self._row_estimates = {t: n or 0 for t, n in db.fetchall(TABLE_ROWS_SQL)}
+                self.loads += 1
+            return self._tables
+
+    def invalidate(self):
+        # call after any DDL (CREATE/ALTER/DROP) the app runs
+        with self._lock:
+            self._tables = None
+
+    def tables(self):
+        return sorted(self._ensure())
+
+    def columns(self, table):
+        return [c.name for c in self._ensure().get(table, [])]
+
+    def column_info(self, table):
+        return list(self._ensure().get(table, []))
+
+    def primary_key(self, table):
+        self._ensure()
+        return list(self._primary_keys.get(table, []))
+
+    def estimated_rows(self, table):
+        # InnoDB's estimate as of the last load; good enough for a row-count hint
+        self._ensure()
+        return self._row_estimates.get(table, 0)
+
+    def has_column(self, table, column):
+        return column in self.columns(table)
+
+
+_catalog = None
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = SchemaCatalog()
+    return _catalog
@@ -0,0 +1,18 @@
+# --- Who is logged in, resolved once at login and handed to every screen ---
+class Session:
+    __slots__ = ("user_id", "username", "role", "display_name", "token")
+
+    def __init__(self, user_id, username, role, display_name=None):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.display_name = display_name or username
+        self.token = None       # bearer token from the locker service (locker_server.py)
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+    def owns(self, state):
+        # state is a LockerState; ownership is a user_id comparison, no users lookup
+        return state is not None and state.user_id == self.user_id
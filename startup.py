@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import builtins
+import threading
+import importlib
+
+# where the kiosk writes its startup timeline; set LOCKER_STARTUP_PROFILE="" to turn profiling off
+PROFILE_PATH = os.environ.get("LOCKER_STARTUP_PROFILE",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_profile.json"))
+# set by the benchmark: quit as soon as the first frame is on screen
+EXIT_AFTER_FRAME = os.environ.get("LOCKER_STARTUP_EXIT_AFTER_FRAME") == "1"
+
+# layers the login screen does not need; warmed up once it is painted
+PRELOAD_BACKGROUND = [
+    "mysql.connector", "db", "credentials", "audit_log", "offline_journal", "locker_service",
+    "registration", "otp_service", "locker_bank", "locker_state", "hardware", "kiosk_service", "locker_server",
+]
+# with LOCKER_API_URL set the service, and with it the DB layer, runs elsewhere; only the client's own layers
+PRELOAD_REMOTE = ["locker_bank", "change_bus"]
+# these define widgets, so they are imported on the GUI thread, one per idle turn of the event loop,
+# after the background layers are in
+PRELOAD_GUI = ["table_model", "analytics_tab", "admin_login_gui"]
+# importing any of these before the first frame is a cold-start regression
+HEAVY_MODULES = ("mysql.connector", "gpiozero", "admin_login_gui", "database", "analytics", "locker_server")
+
+
+# --- Timeline of phases and imports from process start until the app is warm ---
+class StartupProfiler:
+    def __init__(self, path=PROFILE_PATH):
+        self.path = path
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.phases = []        # (name, start_ms, duration_ms, thread)
+        self.imports = []       # (module, start_ms, duration_ms, depth, thread)
+        self.marks = {}         # name -> ms since start
+        self.modules_at = {}    # mark name -> heavy modules already imported at that point
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._real_import = None
+
+    def now(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    # --- phases ---
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def mark(self, name):
+        with self._lock:
+            self.marks[name] = self.now()
+            self.modules_at[name] = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    # --- imports; the hook only times imports that actually load something ---
+    def install_import_hook(self):
+        if self._real_import is None and self.enabled:
+            self._real_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def remove_import_hook(self):
+        if self._real_import is not None:
+            builtins.__import__ = self._real_import
+            self._real_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        real = self._real_import or builtins.__import__
+        if level or name in sys.modules:
+            return real(name, globals, locals, fromlist, level)
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start = self.now()
+        try:
+            return real(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = depth
+            with self._lock:
+                self.imports.append((name, start, self.now() - start, depth, threading.current_thread().name))
+
+    # --- output ---
+    def to_dict(self):
+        with self._lock:
+            return {
+                "started_wall": self.started_wall,
+                "python": sys.version.split()[0],
+                "marks": dict(self.marks),
+                "heavy_modules_at": dict(self.modules_at),
+                "phases": [dict(zip(("name", "start_ms", "ms", "thread"), p)) for p in self.phases],
+                "imports": [dict(zip(("module", "start_ms", "ms", "depth", "thread"), i)) for i in self.imports],
+            }
+
+    def write(self):
+        if not self.enabled:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.to_dict(), f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass    # a read-only SD card must not stop the kiosk from starting
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profiler.now()
+        return self
+
+    def __exit__(self, *exc):
+        p = self.profiler
+        with p._lock:
+            p.phases.append((self.name, self.start, p.now() - self.start, threading.current_thread().name))
+
+
+_profiler = None
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+        _profiler.install_import_hook()
+    return _profiler
+
+
+# --- After the first paint: note the time, then warm the layers the login screen skipped ---
+def after_first_frame(window, on_frame=None):
+    # window is the first top-level widget shown; on_frame runs once it has actually been painted
+    from PySide6.QtCore import QObject, QEvent, QTimer
+
+    class FirstFrameWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                obj.removeEventFilter(self)
+                # the paint event is delivered before the frame is flushed; let it finish first
+                QTimer.singleShot(0, self.first_frame)
+            return False
+
+        def first_frame(self):
+            get_profiler().mark("first_frame")
+            if on_frame is not None:
+                on_frame()
+            self.deleteLater()
+
+    window._first_frame_watcher = watcher = FirstFrameWatcher(window)
+    window.installEventFilter(watcher)
+    return watcher
+
+
+def preload(background=PRELOAD_BACKGROUND, gui=PRELOAD_GUI, on_done=None):
+    from PySide6.QtCore import QTimer
+    profiler = get_profiler()
+    remaining = list(gui)
+
+    def load_background():
+        with profiler.phase("preload background"):
+            for name in background:
+                try:
+                    importlib.import_module(name)
+                except Exception:
+                    pass    # a missing optional layer (no gpiozero on a dev box) is reported when used
+
+    worker = threading.Thread(target=load_background, name="preload", daemon=True)
+
+    def load_next_gui():
+        # the widget modules import the DB layer too, so wait for the worker rather than block on it
+        if worker.is_alive():
+            QTimer.singleShot(50, load_next_gui)
+        elif remaining:
+            name = remaining.pop(0)
+            with profiler.phase(f"preload {name}"):
+                try:
+                    importlib.import_module(name)
+                except Exception:
+                    pass
+            QTimer.singleShot(0, load_next_gui)
+        else:
+            profiler.mark("warm")
+            profiler.remove_import_hook()
+            profiler.write()
+            if on_done is not None:
+                on_done()
+
+    worker.start()
+    QTimer.singleShot(0, load_next_gui)
+
+
+# --- Report and time-to-first-frame benchmark ---
+def report(path=PROFILE_PATH, min_ms=5.0):
+    with open(path) as f:
+        profile = json.load(f)
+    print(f"startup profile {path} (python {profile['python']})")
+    for name, at in sorted(profile["marks"].items(), key=lambda m: m[1]):
+        heavy = profile["heavy_modules_at"].get(name) or []
+        print(f"  {at:8.1f} ms  {name}" + (f"  (already imported: {', '.join(heavy)})" if heavy else ""))
+    print("phases:")
+    for p in profile["phases"]:
+        print(f"  {p['start_ms']:8.1f} ms  {p['ms']:8.1f} ms  {p['name']}  [{p['thread']}]")
+    print(f"imports taking {min_ms:.0f} ms or more:")
+    for i in profile["imports"]:
+        if i["ms"] >= min_ms:
+            print(f"  {i['start_ms']:8.1f} ms  {i['ms']:8.1f} ms  {'  ' * i['depth']}{i['module']}  [{i['thread']}]")
+
+
+def time_to_first_frame(runs=5, budget_ms=None, script="locker_gui.py"):
+    # starts the kiosk offscreen `runs` times; each run quits itself once the first frame is painted
+    import subprocess
+    import tempfile
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile.json")
+            env = dict(os.environ, QT_QPA_PLATFORM="offscreen", LOCKER_STARTUP_PROFILE=path,
+                       LOCKER_STARTUP_EXIT_AFTER_FRAME="1")
+            spawned = time.time()
+            subprocess.run([sys.executable, os.path.join(here, script)], env=env, cwd=here, check=True,
+                           timeout=60, stdout=subprocess.DEVNULL)
+            with open(path) as f:
+                profile = json.load(f)
+        in_process = profile["marks"]["first_frame"]
+        # wall time from spawn includes interpreter start-up, which the in-process clock cannot see
+        wall = (profile["started_wall"] - spawned) * 1000 + in_process
+        results.append((wall, in_process, profile["heavy_modules_at"]["first_frame"]))
+
+    walls = sorted(r[0] for r in results)
+    median = walls[len(walls) // 2]
+    heavy = sorted({m for r in results for m in r[2]})
+    print(f"time to first frame over {runs} run(s): median {median:.0f} ms, best {walls[0]:.0f} ms, "
+          f"worst {walls[-1]:.0f} ms (in-process median {sorted(r[1] for r in results)[len(results) // 2]:.0f} ms)")
+    ok = True
+    if heavy:
+        print(f"  REGRESSION: imported before the first frame: {', '.join(heavy)}")
+        ok = False
+    if budget_ms is not None and median > budget_ms:
+        print(f"  REGRESSION: median {median:.0f} ms is over the {budget_ms:.0f} ms budget")
+        ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    # usage: python startup.py bench [RUNS] [BUDGET_MS]  |  python startup.py report [PATH]
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "report":
+        report(sys.argv[2] if len(sys.argv) > 2 else PROFILE_PATH)
+    elif command == "bench":
+        runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        budget = float(sys.argv[3]) if len(sys.argv) > 3 else None
+        sys.exit(0 if time_to_first_frame(runs, budget) else 1)
+    else:
+        sys.exit(f"unknown command {command!r}")
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from db_executor import run_async
+
+PAGE_SIZE = 200
+MAX_CACHED_PAGES = 25   # ~5k rows resident at most, whatever the table size
+
+
+# --- Lazily paged view of one table (keyset pagination on the primary key) ---
+class PagedTableModel(QAbstractTableModel):
+    load_failed = Signal(object)
+
+    def __init__(self, fetch_page, parent=None):
+        super().__init__(parent)
+        # fetch_page(table, n, after, limit) -> row tuples, blocking; the locker service runs the query
+        self.fetch_page = fetch_page
+        self.generation = 0             # bumped per load() so late pages of an old table are dropped
+        self.table = None
+        self.columns = []
+        self.primary_key = []
+        self.estimated_rows = 0
+        self._reset_pages()
+
+    def _reset_pages(self):
+        self.loaded_rows = 0            # rows exposed to the view so far
+        self.exhausted = False
+        self.page_after = [None]        # page n starts after this key (None = from the top)
+        self.pages = OrderedDict()      # LRU of page n -> list of row tuples
+        self.in_flight = set()          # page numbers being fetched on the DB executor
+        self.edits = {}                 # row -> {col: new value}
+        self.edit_keys = {}             # row -> primary key as loaded, captured on first edit
+
+    def load(self, table, columns, primary_key, estimated_rows=0):
+        self.beginResetModel()
+        self.generation += 1
+        self.table = table
+        self.columns = list(columns)
+        self.primary_key = list(primary_key)
+        self.estimated_rows = estimated_rows
+        self._reset_pages()
+        self.endResetModel()
+        self._request_page(0)
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section] if section < len(self.columns) else None
+        return str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row, col = index.row(), index.column()
+        if col not in self.edits.get(row, {}) and self._cached_page(row // PAGE_SIZE) is None:
+            # page was evicted; show a placeholder and fetch it in the background
+            self._request_page(row // PAGE_SIZE)
+            return "…"
+        return str(self.value(row, col))
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        value = None if value == "None" else value
+        row = index.row()
+        if self._cached_page(row // PAGE_SIZE) is None:
+            return False
+        original = self.original_value(row, index.column())
+        if value == original or (original is not None and value == str(original)):
+            return False
+        if row not in self.edit_keys:
+            self.edit_keys[row] = self.row_key(row)
+        self.edits.setdefault(row, {})[index.column()] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self.table is not None and not self.exhausted
+                and len(self.page_after) - 1 not in self.in_flight)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid():
+            self._request_page(len(self.page_after) - 1)
+
+    # --- row access (rows must be on a cached page) ---
+    def original_value(self, row, col):
+        page = self._cached_page(row // PAGE_SIZE)
+        return page[row % PAGE_SIZE][col]
+
+    def value(self, row, col):
+        edited = self.edits.get(row)
+        if edited is not None and col in edited:
+            return edited[col]
+        return self.original_value(row, col)
+
+    def row_key(self, row):
+        idx = [self.columns.index(k) for k in self.primary_key]
+        return tuple(self.original_value(row, i) for i in idx)
+
+    def edited_row_key(self, row):
+        return self.edit_keys[row]
+
+    def apply_edits(self):
+        # after a successful save the edited values become the cached originals
+        for row, cols in self.edits.items():
+            n, offset = divmod(row, PAGE_SIZE)
+            page = self.pages.get(n)
+            if page is not None:
+                values = list(page[offset])
+                for col, value in cols.items():
+                    values[col] = value
+                page[offset] = tuple(values)
+        self.edits = {}
+        self.edit_keys = {}
+
+    def _cached_page(self, n):
+        page = self.pages.get(n)
+        if page is not None:
+            self.pages.move_to_end(n)
+        return page
+
+    def _request_page(self, n):
+        if n in self.in_flight or n >= len(self.page_after):
+            return
+        self.in_flight.add(n)
+        generation = self.generation
+        run_async(self.fetch_page, self.table, n, self.page_after[n], PAGE_SIZE,
+                  on_result=lambda rows: self._on_page(generation, n, rows),
+                  on_error=lambda e: self._on_page_error(generation, n, e))
+
+    def _on_page_error(self, generation, n, error):
+        if generation == self.generation:
+            self.in_flight.discard(n)
+            self.load_failed.emit(error)
+
+    def _on_page(self, generation, n, rows):
+        if generation != self.generation:
+            return
+        self.in_flight.discard(n)
+        self.pages[n] = rows
+        while len(self.pages) > MAX_CACHED_PAGES:
+            self.pages.popitem(last=False)
+
+        if n == len(self.page_after) - 1:
+            # a new page at the end of what the view has seen so far
+            if len(rows) < PAGE_SIZE:
+                self.exhausted = True
+            if not rows:
+                return
+            idx = [self.columns.index(k) for k in self.primary_key]
+            self.page_after.append(tuple(rows[-1][i] for i in idx))
+            self.beginInsertRows(QModelIndex(), self.loaded_rows, self.loaded_rows + len(rows) - 1)
+            self.loaded_rows += len(rows)
+            self.endInsertRows()
+        else:
+            # an evicted page came back: repaint its rows
+            first = n * PAGE_SIZE
+            last = min(first + len(rows), self.loaded_rows) - 1
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.columns) - 1))
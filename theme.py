@@ -0,0 +1,186 @@
+import sys
+import time
+
+# theme colors
+BG_COLOR = "#F4F4F4"
+TEXT_COLOR = "#333333"
+BORDER_COLOR = "#CCCCCC"
+ACCENT_COLOR = "#4CAF50"
+ACCENT_HOVER = "#45A049"
+WIDGET_FONT = "Segoe UI"
+FREE_COLOR = "#2ecc71"
+OCCUPIED_COLOR = "#e74c3c"
+FRAME_COLOR = "#2c3e50"
+ERROR_COLOR = "#e74c3c"
+
+# locker looks, set as the "state" property on a locker's box and status label
+FREE = "free"
+OCCUPIED = "occupied"
+MINE = "mine"
+
+# The one stylesheet for the whole kiosk, installed on the QApplication once. Screens opt in with a
+# "screen" property and widgets that change look at runtime are keyed on dynamic properties, so a
+# refresh flips a property instead of parsing a new stylesheet.
+STYLESHEET = f"""
+    QWidget[screen="login"], QWidget[screen="login"] QWidget,
+    QWidget[screen="register"], QWidget[screen="forgot"] {{
+        background-color: {BG_COLOR};
+        font-family: {WIDGET_FONT};
+    }}
+    QWidget[screen="login"] QLabel,
+    QWidget[screen="register"] QLabel,
+    QWidget[screen="forgot"] QLabel {{
+        color: {TEXT_COLOR};
+    }}
+    QWidget[screen="register"] QLabel {{ font-size: 18px; }}
+    QWidget[screen="forgot"] QLabel {{ font-size: 16px; }}
+
+    QWidget[screen="login"] QLineEdit,
+    QWidget[screen="register"] QLineEdit, QWidget[screen="register"] QDateEdit,
+    QWidget[screen="forgot"] QLineEdit, QWidget[screen="forgot"] QDateEdit {{
+        background-color: white;
+        border: 1px solid {BORDER_COLOR};
+        border-radius: 8px;
+        padding: 12px;
+    }}
+    QWidget[screen="register"] QLineEdit, QWidget[screen="register"] QDateEdit {{ font-size: 16px; }}
+    QWidget[screen="forgot"] QLineEdit, QWidget[screen="forgot"] QDateEdit {{ font-size: 18px; }}
+
+    QWidget[screen="login"] QPushButton, QWidget[screen="register"] QPushButton {{
+        background-color: white;
+        color: black;
+        border: 2px solid black;
+        border-radius: 8px;
+        padding: 12px 24px;
+    }}
+    QWidget[screen="register"] QPushButton {{ font-size: 16px; }}
+    QWidget[screen="login"] QPushButton:hover, QWidget[screen="register"] QPushButton:hover {{
+        background-color: black;
+        color: white;
+    }}
+    QWidget[screen="register"] QPushButton:disabled {{
+        background-color: #95a5a6;
+        color: white;
+    }}
+    QWidget[screen="forgot"] QPushButton {{
+        background-color: black;
+        color: white;
+        border: none;
+        border-radius: 8px;
+        padding: 12px 24px;
+        font-size: 18px;
+    }}
+    QWidget[screen="forgot"] QPushButton:hover {{
+        background-color: #333;
+    }}
+
+    QLabel[role="hint"] {{
+        color: {ERROR_COLOR};
+        font-size: 14px;
+    }}
+
+    QLabel[locker="box"] {{
+        border: 2px solid {FRAME_COLOR};
+        border-radius: 8px;
+    }}
+    QLabel[locker="box"][state="free"] {{ background-color: {FREE_COLOR}; }}
+    QLabel[locker="box"][state="occupied"] {{ background-color: {OCCUPIED_COLOR}; }}
+    QLabel[locker="box"][state="mine"] {{
+        background-color: {OCCUPIED_COLOR};
+        border: 4px solid {FRAME_COLOR};
+    }}
+    QLabel[locker="status"][state="free"] {{ color: {FREE_COLOR}; }}
+    QLabel[locker="status"][state="occupied"], QLabel[locker="status"][state="mine"] {{ color: {OCCUPIED_COLOR}; }}
+"""
+
+
+def install(app):
+    # idempotent: re-setting the same sheet would make Qt re-polish every widget
+    if app.styleSheet() != STYLESHEET:
+        app.setStyleSheet(STYLESHEET)
+
+
+def set_state(widget, state):
+    # flips a property the stylesheet is keyed on; only this widget is re-polished, and only on change
+    if widget.property("state") == state:
+        return False
+    widget.setProperty("state", state)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+    return True
+
+
+# --- Benchmark: cost of one full locker refresh, per-widget stylesheets vs property flips ---
+def benchmark(counts=(4, 16, 48, 96), rounds=20, changed_share=0.1):
+    # two cases per cabinet size: every locker changes look, and a full refresh where only
+    # changed_share of them did (what enter() and update_lockers(full=True) usually see)
+    from PySide6.QtWidgets import QApplication, QWidget, QLabel, QGridLayout
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    install(app)
+    looks = [(FREE, FREE_COLOR), (OCCUPIED, OCCUPIED_COLOR), (MINE, OCCUPIED_COLOR)]
+
+    def build(n):
+        page = QWidget()
+        grid = QGridLayout(page)
+        lockers = []
+        for i in range(n):
+            box, status = QLabel(), QLabel("Status: Open")
+            box.setFixedSize(40, 30)
+            box.setProperty("locker", "box")
+            status.setProperty("locker", "status")
+            grid.addWidget(status, 2 * (i // 12), i % 12)
+            grid.addWidget(box, 2 * (i // 12) + 1, i % 12)
+            lockers.append((box, status))
+        page.show()
+        app.processEvents()
+        return page, lockers
+
+    def look_of(i, r, every):
+        # with every=False only one locker in 1/changed_share moves to its next look each round
+        step = r if every or i % round(1 / changed_share) == 0 else 0
+        return looks[(i + step) % 3]
+
+    def per_widget(lockers, r, every):
+        # what update_lockers used to do: a freshly formatted sheet on every box and label it renders
+        for i, (box, status) in enumerate(lockers):
+            _, color = look_of(i, r, every)
+            box.setStyleSheet(f"background-color: {color}; border:2px solid {FRAME_COLOR}; border-radius:8px;")
+            status.setStyleSheet(f"color: {color};")
+
+    def themed(lockers, r, every):
+        for i, (box, status) in enumerate(lockers):
+            state, _ = look_of(i, r, every)
+            set_state(box, state)
+            set_state(status, state)
+
+    def timed(refresh, lockers, every):
+        # processEvents is included so the re-layout and repaint the change causes are counted too
+        start = time.perf_counter()
+        for r in range(rounds):
+            refresh(lockers, r, every)
+            app.processEvents()
+        return (time.perf_counter() - start) * 1000 / rounds
+
+    print(f"{'lockers':>8}  {'changed':>8}  {'setStyleSheet':>14}  {'property flip':>14}")
+    results = []
+    for n in counts:
+        for every in (True, False):
+            page, lockers = build(n)
+            old = timed(per_widget, lockers, every)
+            page.close()
+            page.deleteLater()
+            page, lockers = build(n)
+            new = timed(themed, lockers, every)
+            page.close()
+            page.deleteLater()
+            share = "all" if every else f"{changed_share:.0%}"
+            results.append((n, share, old, new))
+            print(f"{n:>8}  {share:>8}  {old:11.2f} ms  {new:11.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    # usage: python theme.py [ROUNDS]  (QT_QPA_PLATFORM=offscreen works without a display)
+    benchmark(rounds=int(sys.argv[1]) if len(sys.argv) > 1 else 20)